@@ -0,0 +1,823 @@
+import sys
+import time
+import random
+import math
+import pickle
+import struct
+import socket
+import select
+import subprocess
+import os
+import gc
+import io
+import json
+import hashlib
+import contextlib
+import tracemalloc
+from collections import deque
+import server
+import protocol
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Unix only; without it the loop suite can't read the server's CPU time and reports nan
+
+# --- Benchmark Settings ---
+PLAYER_COUNTS = [10, 40, 100, 200]
+BULLET_COUNTS = [100, 500, 2000]
+REPEATS = 20
+SEED = 1337
+PROTOCOL_WORLDS = [(10, 100), (40, 500), (100, 2000)]
+PROTOCOL_REPEATS = 200
+BROADCAST_CLIENTS = [10, 50, 200]
+BROADCAST_BULLETS = 1000
+LOOP_MODES = ['asyncio', 'select']
+LOOP_CLIENTS = 8
+LOOP_SECONDS = 5.0
+LOOP_PORT = 5599
+PREDICTION_LINKS = [(0, 0), (25, 5), (50, 20), (100, 40), (200, 80), (100, 300)]  # one-way latency and jitter, ms
+PREDICTION_SECONDS = 30
+CLIENT_FPS = 60
+INPUT_REDUNDANCY = 3
+INTERPOLATION_SECONDS = 30
+INTERPOLATION_SPEED = 200  # px/s around a circle, so every frame should move the same distance
+PARTICLE_COUNT = 10000
+PARTICLE_FRAMES = 120
+TEXT_FRAMES = 200
+SUBSYSTEM_PLAYERS = [10, 50, 200]
+SUBSYSTEM_BULLETS = [100, 1000, 5000]
+SUBSYSTEM_TICKS = 30
+SUBSYSTEM_EPOCH = 1_000_000.0  # the simulated clock starts here, so no run depends on the wall clock
+SUBSYSTEM_RESULTS = 'benchmark_subsystems.json'  # `--save PATH` writes elsewhere
+SUBSYSTEM_BASELINE = None  # `--against PATH` compares with an earlier run
+SUBSYSTEM_TOLERANCE = 1.25  # how much a phase's median may grow against the baseline before it is a regression
+SUBSYSTEM_NOISE_MS = 0.05  # phases cheaper than this in the baseline are too noisy to judge
+GC_ROOMS = 8
+GC_SECONDS = 30
+GC_SUPERPOWER_EVERY = 1.0  # seconds between one player's superpowers
+GC_REPEATS = 3
+
+def build_world(num_players, num_bullets, seed):
+    rng = random.Random(seed)
+    server.players.clear(); server.bullets.clear(); server.powerups.clear(); server.walls.clear(); reset_events()
+    for stat in server.game_stats.values(): stat.clear()
+    now = time.time()
+    server.last_hazard_time = now; server.last_superpower_grant_time = now
+    for pid in range(num_players):
+        server.players[pid] = {'x': rng.uniform(50, server.WIDTH-50), 'y': rng.uniform(50, server.HEIGHT-50), 'health': server.PLAYER_HEALTH,
+                               'color': server.AVAILABLE_COLORS[pid % len(server.AVAILABLE_COLORS)], 'name': f"Player {pid}", 'last_shot': 0}
+    for _ in range(num_bullets): spawn_random_bullet(rng, num_players)
+    for _ in range(server.MAX_POWERUPS):
+        p_type = rng.choice(list(server.POWERUP_TYPES.keys()))
+        server.spawn_powerup(rng.randint(50, server.WIDTH-50), rng.randint(50, server.HEIGHT-50), p_type)
+    server.spawn_wall(rng.uniform(0, server.WIDTH*0.6), -20, int(server.WIDTH*0.4), 20, 0, 250, now)
+
+def reset_events():
+    # Events go back to their pool along with the history that held them
+    server.events_queue.clear(); server.event_history.clear(); server.event_pool.clear()
+
+def drop_events():
+    # What record_snapshot would eventually do for events that never reach the history
+    for ev in server.events_queue: server.event_pool.free(ev)
+    server.events_queue.clear()
+
+def push_events(events):
+    for ev in events: server.push_event(ev['type'], **{k: v for k, v in ev.items() if k != 'type'})
+
+def spawn_random_bullet(rng, num_players):
+    owner = rng.randrange(num_players)
+    server.spawn_bullet(rng.uniform(0, server.WIDTH), rng.uniform(0, server.HEIGHT), rng.uniform(0, 2*math.pi), owner, server.players[owner]['color'])
+
+# name -> (spatial hash, numpy bullets)
+MODES = {'brute': (False, False), 'grid': (True, False), 'numpy': (True, True)}
+
+def set_mode(mode):
+    server.USE_SPATIAL_HASH, server.USE_NUMPY_BULLETS = MODES[mode]
+    server.bullets = server.new_bullet_store()
+
+def run_tick(num_players, num_bullets, seed, mode):
+    set_mode(mode)
+    build_world(num_players, num_bullets, seed)
+    random.seed(seed)
+    start = time.perf_counter()
+    server.game_loop(server.TICK_RATE)
+    elapsed = time.perf_counter() - start
+    outcome = ({pid: p['health'] for pid, p in server.players.items()}, [e['type'] for e in server.events_queue], len(server.bullets))
+    return elapsed, outcome
+
+def bench_tick():
+    modes = [m for m in MODES if server.np is not None or not MODES[m][1]]
+    print(f"{'players':>8} {'bullets':>8} " + " ".join(f"{m + ' ms':>10}" for m in modes) + f"  budget {server.TICK_RATE*1000:.1f} ms")
+    for num_players in PLAYER_COUNTS:
+        for num_bullets in BULLET_COUNTS:
+            timings = {}
+            for mode in modes:
+                samples, outcomes = [], []
+                for rep in range(REPEATS):
+                    elapsed, outcome = run_tick(num_players, num_bullets, SEED + rep, mode)
+                    samples.append(elapsed); outcomes.append(outcome)
+                timings[mode] = (sorted(samples)[len(samples)//2], outcomes)
+            if timings['brute'][1] != timings['grid'][1]:
+                print(f"❌ Hit results differ for {num_players} players / {num_bullets} bullets"); sys.exit(1)
+            print(f"{num_players:>8} {num_bullets:>8} " + " ".join(f"{timings[m][0]*1000:>10.2f}" for m in modes))
+    set_mode('numpy' if server.np is not None else 'grid')
+
+SAMPLE_EVENTS = [
+    {'type': 'hit', 'pos': (120.5, 80.25), 'color': (239, 83, 80), 'target_id': 0},
+    {'type': 'death', 'player_id': 0, 'pos': (120.5, 80.25), 'color': (239, 83, 80)},
+    {'type': 'kill', 'killer_id': 1},
+    {'type': 'kill_streak', 'name': 'Blästr ★', 'streak': 3},
+    {'type': 'powerup_collect', 'pos': (400, 300), 'color': (102, 187, 106)},
+]
+
+def build_snapshots(num_players, num_bullets, seed):
+    # Returns two consecutive snapshots so both the keyframe and the steady-state delta can be measured
+    build_world(num_players, num_bullets, seed)
+    rng = random.Random(seed)
+    for pid, p in server.players.items():
+        server.game_stats['kills'][pid] = rng.randrange(0, 1000, server.KILL_SCORE)
+        if rng.random() < 0.2: p['health'] = 0; p['death_time'] = time.time()
+    reset_events(); server.snapshot_history.clear()
+    push_events(SAMPLE_EVENTS)
+    baseline = server.record_snapshot()
+    random.seed(seed)
+    for p in server.players.values(): p['x'] += rng.uniform(-5, 5); p['y'] += rng.uniform(-5, 5)
+    server.game_loop(server.TICK_RATE)
+    push_events(SAMPLE_EVENTS[:2])
+    return baseline, server.record_snapshot()
+
+def events_since(tick, until=None):
+    return [(t, evs) for t, evs in server.event_history if t > tick and (until is None or t <= until)]
+
+def legacy_state(snapshot, events):
+    # The pre-binary broadcast: every field of every entity, pickled in full each tick
+    return {'players': snapshot['players'], 'stats': {pid: s['kills'] for pid, s in snapshot['stats'].items()}, 'events': events,
+            'bullets': [{'x': b['ox'], 'y': b['oy'], 'angle': math.atan2(b['vy'], b['vx']), 'owner_id': b['owner_id'], 'color': b['color']} for b in snapshot['bullets'].values()],
+            'powerups': list(snapshot['powerups'].values()), 'walls': list(snapshot['walls'].values())}
+
+def pickle_frame(msg):
+    payload = pickle.dumps(msg)
+    return struct.pack('!I', len(payload)) + payload
+
+def time_per_op(fn, arg, repeats, batches=5):
+    best = float('inf')
+    for _ in range(batches):
+        start = time.perf_counter()
+        for _ in range(repeats): fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best / repeats * 1e6
+
+def bench_protocol():
+    print(f"{'players':>8} {'bullets':>8} {'pickle B':>9} {'key B':>8} {'delta B':>8} {'pkl enc':>8} {'key enc':>8} {'dlt enc':>8} {'pkl dec':>8} {'key dec':>8} {'dlt dec':>8}  (us)")
+    for num_players, num_bullets in PROTOCOL_WORLDS:
+        baseline, current = build_snapshots(num_players, num_bullets, SEED)
+        legacy = legacy_state(current, events_since(current['tick'] - 1)[-1][1])
+        pkl = pickle_frame(legacy)
+        key_payload = bytes(protocol.encode_snapshot(current, None, events_since(current['tick'] - 1)))
+        delta_payload = bytes(protocol.encode_snapshot(current, baseline, events_since(baseline['tick'])))
+        received = protocol.apply_snapshot(None, protocol.decode_message(protocol.encode_snapshot(baseline, None, [])))
+        repeats = max(10, PROTOCOL_REPEATS * 100 // num_bullets)
+        timings = [time_per_op(pickle_frame, legacy, repeats),
+                   time_per_op(lambda s: protocol.encode_snapshot(s, None, []), current, repeats),
+                   time_per_op(lambda s: protocol.encode_snapshot(s, baseline, []), current, repeats),
+                   time_per_op(pickle.loads, pkl[4:], repeats),
+                   time_per_op(lambda p: protocol.apply_snapshot(None, protocol.decode_message(p)), key_payload, repeats),
+                   time_per_op(lambda p: protocol.apply_snapshot(received, protocol.decode_message(p)), delta_payload, repeats)]
+        print(f"{num_players:>8} {num_bullets:>8} {len(pkl):>9} {len(key_payload) + 4:>8} {len(delta_payload) + 4:>8} " + " ".join(f"{t:>8.1f}" for t in timings))
+
+class NullSocket:
+    # Stands in for a client connection so only encoding and framing are timed
+    def __init__(self): self.sent = 0
+    def send(self, data): self.sent += len(data); return len(data)
+
+def per_client_broadcast(snapshot):
+    # The old loop: one encode per connected client
+    for pid, sock in server.sockets_map.items():
+        server.send_payload(pid, server.encode_for_baseline(snapshot, server.client_baselines[pid]), True)
+
+def bench_broadcast():
+    print(f"{'clients':>8} {'frames':>7} {'per-client ms':>14} {'shared ms':>10} {'KB/tick':>8}")
+    for num_clients in BROADCAST_CLIENTS:
+        baseline, current = build_snapshots(num_clients, BROADCAST_BULLETS, SEED)
+        server.sockets_map.clear(); server.client_baselines.clear()
+        # Most clients acked the last tick; one just joined and a few acked a tick that has aged out, so both need keyframes
+        for pid in range(num_clients):
+            server.sockets_map[pid] = NullSocket(); server.outbound[pid] = server.OutboundQueue()
+            server.client_baselines[pid] = None if pid == 0 else baseline['tick'] if pid % 5 else baseline['tick'] - server.SNAPSHOT_HISTORY
+        expected = {tick: len(server.frame(server.encode_for_baseline(current, tick))) for tick in (None, baseline['tick'])}
+        server.broadcast_snapshot(current)
+        for pid, sock in server.sockets_map.items():
+            if sock.sent != expected[server.client_baselines[pid] if pid % 5 else None]: print("❌ Shared broadcast sent the wrong frame"); sys.exit(1)
+        kb = sum(sock.sent for sock in server.sockets_map.values()) / 1024
+        repeats = 20
+        timings = [time_per_op(per_client_broadcast, current, repeats), time_per_op(server.broadcast_snapshot, current, repeats)]
+        print(f"{num_clients:>8} {len(expected):>7} {timings[0]/1000:>14.2f} {timings[1]/1000:>10.2f} {kb:>8.1f}")
+    server.sockets_map.clear(); server.client_baselines.clear(); server.outbound.clear()
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else float('nan')
+
+def children_cpu():
+    if resource is None: return math.nan
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def run_server(mode, seconds, num_clients):
+    # Runs a real server process and returns (server tick times, client arrival times, server CPU seconds)
+    before = children_cpu()
+    code = f"import server; server.PORT = {LOOP_PORT}; server.main()"
+    proc = subprocess.Popen([sys.executable, '-c', code] + (['--select'] if mode == 'select' else []), stdout=subprocess.DEVNULL)
+    clients, tick_times, arrivals = [], [], []
+    try:
+        deadline = time.time() + 5
+        while len(clients) < max(num_clients, 1):
+            try: clients.append(socket.create_connection(('127.0.0.1', LOOP_PORT)))
+            except ConnectionRefusedError:
+                if time.time() > deadline: raise
+                time.sleep(0.05)
+        # With no clients requested, the single connection above only waited for the server to come up
+        if not num_clients: clients.pop().close()
+        readers = {sock: protocol.FrameReader() for sock in clients}
+        end = time.time() + seconds
+        while (now := time.time()) < end:
+            if not clients: time.sleep(end - now); break
+            for sock in select.select(clients, [], [], end - now)[0]:
+                reader, acked = readers[sock], None
+                if not reader.receive(sock): print(f"❌ Server closed a client in {mode} mode"); sys.exit(1)
+                for payload in reader.frames():
+                    msg = protocol.decode_message(payload)
+                    if 'tick' not in msg: continue
+                    acked = msg['tick']
+                    if sock is clients[0]: tick_times.append(msg['time']); arrivals.append(time.time())
+                if acked is not None: sock.sendall(protocol.pack_frame({'action': 'ack', 'tick': acked}))
+    finally:
+        for sock in clients: sock.close()
+        proc.terminate(); proc.wait()
+    return tick_times, arrivals, children_cpu() - before
+
+def interval_error_ms(times):
+    return [abs(b - a - server.TICK_RATE) * 1000 for a, b in zip(times, times[1:])]
+
+def bench_loop():
+    # Acks every frame (as a real client does) so the server stays on small deltas; ticks are spaced by the server's own clock
+    print(f"{'mode':>8} {'idle cpu%':>10} {'cpu%':>6} {'ticks/s':>8} {'tick err p50':>13} {'p99':>6} {'arrival err p50':>16} {'p99':>6}  (ms)")
+    for mode in LOOP_MODES:
+        # Interpreter start-up and imports are measured separately and taken off both readings
+        startup = run_server(mode, 0, 0)[2]
+        idle_cpu = run_server(mode, LOOP_SECONDS / 2, 0)[2] - startup
+        if idle_cpu < 0: idle_cpu = 0.0
+        tick_times, arrivals, cpu = run_server(mode, LOOP_SECONDS, LOOP_CLIENTS)
+        cpu -= startup
+        tick_err, arrival_err = interval_error_ms(tick_times), interval_error_ms(arrivals)
+        print(f"{mode:>8} {idle_cpu / (LOOP_SECONDS / 2) * 100:>10.1f} {cpu / LOOP_SECONDS * 100:>6.1f} {len(tick_times) / LOOP_SECONDS:>8.1f} "
+              f"{percentile(tick_err, 50):>13.2f} {percentile(tick_err, 99):>6.2f} {percentile(arrival_err, 50):>16.2f} {percentile(arrival_err, 99):>6.2f}")
+
+class Link:
+    # One direction of a TCP connection: every packet is delayed by the latency plus random jitter but never reordered
+    def __init__(self, latency_ms, jitter_ms, rng):
+        self.latency, self.jitter, self.rng = latency_ms / 1000, jitter_ms / 1000, rng
+        self.packets, self.last_due = deque(), 0.0
+    def send(self, now, packet):
+        self.last_due = max(self.last_due, now + self.latency + self.rng.uniform(0, self.jitter))
+        self.packets.append((self.last_due, packet))
+    def receive(self, now):
+        while self.packets and self.packets[0][0] <= now: yield self.packets.popleft()[1]
+
+def cursor_path(rng, seconds):
+    # The cursor darts between random points at a human-ish pace and sometimes rests, sampled once per client frame
+    x, y, path = server.WIDTH / 2, server.HEIGHT / 2, []
+    while len(path) < seconds * CLIENT_FPS:
+        tx, ty, speed = rng.uniform(20, server.WIDTH - 20), rng.uniform(20, server.HEIGHT - 20), rng.uniform(200, 900)
+        while (dist := math.hypot(tx - x, ty - y)) > 1:
+            step = min(dist, speed / CLIENT_FPS); x += (tx - x) / dist * step; y += (ty - y) / dist * step; path.append((x, y))
+        path.extend([(x, y)] * rng.randrange(0, CLIENT_FPS))
+    return path[:seconds * CLIENT_FPS]
+
+# Positions reach the client as float32, exactly as in the players table
+SNAPSHOT_POSITION = struct.Struct('!ffI')
+
+def simulate_prediction(link, reconcile, seed):
+    # Runs the real server input path against a model client across a simulated link. Returns the distance between
+    # where the client predicted it would be after each input and where the server actually put it, plus how far the
+    # predicted position jumped each time a snapshot corrected it
+    rng = random.Random(seed)
+    path = cursor_path(rng, PREDICTION_SECONDS)
+    up, down = Link(*link, rng), Link(*link, rng)
+    server.players.clear()
+    player = server.players[0] = {'x': server.WIDTH / 2, 'y': server.HEIGHT / 2, 'health': server.PLAYER_HEALTH, 'color': (255, 255, 255), 'name': 'Bot', 'last_shot': 0}
+    max_step = server.PLAYER_MAX_SPEED * server.TICK_RATE
+    px, py, seq, history, unacked, predicted_at = player['x'], player['y'], 0, deque(maxlen=INPUT_REDUNDANCY), deque(), {}
+    moves_applied, errors, snaps = 0, [], []
+    next_send, next_tick, frame_time = 0.0, rng.uniform(0, server.TICK_RATE), 1.0 / CLIENT_FPS
+    for frame, (tx, ty) in enumerate(path):
+        now = frame * frame_time
+        # Server ticks that fall before this frame: apply what has arrived, then snapshot back
+        while next_tick <= now:
+            for payload in up.receive(next_tick):
+                msg = protocol.decode_message(payload)
+                if msg['action'] == 'move':
+                    # The server no longer accepts move messages; this is what it used to do with each one
+                    server.move_player(player, msg['pos'], server.TICK_RATE); moves_applied += 1
+                else: server.handle_message(0, player, msg)
+            server.apply_player_inputs()
+            done = player.get('input_ack', 0) if reconcile else moves_applied
+            if done in predicted_at:
+                ex, ey = predicted_at.pop(done); errors.append(math.hypot(ex - player['x'], ey - player['y']))
+            down.send(next_tick, SNAPSHOT_POSITION.unpack(SNAPSHOT_POSITION.pack(player['x'], player['y'], done)))
+            next_tick += server.TICK_RATE
+        for sx, sy, ack in down.receive(now):
+            if not reconcile: continue
+            while unacked and unacked[0]['seq'] <= ack: unacked.popleft()
+            nx, ny = protocol.replay_inputs(sx, sy, unacked, max_step)
+            snaps.append(math.hypot(nx - px, ny - py)); px, py = nx, ny
+        if reconcile:
+            if now >= next_send:
+                seq += 1
+                command = {'seq': seq, 'x': tx, 'y': ty, 'angle': 0.0, 'fire': False, 'superpower': False}
+                history.append(command); unacked.append(command)
+                px, py = protocol.step_toward(px, py, tx, ty, max_step); predicted_at[seq] = (px, py)
+                up.send(now, protocol.encode_message({'action': 'input', 'commands': list(history)}))
+                next_send = max(next_send + server.TICK_RATE, now)
+        else:
+            # The previous client: ease toward the cursor every frame, send the eased position, never correct
+            px += (tx - px) * 0.2; py += (ty - py) * 0.2
+            seq += 1; predicted_at[seq] = (px, py)
+            up.send(now, protocol.encode_message({'action': 'move', 'pos': (px, py)}))
+    server.players.clear()
+    return errors, snaps
+
+def bench_prediction():
+    print(f"{'latency':>8} {'jitter':>7} {'old err p50':>12} {'p99':>7} {'max':>7} {'new err p50':>12} {'p99':>7} {'max':>7} {'snap p99':>9} {'max':>7}  (px)")
+    for link in PREDICTION_LINKS:
+        old_errors, _ = simulate_prediction(link, False, SEED)
+        errors, snaps = simulate_prediction(link, True, SEED)
+        print(f"{link[0]:>6}ms {link[1]:>5}ms {percentile(old_errors, 50):>12.2f} {percentile(old_errors, 99):>7.2f} {max(old_errors):>7.2f} "
+              f"{percentile(errors, 50):>12.2f} {percentile(errors, 99):>7.2f} {max(errors):>7.2f} {percentile(snaps, 99):>9.2f} {max(snaps):>7.2f}")
+
+def load_client():
+    # The client opens its window at import time; keep it off screen and keep our suite names out of its HOST argument
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy'); os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    try: import client
+    finally: sys.argv = argv
+    return client
+
+def orbit(t):
+    radius = 200
+    angle = t * INTERPOLATION_SPEED / radius
+    return server.WIDTH / 2 + radius * math.cos(angle), server.HEIGHT / 2 + radius * math.sin(angle)
+
+def simulate_interpolation(client, link, buffered, seed):
+    # Another player circles at constant speed; the server snapshots it every tick across a simulated link and the
+    # client draws it every frame. Returns how far each frame's step strays from the ideal constant step, how many
+    # frames stood still, and the render delay the client settled on
+    rng = random.Random(seed)
+    down = Link(*link, rng)
+    frame_time, ideal = 1.0 / CLIENT_FPS, INTERPOLATION_SPEED / CLIENT_FPS
+    buffer, previous, received = client.SnapshotBuffer(), deque(maxlen=2), 0
+    next_tick, tick, last, stutter, frozen, delays = 0.0, 0, None, [], 0, []
+    for frame in range(INTERPOLATION_SECONDS * CLIENT_FPS):
+        now = frame * frame_time
+        while next_tick <= now:
+            x, y = orbit(next_tick)
+            down.send(next_tick, {'tick': tick, 'time': next_tick, 'players': {1: {'x': x, 'y': y, 'health': 100}},
+                                  'bullets': {}, 'powerups': {}, 'walls': {}, 'stats': {}})
+            tick += 1; next_tick += server.TICK_RATE
+        for snapshot in down.receive(now):
+            buffer.add(snapshot, now); previous.append((now, snapshot)); received += 1
+        if received < 2: continue
+        if buffered:
+            pos = buffer.sample(buffer.render_time(now))['players'][1]
+            delays.append(buffer.delay)
+        else:
+            # The previous client: blend the two newest snapshots by arrival time, a fixed delay behind
+            (tb, b), (ta, a) = previous
+            t = max(0.0, min(1.0, (now - client.INTERPOLATION_DELAY - tb) / (ta - tb))) if ta > tb else 1.0
+            b, a = b['players'][1], a['players'][1]
+            pos = {'x': b['x'] + (a['x'] - b['x']) * t, 'y': b['y'] + (a['y'] - b['y']) * t}
+        if last is not None:
+            step = math.hypot(pos['x'] - last[0], pos['y'] - last[1])
+            stutter.append(abs(step - ideal)); frozen += step < ideal * 0.1
+        last = (pos['x'], pos['y'])
+    return stutter, frozen, sum(delays) / len(delays) if delays else client.INTERPOLATION_DELAY
+
+def bench_interpolation():
+    client = load_client()
+    print(f"{'latency':>8} {'jitter':>7} {'old p99':>8} {'max':>7} {'frozen':>7} {'new p99':>8} {'max':>7} {'frozen':>7} {'delay':>7}  (px off the ideal step per frame)")
+    for link in PREDICTION_LINKS:
+        old_stutter, old_frozen, _ = simulate_interpolation(client, link, False, SEED)
+        stutter, frozen, delay = simulate_interpolation(client, link, True, SEED)
+        print(f"{link[0]:>6}ms {link[1]:>5}ms {percentile(old_stutter, 99):>8.2f} {max(old_stutter):>7.2f} {old_frozen:>7} "
+              f"{percentile(stutter, 99):>8.2f} {max(stutter):>7.2f} {frozen:>7} {delay * 1000:>5.0f}ms")
+
+def refill_particles(rng, spawn, live):
+    # Bursts of every type with mixed lifetimes, so some particles expire on every frame
+    while live() < PARTICLE_COUNT:
+        spawn(min(50, PARTICLE_COUNT - live()), rng.uniform(0, server.WIDTH), rng.uniform(0, server.HEIGHT), rng.choice([(255, 0, 0), (66, 165, 245)]),
+              rng.randint(20, 60), (2, 10), rng.choice(['normal', 'glow', 'float']))
+
+def time_particles(pool, step, seed):
+    # Keeps the pool at PARTICLE_COUNT and times one update-and-remove-dead pass per frame
+    rng, times = random.Random(seed), []
+    for _ in range(PARTICLE_FRAMES):
+        refill_particles(rng, pool.spawn, lambda: len(pool))
+        start = time.perf_counter(); step(pool); times.append(time.perf_counter() - start)
+    return times
+
+def step_object_list(pool):
+    # The previous loop: update each particle, then remove the dead one by one from the list
+    items = pool.items
+    for p in items[:]:
+        p.update()
+        if p.life <= 0: items.remove(p)
+
+def step_pool(pool):
+    pool.update(); pool.compact()
+
+def bench_particles():
+    client = load_client()
+    pools = [('object list + remove', client.ParticleList, step_object_list), ('object list', client.ParticleList, step_pool)]
+    if client.np is not None: pools.append(('struct of arrays', client.ParticleStore, step_pool))
+    print(f"{PARTICLE_COUNT} particles, update and drop expired per frame")
+    print(f"{'pool':>22} {'mean':>9} {'p99':>9}")
+    for name, make, step in pools:
+        times = time_particles(make(PARTICLE_COUNT), step, SEED)
+        print(f"{name:>22} {sum(times) / len(times) * 1000:>7.2f}ms {percentile(times, 99) * 1000:>7.2f}ms")
+
+def time_screen(client, draw, frames):
+    # Frame time, plus the part of it spent in the text helpers
+    spent = [0.0]
+    def timed(fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: spent[0] += time.perf_counter() - start
+        return wrapper
+    originals = client.draw_text, client.render_text
+    client.draw_text, client.render_text = map(timed, originals)
+    try:
+        start = time.perf_counter()
+        for _ in range(frames): draw()
+        return (time.perf_counter() - start) / frames, spent[0] / frames
+    finally:
+        client.draw_text, client.render_text = originals
+
+def legacy_starfield(client, stars):
+    # The previous starfield: a sin and a circle per star, every frame
+    def draw():
+        for i, (x, y, size, speed) in enumerate(stars):
+            y = stars[i][1] = (y + speed) % client.current_height
+            alpha = int(255 * (0.7 + 0.3 * math.sin(time.time() * 2 + i * 0.1)))
+            client.pygame.draw.circle(client.screen, (alpha, alpha, alpha), (int(x * client.scale_factor), int(y)), max(1, int(size * client.scale_factor)))
+    return draw
+
+def bench_screens():
+    client = load_client()
+    # A full ten-row leaderboard with the local player on it
+    client.player_id = 3
+    players = {pid: {'x': 0.0, 'y': 0.0, 'health': 100.0, 'name': f'Player{pid:03d}'} for pid in range(12)}
+    client.snapshot_buffer.add({'tick': 1, 'time': 0.0, 'players': players, 'bullets': {}, 'powerups': {}, 'walls': {}, 'stats': {}}, 0.0)
+    client.scoreboard_data.update({pid: 20 - pid for pid in players})
+    screens = [('info', lambda: client.draw_info_screen(False)), ('progress', client.draw_progress_screen),
+               ('achievements', client.draw_achievements_screen), ('leaderboard', client.draw_scoreboard)]
+    print(f"{'':>13} {'no caches':^19} {'text cache':^19} {'+ layers':>9}")
+    print(f"{'screen':>13} {'frame':>9} {'text':>9} {'frame':>9} {'text':>9} {'frame':>9}")
+    for name, draw in screens:
+        uncached_layers = lambda: (client.layers.clear(), draw())
+        client.text_surfaces.capacity = 0; client.text_surfaces.clear()
+        frame, text = time_screen(client, uncached_layers, TEXT_FRAMES)
+        client.text_surfaces.capacity = client.TEXT_CACHE_SIZE
+        cached_frame, cached_text = time_screen(client, uncached_layers, TEXT_FRAMES)
+        layered_frame, _ = time_screen(client, draw, TEXT_FRAMES)
+        print(f"{name:>13} {frame * 1000:>7.2f}ms {text * 1000:>7.2f}ms {cached_frame * 1000:>7.2f}ms {cached_text * 1000:>7.2f}ms {layered_frame * 1000:>7.2f}ms")
+    stars = [[x, y, size, random.uniform(0.1, 0.5)] for x, y, size, _ in client.starfield.stars]
+    legacy, _ = time_screen(client, legacy_starfield(client, stars), TEXT_FRAMES)
+    layered, _ = time_screen(client, client.draw_enhanced_starfield, TEXT_FRAMES)
+    print(f"{'starfield':>13} {legacy * 1000:>7.2f}ms {'':>9} {'':>9} {'':>9} {layered * 1000:>7.2f}ms")
+
+# game_loop's subsystems, looked up as module globals on every tick, and the phase each one is charged to
+SUBSYSTEM_HOOKS = {'rebuild_player_grid': 'grid', 'update_hazards': 'hazards', 'update_powerups': 'powerups',
+                   'update_bullets': 'bullets', 'update_bullets_vectorized': 'bullets'}
+PHASES = ['tick', 'grid', 'hazards', 'powerups', 'bullets', 'respawn', 'comeback']
+TRACED_PHASES = ['grid', 'hazards', 'powerups', 'bullets', 'comeback']
+
+def build_subsystem_world(num_players, num_bullets, seed, now):
+    # build_world on the simulated clock, with ids counted from zero, a second wall sweeping across and kills spread
+    # too thin for a comeback grant, so every run of the same world starts from the same state
+    server.entity_id_counter = server.tick_number = 0; server.tick_time = now
+    build_world(num_players, num_bullets, seed)
+    rng = random.Random(seed)
+    server.last_hazard_time = server.last_superpower_grant_time = now
+    for wall in server.walls: wall.spawn_time = now
+    server.spawn_wall(-20, rng.uniform(0, server.HEIGHT*0.3), 20, int(server.HEIGHT*0.4), 250, 0, now)
+    for pid in server.players: server.game_stats['kills'][pid] = rng.randrange(2) * server.KILL_SCORE
+
+def gc_collections():
+    return sum(stat['collections'] for stat in gc.get_stats())
+
+def simulate_subsystems(num_players, num_bullets, seed, traced):
+    # Runs SUBSYSTEM_TICKS ticks of game_loop and the comeback check on a simulated clock, topping bullets back up
+    # between ticks. Returns each tick's {phase: [seconds, allocated blocks retained, peak traced bytes]}, the GC
+    # collections it triggered and a fingerprint of the outcome. Peak memory is only traced when asked, as tracing distorts timing
+    now, rng = SUBSYSTEM_EPOCH, random.Random(seed)
+    build_subsystem_world(num_players, num_bullets, seed, now)
+    random.seed(seed)
+    ticks, outcome = [], []
+
+    def charge(phase, fn):
+        def wrapper(*args):
+            blocks = sys.getallocatedblocks()
+            if traced and phase in TRACED_PHASES: tracemalloc.reset_peak(); base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try: return fn(*args)
+            finally:
+                cost = ticks[-1][phase]
+                cost[0] += time.perf_counter() - start; cost[1] += sys.getallocatedblocks() - blocks
+                if traced and phase in TRACED_PHASES: cost[2] = max(cost[2], tracemalloc.get_traced_memory()[1] - base)
+        return wrapper
+
+    originals = {name: getattr(server, name) for name in SUBSYSTEM_HOOKS}
+    for name, phase in SUBSYSTEM_HOOKS.items(): setattr(server, name, charge(phase, originals[name]))
+    tick, comeback = charge('tick', server.game_loop), charge('comeback', server.check_for_comeback_power)
+    if traced: tracemalloc.start()
+    collections = gc_collections()
+    try:
+        # Grants are announced with print; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(SUBSYSTEM_TICKS):
+                while len(server.bullets) < num_bullets: spawn_random_bullet(rng, num_players)
+                ticks.append({phase: [0.0, 0, 0] for phase in PHASES})
+                tick(server.TICK_RATE, now)
+                # The real check runs every SUPERPOWER_CHECK_INTERVAL; here the cooldown is lifted so it does its full work every tick
+                server.last_superpower_grant_time = now - server.SUPERPOWER_COOLDOWN
+                comeback(now)
+                costs = ticks[-1]
+                costs['respawn'][:2] = [costs['tick'][i] - sum(costs[p][i] for p in ('grid', 'hazards', 'powerups', 'bullets')) for i in range(2)]
+                costs['tick'][2] = max(costs[p][2] for p in TRACED_PHASES if p != 'comeback')
+                outcome.append(([e['type'] for e in server.events_queue], len(server.bullets), len(server.walls)))
+                drop_events(); now += server.TICK_RATE
+    finally:
+        collections = gc_collections() - collections
+        if traced: tracemalloc.stop()
+        for name, fn in originals.items(): setattr(server, name, fn)
+    outcome.append(sorted((pid, p['health'], p['x'], p['y']) for pid, p in server.players.items()))
+    return ticks, collections, hashlib.sha1(repr(outcome).encode()).hexdigest()[:12]
+
+def summarize_subsystems(num_players, num_bullets):
+    ticks, collections, outcome = simulate_subsystems(num_players, num_bullets, SEED, False)
+    traced, _, traced_outcome = simulate_subsystems(num_players, num_bullets, SEED, True)
+    if outcome != traced_outcome: print(f"❌ Two runs of {num_players} players / {num_bullets} bullets ended differently"); sys.exit(1)
+    phases = {}
+    for phase in PHASES:
+        seconds = [t[phase][0] for t in ticks]
+        phases[phase] = {'p50_ms': percentile(seconds, 50) * 1000, 'p99_ms': percentile(seconds, 99) * 1000,
+                         'retained_blocks_per_tick': sum(t[phase][1] for t in ticks) / len(ticks)}
+        if phase != 'respawn': phases[phase]['peak_kib'] = max(t[phase][2] for t in traced) / 1024
+    return {'players': num_players, 'bullets': num_bullets, 'outcome': outcome, 'gc_collections': collections, 'phases': phases}
+
+def compare_subsystems(results, baseline):
+    # Returns the regressions: a phase whose median grew past SUBSYSTEM_TOLERANCE, or a world that plays out differently
+    if baseline['mode'] != results['mode']:
+        print(f"⚠️ Baseline ran in {baseline['mode']} mode and this run in {results['mode']}; timings are not comparable"); return []
+    regressions = []
+    for key, world in results['worlds'].items():
+        if (old := baseline['worlds'].get(key)) is None: continue
+        if world['outcome'] != old['outcome']: regressions.append(f"{key}: outcome changed ({old['outcome']} -> {world['outcome']})")
+        for phase, cost in world['phases'].items():
+            before = old['phases'].get(phase, {}).get('p50_ms', 0.0)
+            if before >= SUBSYSTEM_NOISE_MS and cost['p50_ms'] > before * SUBSYSTEM_TOLERANCE:
+                regressions.append(f"{key} {phase}: {before:.2f}ms -> {cost['p50_ms']:.2f}ms")
+    return regressions
+
+def bench_subsystems():
+    mode = 'numpy' if server.np is not None else 'grid'
+    set_mode(mode)
+    names = [p for p in PHASES if p != 'tick']
+    print(f"{mode} bullets, {SUBSYSTEM_TICKS} ticks per world, median ms per tick (tick p99), GC collections over the run")
+    print(f"{'players':>8} {'bullets':>8} {'tick':>7} {'p99':>7} " + " ".join(f"{p:>9}" for p in names) + f" {'gc':>4}")
+    results = {'mode': mode, 'python': sys.version.split()[0], 'seed': SEED, 'ticks': SUBSYSTEM_TICKS, 'worlds': {}}
+    for num_players in SUBSYSTEM_PLAYERS:
+        for num_bullets in SUBSYSTEM_BULLETS:
+            world = results['worlds'][f"{num_players}x{num_bullets}"] = summarize_subsystems(num_players, num_bullets)
+            phases = world['phases']
+            print(f"{num_players:>8} {num_bullets:>8} {phases['tick']['p50_ms']:>7.2f} {phases['tick']['p99_ms']:>7.2f} "
+                  + " ".join(f"{phases[p]['p50_ms']:>9.3f}" for p in names) + f" {world['gc_collections']:>4}")
+    print("\nPeak memory allocated within one call, KiB")
+    print(f"{'players':>8} {'bullets':>8} " + " ".join(f"{p:>9}" for p in TRACED_PHASES))
+    for world in results['worlds'].values():
+        print(f"{world['players']:>8} {world['bullets']:>8} " + " ".join(f"{world['phases'][p]['peak_kib']:>9.1f}" for p in TRACED_PHASES))
+    with open(SUBSYSTEM_RESULTS, 'w') as f: json.dump(results, f, indent=2)
+    print(f"\nSaved to {SUBSYSTEM_RESULTS}")
+    if SUBSYSTEM_BASELINE is None: return
+    with open(SUBSYSTEM_BASELINE) as f: baseline = json.load(f)
+    regressions = compare_subsystems(results, baseline)
+    for line in regressions: print(f"❌ {line}")
+    if regressions: sys.exit(1)
+    print(f"✅ No regressions against {SUBSYSTEM_BASELINE}")
+
+# The entity code as it was before the pools, for the gc suite's "before" row: bullets, power-ups and walls are
+# dicts in plain lists, every event is a new dict, and a snapshot copies each wall
+def dict_spawn_bullet(x, y, angle, owner_id, color, damage=server.BULLET_DAMAGE, is_fast=False):
+    speed = server.BULLET_SPEED * (server.FAST_BULLET_MULTIPLIER if is_fast else 1)
+    vx, vy = math.cos(angle) * speed, math.sin(angle) * speed
+    bullet_id, wire = server.next_entity_id(), {'ox': x, 'oy': y, 'ot': server.tick_time, 'vx': vx, 'vy': vy, 'color': color, 'owner_id': owner_id}
+    server.bullets.append({'id': bullet_id, 'wire': wire, 'x': x, 'y': y, 'vx': vx, 'vy': vy, 'owner_id': owner_id, 'color': color, 'damage': damage, 'is_fast': is_fast})
+
+def dict_bullets_snapshot():
+    return {b['id']: b['wire'] for b in server.bullets}
+
+def dict_spawn_powerup(x, y, p_type):
+    server.powerups.append({'id': server.next_entity_id(), 'x': x, 'y': y, 'type': p_type, **server.POWERUP_TYPES[p_type]})
+
+def dict_spawn_wall(x, y, width, height, vx, vy, current_time):
+    server.walls.append({'x': x, 'y': y, 'width': width, 'height': height, 'vx': vx, 'vy': vy, 'color': (255,0,100),
+                         'spawn_time': current_time, 'id': server.next_entity_id()})
+
+def dict_push_event(kind, **fields):
+    server.events_queue.append({'type': kind, **fields})
+
+def dict_update_hazards(dt, current_time):
+    if current_time - server.last_hazard_time > server.HAZARD_INTERVAL and not server.walls:
+        server.last_hazard_time = current_time
+        side, speed = random.choice(['v', 'h']), 250
+        if side == 'v':
+            x, y, width, height, vx, vy = -20, random.randint(0, int(server.HEIGHT*0.3)), 20, int(server.HEIGHT*0.4), speed, 0
+            if random.random() > 0.5: x, vx = server.WIDTH, -speed
+        else:
+            x, y, width, height, vx, vy = random.randint(0, int(server.WIDTH*0.3)), -20, int(server.WIDTH*0.4), 20, 0, speed
+            if random.random() > 0.5: y, vy = server.HEIGHT, -speed
+        dict_spawn_wall(x, y, width, height, vx, vy, current_time)
+    walls = server.walls
+    for w in walls[:]:
+        w['x'] += w['vx'] * dt; w['y'] += w['vy'] * dt
+        if current_time - w['spawn_time'] > server.HAZARD_DURATION: walls.remove(w); continue
+        for pid, p in server.players_in_rect(w, server.PLAYER_RADIUS):
+            player_rect = {'x': p['x']-server.PLAYER_RADIUS, 'y': p['y']-server.PLAYER_RADIUS, 'width': server.PLAYER_SIZE, 'height': server.PLAYER_SIZE}
+            if p['health'] > 0 and server.check_rect_collision(w, player_rect):
+                p['health'] = 0; p['death_time'] = current_time
+                server.game_stats['deaths'][pid] += 1; server.game_stats['streaks'][pid] = 0
+                dict_push_event('death', player_id=pid, pos=(p['x'], p['y']), color=p['color'])
+
+def dict_update_powerups(current_time):
+    powerups, reach = server.powerups, server.PLAYER_RADIUS + 15
+    if len(powerups) < server.MAX_POWERUPS and random.random() < server.POWERUP_SPAWN_CHANCE:
+        p_type = random.choice(list(server.POWERUP_TYPES.keys()))
+        dict_spawn_powerup(random.randint(50, server.WIDTH-50), random.randint(50, server.HEIGHT-50), p_type)
+    for p in powerups[:]:
+        for pid, player in server.players_near(p['x'], p['y'], reach):
+            if player['health'] > 0 and math.hypot(p['x']-player['x'], p['y']-player['y']) < reach:
+                if p['type'] == 'health': player['health'] = min(server.PLAYER_HEALTH, player['health'] + p['value'])
+                else: player[f"{p['type']}_boost"] = current_time + p['duration']
+                dict_push_event('powerup_collect', pos=(p['x'], p['y']), color=p['color'])
+                powerups.remove(p); break
+
+def dict_update_bullets(dt, current_time):
+    bullets, survivors, reach = server.bullets, [], server.PLAYER_RADIUS + server.BULLET_RADIUS
+    for bullet in bullets:
+        bullet['x'] += bullet['vx'] * dt
+        bullet['y'] += bullet['vy'] * dt
+        if not (0 < bullet['x'] < server.WIDTH and 0 < bullet['y'] < server.HEIGHT): continue
+        hit = False
+        for pid, player in server.players_near(bullet['x'], bullet['y'], reach):
+            if player['health'] <= 0 or pid == bullet['owner_id']: continue
+            if math.hypot(bullet['x']-player['x'], bullet['y']-player['y']) < reach:
+                server.apply_bullet_hit(pid, player, bullet['owner_id'], bullet['damage'], (bullet['x'], bullet['y']), bullet['color'], current_time)
+                hit = True; break
+        if not hit: survivors.append(bullet)
+    bullets[:] = survivors
+
+def dict_build_snapshot():
+    public_players = {}
+    for pid, p in server.players.items():
+        player_data = {'x': p['x'], 'y': p['y'], 'color': p['color'], 'health': p['health'], 'name': p['name'], 'superpower_ready': p.get('superpower_ready', False),
+                       'input_ack': p.get('input_ack', 0)}
+        if 'death_time' in p: player_data['death_time'] = p['death_time']
+        public_players[pid] = player_data
+    return {'tick': server.tick_number, 'time': server.tick_time, 'players': public_players, 'bullets': dict_bullets_snapshot(),
+            'powerups': {p['id']: p for p in server.powerups}, 'walls': {w['id']: dict(w) for w in server.walls},
+            'stats': {pid: {'kills': kills} for pid, kills in server.game_stats['kills'].items()}}
+
+def dict_record_snapshot():
+    snapshot = dict_build_snapshot()
+    server.snapshot_history[snapshot['tick']] = snapshot
+    for tick in [t for t in server.snapshot_history if t <= snapshot['tick'] - server.SNAPSHOT_HISTORY]: del server.snapshot_history[tick]
+    if server.events_queue: server.event_history.append((snapshot['tick'], list(server.events_queue)))
+    server.events_queue.clear()
+    return snapshot
+
+DICT_ENTITIES = {'spawn_bullet': dict_spawn_bullet, 'bullets_snapshot': dict_bullets_snapshot, 'spawn_powerup': dict_spawn_powerup,
+                 'spawn_wall': dict_spawn_wall, 'push_event': dict_push_event, 'update_hazards': dict_update_hazards,
+                 'update_powerups': dict_update_powerups, 'update_bullets': dict_update_bullets, 'build_snapshot': dict_build_snapshot,
+                 'record_snapshot': dict_record_snapshot}
+
+@contextlib.contextmanager
+def entity_path(pooled):
+    # The pools only hold list bullets, so both paths run without the NumPy store
+    originals = {name: getattr(server, name) for name in DICT_ENTITIES}
+    numpy_bullets, server.USE_NUMPY_BULLETS = server.USE_NUMPY_BULLETS, False
+    if not pooled:
+        for name, fn in DICT_ENTITIES.items(): setattr(server, name, fn)
+    try: yield
+    finally:
+        for name, fn in originals.items(): setattr(server, name, fn)
+        server.USE_NUMPY_BULLETS = numpy_bullets
+
+def superpower_rooms(rng, now, pooled):
+    # GC_ROOMS full rooms on the simulated clock, players spread out and the cooldowns left behind
+    rooms = []
+    for room_id in range(GC_ROOMS):
+        # server.players and friends are read through the module after entering, so each room fills its own copy
+        room = server.Room(room_id); server.enter_room(room); rooms.append(room)
+        if not pooled: server.bullets, server.powerups, server.walls = [], [], []
+        server.tick_time = server.last_hazard_time = server.last_superpower_grant_time = now
+        for i in range(server.MAX_PLAYERS_PER_ROOM):
+            pid = room_id * server.MAX_PLAYERS_PER_ROOM + i
+            server.players[pid] = {'x': rng.uniform(50, server.WIDTH-50), 'y': rng.uniform(50, server.HEIGHT-50), 'health': server.PLAYER_HEALTH,
+                                   'color': server.AVAILABLE_COLORS[i], 'name': f"Player {pid}", 'last_shot': 0}
+    return rooms
+
+def simulate_superpowers(seed, pooled, traced):
+    # Every player in every room fires at the shot cooldown and lets off a 32-bullet superpower every GC_SUPERPOWER_EVERY
+    # seconds, staggered, while the rooms tick and record snapshots as the server does. Returns the tick times,
+    # (generation, seconds) for every garbage collection that ran, peak traced bytes over the run and within one tick,
+    # and a fingerprint of the outcome. Memory is only traced when asked, as tracing distorts timing
+    rng, now = random.Random(seed), SUBSYSTEM_EPOCH
+    random.seed(seed)
+    ticks, pauses, started, tick_peak, home = [], [], [0.0], 0, server.current_room
+    def on_gc(phase, info):
+        if phase == 'start': started[0] = time.perf_counter()
+        else: pauses.append((info['generation'], time.perf_counter() - started[0]))
+    with entity_path(pooled):
+        if traced: tracemalloc.start()
+        rooms = superpower_rooms(rng, now, pooled)
+        shot_ticks, power_ticks = round(server.SHOOT_COOLDOWN / server.TICK_RATE), round(GC_SUPERPOWER_EVERY / server.TICK_RATE)
+        gc.collect(); gc.callbacks.append(on_gc)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for tick in range(int(GC_SECONDS / server.TICK_RATE)):
+                    if traced: tracemalloc.reset_peak(); base = tracemalloc.get_traced_memory()[0]
+                    start = time.perf_counter()
+                    for room in rooms:
+                        # Looked up again after every switch; holding server.players across rooms would mix them
+                        server.enter_room(room)
+                        for pid, p in server.players.items():
+                            if p['health'] <= 0: continue
+                            if (tick + pid) % shot_ticks == 0: server.spawn_bullet(p['x'], p['y'], rng.uniform(0, 2*math.pi), pid, p['color'])
+                            if (tick + pid * 7) % power_ticks == 0: p['superpower_ready'] = True; server.use_superpower(pid, p)
+                        server.game_loop(server.TICK_RATE, now)
+                        server.record_snapshot()
+                    ticks.append(time.perf_counter() - start); now += server.TICK_RATE
+                    if traced: tick_peak = max(tick_peak, tracemalloc.get_traced_memory()[1] - base)
+            outcome = []
+            for room in rooms:
+                server.enter_room(room)
+                outcome.append(sorted((pid, p['health'], p['x'], p['y']) for pid, p in server.players.items()))
+        finally:
+            gc.callbacks.remove(on_gc)
+            peak = tracemalloc.get_traced_memory()[1] if traced else 0
+            if traced: tracemalloc.stop()
+            server.enter_room(home)
+    return ticks, pauses, peak, tick_peak, hashlib.sha1(repr(outcome).encode()).hexdigest()[:12]
+
+def bench_gc():
+    # Runs alternate between the two paths, and each tick keeps its best time over GC_REPEATS runs so one scheduler
+    # hiccup can't set the max. GC figures come from each path's run with the least total collection time
+    print(f"{GC_ROOMS} rooms of {server.MAX_PLAYERS_PER_ROOM}, everyone firing and using a superpower every {GC_SUPERPOWER_EVERY:g}s, {GC_SECONDS}s simulated, "
+          f"list bullets, best of {GC_REPEATS}")
+    print(f"{'entities':>9} {'tick p50':>9} {'p99':>7} {'max':>7} {'gen0':>6} {'gen1':>6} {'gen2':>6} {'gc total':>9} {'gc max':>8} {'gen2 max':>9}  (ms)"
+          f" {'peak KiB':>9} {'tick KiB':>9}")
+    paths = (('dicts', False), ('pooled', True))
+    runs = {label: [] for label, _ in paths}
+    for _ in range(GC_REPEATS):
+        for label, pooled in paths: runs[label].append(simulate_superpowers(SEED, pooled, False))
+    outcomes = set()
+    for label, pooled in paths:
+        ticks = [min(samples) for samples in zip(*(run[0] for run in runs[label]))]
+        pauses = min((run[1] for run in runs[label]), key=lambda p: sum(d for _, d in p))
+        outcomes.update(run[4] for run in runs[label])
+        _, _, peak, tick_peak, _ = simulate_superpowers(SEED, pooled, True)
+        counts = [sum(1 for g, _ in pauses if g == gen) for gen in range(3)]
+        gen2 = [d for g, d in pauses if g == 2]
+        print(f"{label:>9} {percentile(ticks, 50) * 1000:>9.2f} {percentile(ticks, 99) * 1000:>7.2f} {max(ticks) * 1000:>7.2f} " + " ".join(f"{c:>6}" for c in counts) +
+              f" {sum(d for _, d in pauses) * 1000:>9.1f} {max((d for _, d in pauses), default=0) * 1000:>8.2f} {max(gen2, default=0) * 1000:>9.2f}"
+              f"      {peak / 1024:>9.0f} {tick_peak / 1024:>9.0f}")
+    if len(outcomes) > 1: print("❌ Pooled entities changed how the rooms played out"); sys.exit(1)
+
+SUITES = {'tick': bench_tick, 'protocol': bench_protocol, 'broadcast': bench_broadcast, 'loop': bench_loop, 'prediction': bench_prediction,
+          'interpolation': bench_interpolation, 'particles': bench_particles,
+          'screens': bench_screens, 'subsystems': bench_subsystems, 'gc': bench_gc}
+
+def pop_option(args, flag, default):
+    if flag not in args: return default
+    i = args.index(flag); value = args[i + 1]; del args[i:i + 2]
+    return value
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    SUBSYSTEM_RESULTS = pop_option(args, '--save', SUBSYSTEM_RESULTS)
+    SUBSYSTEM_BASELINE = pop_option(args, '--against', SUBSYSTEM_BASELINE)
+    for name in args or SUITES:
+        if name not in SUITES: print(f"Unknown suite '{name}', choose from: {', '.join(SUITES)}"); sys.exit(2)
+        print(f"\n=== {name} ==="); SUITES[name]()
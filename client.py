@@ -1,27 +1,63 @@
 import pygame
 import socket
-import pickle
 import math
 import sys
 import time
-import struct
 import random
 import json
 import os
-from collections import deque
+import bisect
+import select
+import threading
+import csv
+from collections import OrderedDict, deque
 from pygame.locals import *
+from protocol import FrameReader, ProtocolError, decode_message, pack_frame, rebuild_snapshot, replay_inputs, step_toward
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # --- Game Constants ---
 ORIGINAL_WIDTH, ORIGINAL_HEIGHT = 1000, 700
 FPS = 60
+MENU_FPS = 30
+IDLE_FPS = 10  # menus drop to this after IDLE_AFTER seconds without input
+IDLE_AFTER = 5.0
 HOST = '127.0.0.1'
 PORT = 5557
-SHOOT_COOLDOWN = 0.2
-INTERPOLATION_DELAY = 0.1 
+CONNECT_TIMEOUT = 2.0
+NETWORK_POLL = 0.5  # the network thread is woken for sends and shutdown, this only bounds how long it can miss one
+SERVER_TICK_RATE = 1.0 / 30.0
+INPUT_RATE = SERVER_TICK_RATE  # one command per server tick
+INPUT_REDUNDANCY = 3
+PLAYER_MAX_SPEED = 300
+INTERPOLATION_DELAY = 0.1  # until arrival jitter has been measured
+MAX_INTERPOLATION_DELAY = 0.25
+MAX_EXTRAPOLATION = 0.1
+MAX_BLEND_DISTANCE = 150  # bigger jumps between snapshots are teleports (respawns) and snap instead of sliding
+JITTER_WINDOW = 90
+MAX_PARTICLES = 600
+GLOW_CACHE_SIZE = 256
+GLOW_ALPHA_STEP = 16  # glow alpha is quantized so fading particles share a handful of sprites
+USE_NUMPY_PARTICLES = np is not None
+TEXT_CACHE_SIZE = 512
+STAR_COUNT = 200
+STAR_SPEEDS = (0.15, 0.3, 0.45)  # px per frame; one pre-rendered layer per speed gives the parallax
+STAR_BRIGHTNESS = 178
+TWINKLE_STARS = 24  # stars glinting at once; the glint walks through the field at TWINKLE_RATE stars per second
+TWINKLE_RATE = 20
 PLAYER_SIZE = 30
 SCREEN_PADDING = PLAYER_SIZE // 2
 RESPAWN_TIME = 3.0
 SAVE_FILE = 'blastr_progress.json'
+SAVE_DELAY = 2.0  # changes within this long of each other share one write
+PERF_WINDOW = 120  # frames behind the overlay's numbers
+PERF_TRACE_FRAMES = 3600  # frames kept for the CSV trace, a minute at full rate
+PERF_REFRESH = 0.25  # the overlay is re-rendered this often, not every frame
+PERF_TRACE_FILE = 'blastr_trace_{}.csv'
+RTT_SMOOTHING = 0.1
 
 if len(sys.argv) > 1: HOST = sys.argv[1]
 
@@ -49,6 +85,7 @@ class AchievementPopup:
         self.duration = 4.0
         self.slide_in_time = 0.5
         self.slide_out_time = 0.5
+        self.glow = None
 
     def draw(self, screen):
         global current_width, get_scaled_size, font_tiny, font_small, font_ui, scale_factor
@@ -72,10 +109,12 @@ class AchievementPopup:
         popup_x = current_width - popup_width - int(20 * scale_factor) + int(x_offset)
         popup_y = int(80 * scale_factor)
 
-        # Background with glow effect
-        glow_surf = pygame.Surface((popup_width + 20, popup_height + 20), pygame.SRCALPHA)
-        pygame.draw.rect(glow_surf, (255, 238, 88, 30), (0, 0, popup_width + 20, popup_height + 20), border_radius=15)
-        screen.blit(glow_surf, (popup_x - 10, popup_y - 10))
+        # Background with glow effect, rebuilt only when the scale changes
+        if self.glow is None or self.glow.get_size() != (popup_width + 20, popup_height + 20):
+            self.glow = pygame.Surface((popup_width + 20, popup_height + 20), pygame.SRCALPHA)
+            pygame.draw.rect(self.glow, (255, 238, 88, 30), (0, 0, popup_width + 20, popup_height + 20), border_radius=15)
+            self.glow = self.glow.convert_alpha()
+        screen.blit(self.glow, (popup_x - 10, popup_y - 10))
 
         # Main background
         pygame.draw.rect(screen, (25, 30, 50), (popup_x, popup_y, popup_width, popup_height), border_radius=12)
@@ -104,15 +143,15 @@ class AchievementPopup:
         text_x = icon_x + int(32 * scale_factor)
 
         # "ACHIEVEMENT UNLOCKED!" header (smaller)
-        header_surface = font_tiny.render("ACHIEVEMENT UNLOCKED!", True, (255, 238, 88))
+        header_surface = render_text("ACHIEVEMENT UNLOCKED!", font_tiny, (255, 238, 88))
         screen.blit(header_surface, (text_x, popup_y + int(8 * scale_factor)))
 
         # Achievement name
-        name_surface = font_small.render(self.achievement_name, True, (255, 255, 255))
+        name_surface = render_text(self.achievement_name, font_small, (255, 255, 255))
         screen.blit(name_surface, (text_x, popup_y + int(22 * scale_factor)))
 
         # Description
-        desc_surface = font_ui.render(self.description, True, (200, 200, 220))
+        desc_surface = render_text(self.description, font_ui, (200, 200, 220))
         screen.blit(desc_surface, (text_x, popup_y + int(38 * scale_factor)))
 
         return True  # Keep this popup
@@ -138,6 +177,43 @@ except:
     font_main,font_medium,font_small,font_ui,font_tiny,font_super,font_killstreak,font_title,font_tiny = [pygame.font.Font(None,s) for s in [48,32,24,20,18,42,62,96,14]]
 
 # --- Player Progress System ---
+class JsonWriter(threading.Thread):
+    # Write-behind JSON file. put() only swaps in the newest document; the thread waits SAVE_DELAY for more changes,
+    # then writes a temp file and renames it over the old one, so a crash mid-write leaves the previous save intact
+    def __init__(self, path, delay=SAVE_DELAY):
+        super().__init__(daemon=True)
+        self.path, self.delay = path, delay
+        self.pending, self.lock = None, threading.Lock()
+        self.changed, self.closing = threading.Event(), threading.Event()
+        self.start()
+
+    def put(self, data):
+        with self.lock: self.pending = data
+        self.changed.set()
+
+    def run(self):
+        while not self.closing.is_set():
+            self.changed.wait()
+            self.closing.wait(self.delay)
+            self.changed.clear()
+            self.write()
+
+    def write(self):
+        with self.lock: data, self.pending = self.pending, None
+        if data is None: return
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f); f.flush(); os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        # Flushes whatever is still pending before returning
+        self.closing.set(); self.changed.set()
+        self.join(); self.write()
+
 class PlayerProgress:
     def __init__(self):
         self.level = 1
@@ -154,6 +230,7 @@ class PlayerProgress:
         self.playtime = 0
         self.last_session_start = time.time()
         self.load_progress()
+        self.writer = JsonWriter(SAVE_FILE)
     
     def add_xp(self, amount):
         self.xp += amount
@@ -234,20 +311,21 @@ class PlayerProgress:
                 achievement_popups.append(AchievementPopup(achievement_name, description))
     
     def save_progress(self):
-        self.playtime += time.time() - self.last_session_start
-        data = {
+        # Cheap enough to call after every change: only a snapshot is taken here, the file is written in the background
+        now = time.time()
+        self.playtime += now - self.last_session_start; self.last_session_start = now
+        self.writer.put({
             'level': self.level, 'xp': self.xp, 'xp_to_next': self.xp_to_next,
             'total_kills': self.total_kills, 'total_deaths': self.total_deaths,
             'total_powerups': self.total_powerups, 'games_played': self.games_played,
             'best_killstreak': self.best_killstreak, 'achievements': list(self.achievements),
             'unlocked_titles': list(self.unlocked_titles), 'current_title': self.current_title,
             'playtime': self.playtime
-        }
-        try:
-            with open(SAVE_FILE, 'w') as f:
-                json.dump(data, f)
-        except:
-            pass
+        })
+    
+    def close(self):
+        self.save_progress()
+        self.writer.close()
     
     def load_progress(self):
         try:
@@ -270,42 +348,297 @@ class PlayerProgress:
             pass
 
 # --- Networking ---
-client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+class NetworkThread(threading.Thread):
+    # Owns the socket so connecting, reading and decoding never hold up a frame. Rebuilt snapshots come back through
+    # inbox, which the render loop drains each frame; messages queued with send() go out together on the next pass,
+    # after the ack for whatever was just received. state is 'connecting', then 'connected', then 'lost' or 'closed',
+    # or 'failed' if the connection never came up
+    def __init__(self, host, port, name):
+        super().__init__(daemon=True)
+        self.host, self.port, self.name = host, port, name
+        self.state, self.error, self.player_id, self.sock = 'connecting', None, None, None
+        self.inbox, self.outbox = deque(), deque()
+        self.decode_seconds = 0.0
+        self.reader, self.baselines, self.pending = FrameReader(), {}, bytearray()
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False); self.wake_send.setblocking(False)
+
+    def send(self, msg):
+        self.outbox.append(msg); self.wake()
+
+    def close(self):
+        self.state = 'closed'; self.wake()
+
+    def wake(self):
+        try: self.wake_send.send(b'\0')
+        except OSError: pass  # already has a wake-up pending, or shut down
+
+    def run(self):
+        try:
+            self.connect()
+        except Exception as e:
+            self.error, self.state = e, 'failed'
+            self.wake_recv.close(); self.wake_send.close()
+            if self.sock: self.sock.close()
+            return
+        try:
+            self.serve()
+        except (ProtocolError, OSError) as e:
+            self.error = e
+        finally:
+            if self.state == 'connected': self.state = 'lost'
+            self.sock.close(); self.wake_recv.close(); self.wake_send.close()
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        messages = []
+        while not messages:
+            if not self.reader.receive(self.sock): raise Exception("Server closed the connection.")
+            messages = [decode_message(payload) for payload in self.reader.frames()]
+        if 'id' not in (d:=messages[0]): raise Exception("No ID.")
+        self.player_id = d['id']
+        self.pending += pack_frame({'id': self.player_id, 'action': 'set_name', 'name': self.name})
+        self.sock.setblocking(False)
+        self.state = 'connected'
+
+    def serve(self):
+        while self.state == 'connected':
+            readable, _, _ = select.select([self.sock, self.wake_recv], [self.sock] if self.pending else [], [], NETWORK_POLL)
+            if self.wake_recv in readable:
+                try: self.wake_recv.recv(4096)
+                except BlockingIOError: pass
+            if self.sock in readable: self.receive()
+            while self.outbox: self.pending += pack_frame(self.outbox.popleft())
+            if self.pending:
+                try: del self.pending[:self.sock.send(self.pending)]
+                except BlockingIOError: pass
+
+    def receive(self):
+        try:
+            if not self.reader.receive(self.sock): raise ConnectionError("Server closed the connection.")
+        except (BlockingIOError, InterruptedError):
+            return
+        arrival, ack_tick, start = time.time(), None, time.perf_counter()
+        for payload in self.reader.frames():
+            msg = decode_message(payload)
+            if 'tick' not in msg: continue
+            snapshot = rebuild_snapshot(self.baselines, msg)
+            self.inbox.append((snapshot, msg['events'], arrival))
+            if snapshot is not None: ack_tick = snapshot['tick']
+            else: self.pending += pack_frame({'id': self.player_id, 'action': 'ack', 'tick': None})
+        if ack_tick is not None:
+            self.pending += pack_frame({'id': self.player_id, 'action': 'ack', 'tick': ack_tick})
+        self.decode_seconds += time.perf_counter() - start
+
+network = None
 player_id = None
 
-def receive_data(sock):
-    try:
-        raw_msglen = sock.recv(4);
-        if not raw_msglen: return None
-        msglen = struct.unpack('!I', raw_msglen)[0]
-        if msglen > 16384: return None
-        data = b''
-        while len(data) < msglen: data += sock.recv(msglen - len(data))
-        return pickle.loads(data)
-    except (struct.error, pickle.UnpicklingError, ConnectionAbortedError, ConnectionResetError, socket.timeout, BlockingIOError):
-        return None
-
-def send_data(sock, data):
-    try:
-        sock.sendall(struct.pack('!I', len(p := pickle.dumps(data))) + p); return True
-    except (ConnectionResetError, BrokenPipeError, OSError):
-        global connection_lost; connection_lost = True; return False
+class InputSampler:
+    # Render frames only sample input; one sequenced command goes out per server tick. Each packet repeats the last few
+    # commands so a late or lost packet is covered by the next one, and presses between sends are latched, not lost.
+    # Commands the server hasn't acknowledged yet are replayed on top of its latest position to predict our own.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seq = 0; self.history = deque(maxlen=INPUT_REDUNDANCY); self.unacked = deque(); self.next_send = 0.0
+        self.sent_at = deque(maxlen=64); self.rtt = None
+        self.fire = self.superpower = False
+        self.x, self.y, self.last_send = ORIGINAL_WIDTH / 2, ORIGINAL_HEIGHT / 2, 0.0
+
+    def sample(self, fire=False, superpower=False):
+        self.fire |= fire; self.superpower |= superpower
+
+    def due(self, now):
+        return now >= self.next_send
+
+    def command(self, now, target, angle):
+        self.seq += 1
+        command = {'seq': self.seq, 'x': target[0], 'y': target[1], 'angle': angle, 'fire': self.fire, 'superpower': self.superpower}
+        self.history.append(command); self.unacked.append(command)
+        self.fire = self.superpower = False
+        self.x, self.y = step_toward(self.x, self.y, target[0], target[1], PLAYER_MAX_SPEED * INPUT_RATE)
+        # Stay on a fixed cadence, but never try to catch up on sends missed during a stall
+        self.next_send = max(self.next_send + INPUT_RATE, now); self.last_send = now
+        self.sent_at.append((self.seq, now))
+        return {'id': player_id, 'action': 'input', 'commands': list(self.history)}
+
+    def reconcile(self, server_x, server_y, ack):
+        while self.unacked and self.unacked[0]['seq'] <= ack: self.unacked.popleft()
+        self.x, self.y = replay_inputs(server_x, server_y, self.unacked, PLAYER_MAX_SPEED * INPUT_RATE)
+
+    def acknowledge(self, ack, arrival):
+        # Smoothed time from sending a command to the snapshot that acks it. It includes the wait for the server's next
+        # tick, so it reads up to a tick above the bare network round trip
+        sent = None
+        while self.sent_at and self.sent_at[0][0] <= ack: seq, sent = self.sent_at.popleft()
+        if sent is None or seq != ack: return
+        self.rtt = arrival - sent if self.rtt is None else self.rtt + (arrival - sent - self.rtt) * RTT_SMOOTHING
+
+    def preview(self, now, target):
+        # Between sends, show the part of the next step that has already elapsed so movement stays smooth at any FPS
+        return step_toward(self.x, self.y, target[0], target[1], PLAYER_MAX_SPEED * min(now - self.last_send, INPUT_RATE))
+
+# --- Interpolation ---
+class SnapshotBuffer:
+    # Snapshots are kept in server-time order and the world is drawn slightly in the past, far enough back that the
+    # snapshot after the render time has normally arrived: one tick plus the measured spread of arrival delays
+    def __init__(self, maxlen=60):
+        self.maxlen = maxlen
+        self.clear()
+
+    def clear(self):
+        self.times, self.snapshots = [], []
+        self.transit = deque(maxlen=JITTER_WINDOW)  # local arrival time minus server time, per snapshot
+        self.fastest, self.delay = 0.0, INTERPOLATION_DELAY
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def latest(self):
+        return self.snapshots[-1]
+
+    def add(self, snapshot, arrival):
+        if self.times and snapshot['time'] <= self.times[-1]: return
+        self.times.append(snapshot['time']); self.snapshots.append(snapshot)
+        if len(self.times) > self.maxlen: del self.times[0], self.snapshots[0]
+        self.transit.append(arrival - snapshot['time'])
+        # The fastest recent arrival had the least queueing, so it anchors the server clock; the 95th percentile above
+        # it is how late a snapshot can reasonably be
+        ordered = sorted(self.transit)
+        self.fastest = ordered[0]
+        self.delay = min(MAX_INTERPOLATION_DELAY, SERVER_TICK_RATE + ordered[int(len(ordered) * 0.95)] - self.fastest)
+
+    def render_time(self, now):
+        return now - self.fastest - self.delay
+
+    def depth(self, t):
+        # Snapshots still ahead of render time t; zero means the next frame extrapolates
+        return len(self.times) - bisect.bisect_right(self.times, t)
+
+    def sample(self, t):
+        # The world at server time t: entities are blended between the two snapshots around t, or carried along their
+        # last velocity for at most MAX_EXTRAPOLATION when nothing that new has arrived yet
+        i = bisect.bisect_right(self.times, t)
+        if i == 0 or len(self.snapshots) < 2: return self.snapshots[i - 1 if i else 0]
+        if i == len(self.snapshots):
+            i -= 1; t = min(t, self.times[-1] + MAX_EXTRAPOLATION)
+        older, newer = self.snapshots[i - 1], self.snapshots[i]
+        alpha = (t - older['time']) / (newer['time'] - older['time'])
+        view = {'tick': newer['tick'], 'time': t, 'bullets': newer['bullets'], 'stats': newer['stats']}
+        for name in ('players', 'powerups', 'walls'):
+            before = older[name]
+            view[name] = {eid: blend(before.get(eid), entity, alpha) for eid, entity in newer[name].items()}
+        return view
+
+def blend(before, after, alpha):
+    if before is None or (before['x'] == after['x'] and before['y'] == after['y']): return after
+    dx, dy = after['x'] - before['x'], after['y'] - before['y']
+    if abs(dx) + abs(dy) > MAX_BLEND_DISTANCE: return after
+    return dict(after, x=before['x'] + dx * alpha, y=before['y'] + dy * alpha)
+
+# --- Layers ---
+class LayerCache:
+    # Full-screen panels rendered once and reused until the resolution or the content they show changes. key holds
+    # everything the panel depends on besides the screen size
+    def __init__(self):
+        self.layers = {}
+
+    def get(self, name, key, render, *args):
+        key = (current_width, current_height, key)
+        entry = self.layers.get(name)
+        if entry is None or entry[0] != key:
+            layer = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
+            render(layer, *args)
+            entry = self.layers[name] = (key, layer.convert_alpha())
+        return entry[1]
+
+    def clear(self):
+        self.layers.clear()
+
+class Starfield:
+    # Stars are baked into one colour-keyed texture per scroll speed and blitted twice around the wrap; RLE makes these
+    # mostly empty blits close to free. Twinkle is an additive glint over a small window of stars
+    def __init__(self):
+        self.stars = [(random.randint(0,ORIGINAL_WIDTH), random.randint(0,ORIGINAL_HEIGHT), random.randint(1,3), random.randrange(len(STAR_SPEEDS)))
+                      for _ in range(STAR_COUNT)]
+        self.offsets = [0.0] * len(STAR_SPEEDS)
+        self.size, self.textures, self.placed = None, [], []
+
+    def render(self):
+        self.size = (current_width, current_height)
+        self.placed = [(int(x * scale_factor), y * current_height // ORIGINAL_HEIGHT, max(1, int(size * scale_factor)), band)
+                       for x, y, size, band in self.stars]
+        self.textures = []
+        for band in range(len(STAR_SPEEDS)):
+            texture = pygame.Surface(self.size).convert()
+            for x, y, radius, b in self.placed:
+                if b == band: pygame.draw.circle(texture, (STAR_BRIGHTNESS,) * 3, (x, y), radius)
+            texture.set_colorkey((0, 0, 0), RLEACCEL)
+            self.textures.append(texture)
+
+    def draw(self, s):
+        if self.size != (current_width, current_height): self.render()
+        for band, texture in enumerate(self.textures):
+            self.offsets[band] = (self.offsets[band] + STAR_SPEEDS[band]) % current_height
+            y = int(self.offsets[band])
+            s.blit(texture, (0, y)); s.blit(texture, (0, y - current_height))
+        # Each star brightens and fades as the window slides over it
+        start, glints = int(time.time() * TWINKLE_RATE), []
+        for k in range(TWINKLE_STARS):
+            x, y, radius, band = self.placed[(start + k) % STAR_COUNT]
+            alpha = int(255 * math.sin(math.pi * (k + 0.5) / TWINKLE_STARS)) // GLOW_ALPHA_STEP * GLOW_ALPHA_STEP
+            sprite = glow_sprites.get((radius, (255 - STAR_BRIGHTNESS,) * 3, alpha), render_glow, radius, (255 - STAR_BRIGHTNESS,) * 3, alpha)
+            glints.append((sprite, (x - radius, (y + int(self.offsets[band])) % current_height - radius), None, BLEND_RGB_ADD))
+        s.blits(glints, doreturn=False)
 
 # --- Game State & FX ---
 progress = PlayerProgress()
 game_screen = 'main_menu'; running = True
-predicted_pos = {'x': ORIGINAL_WIDTH/2, 'y': ORIGINAL_HEIGHT/2}; server_snapshots = deque(maxlen=60)
-player_display_positions = {}; my_player_health = 100; my_player_max_health = 100
+predicted_pos = {'x': ORIGINAL_WIDTH/2, 'y': ORIGINAL_HEIGHT/2}; snapshot_buffer = SnapshotBuffer()
+my_player_health = 100; my_player_max_health = 100
+last_event_tick = -1
 scoreboard_data = {}; connection_lost = False; player_name = "Player"+str(random.randint(100,999))
 input_box = pygame.Rect(ORIGINAL_WIDTH/2-175, ORIGINAL_HEIGHT/2-70, 350, 50); input_active = False
-last_shot_time = 0; superpower_available = False
-screen_shake = 0; particles = []; announcements = []; level_up_announcements = []
-starfield = [(random.randint(0,ORIGINAL_WIDTH), random.randint(0,ORIGINAL_HEIGHT), random.randint(1,3), random.uniform(0.1, 0.5)) for _ in range(200)]
+superpower_available = False; input_sampler = InputSampler()
+screen_shake = 0; announcements = []; level_up_announcements = []
+starfield = Starfield(); layers = LayerCache()
 show_info_panel = False; show_progress_panel = False; show_achievements_panel = False; achievement_popups = []
 fullscreen = False; current_killstreak = 0; game_start_time = None; survival_time = 0
 
 
 # --- Enhanced Particle Effects ---
+class SurfaceCache:
+    # Least-recently-used cache of pre-rendered surfaces; render(*args) builds a surface on a miss
+    def __init__(self, capacity):
+        self.capacity, self.surfaces = capacity, OrderedDict()
+
+    def get(self, key, render, *args):
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = self.surfaces[key] = render(*args)
+            if len(self.surfaces) > self.capacity: self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+def render_glow(radius, color, alpha):
+    # Colour is premultiplied onto black, so an additive blit brightens what is underneath without per-pixel alpha
+    surf = pygame.Surface((radius * 2, radius * 2)).convert()
+    pygame.draw.circle(surf, [c * alpha // 255 for c in color], (radius, radius), radius)
+    return surf
+
+glow_sprites = SurfaceCache(GLOW_CACHE_SIZE)
+
+def spawn_particles(count, x, y, color, life, sizes, particle_type):
+    # Bursts shrink as the particle budget fills, so busy fights thin out the effects instead of the frame rate
+    free = particles.budget - len(particles)
+    if free <= 0: return
+    particles.spawn(min(free, max(1, count * free // particles.budget)), x, y, color, life, sizes, particle_type)
+
 class EnhancedParticle:
     def __init__(self, x, y, color, life, size, velocity=None, particle_type='normal'):
         self.x, self.y, self.color, self.life, self.max_life = x, y, color, life, life
@@ -329,25 +662,127 @@ class EnhancedParticle:
     def draw(self, s):
         if self.size > 0:
             if self.fade:
-                alpha = int(255 * (self.life / self.max_life))
-                color_with_alpha = (*self.color, alpha)
-                glow_surf = pygame.Surface((int(self.size*4), int(self.size*4)), pygame.SRCALPHA)
-                pygame.draw.circle(glow_surf, color_with_alpha, (int(self.size*2), int(self.size*2)), int(self.size))
-                s.blit(glow_surf, (int(self.x - self.size*2), int(self.y - self.size*2)))
+                if (radius := int(self.size)) < 1: return
+                alpha = int(255 * (self.life / self.max_life)) // GLOW_ALPHA_STEP * GLOW_ALPHA_STEP
+                sprite = glow_sprites.get((radius, self.color, alpha), render_glow, radius, self.color, alpha)
+                s.blit(sprite, (int(self.x) - radius, int(self.y) - radius), special_flags=BLEND_RGB_ADD)
             else:
                 pygame.draw.circle(s, self.color, (int(self.x), int(self.y)), int(self.size))
 
+PARTICLE_TYPES = ('normal', 'glow', 'float')
+GLOW = PARTICLE_TYPES.index('glow')
+
+class ParticleStore:
+    # Struct-of-arrays particles updated a whole frame at a time. Every type shares one update: gravity is zero for
+    # floating particles and drag is one for the rest
+    def __init__(self, budget=MAX_PARTICLES):
+        self.budget, self.count = budget, 0
+        self.palette = []
+        self.x, self.y = np.zeros(budget), np.zeros(budget)
+        self.vx, self.vy = np.zeros(budget), np.zeros(budget)
+        self.gravity, self.drag = np.zeros(budget), np.ones(budget)
+        self.life, self.max_life, self.size = np.zeros(budget), np.ones(budget), np.zeros(budget)
+        self.color = np.zeros(budget, dtype=np.int16)
+        self.kind = np.zeros(budget, dtype=np.int8)
+        self.rng = np.random.default_rng()
+
+    def _arrays(self):
+        return (self.x, self.y, self.vx, self.vy, self.gravity, self.drag, self.life, self.max_life, self.size, self.color, self.kind)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def color_index(self, color):
+        color = tuple(color)
+        if color not in self.palette: self.palette.append(color)
+        return self.palette.index(color)
+
+    def spawn(self, count, x, y, color, life, sizes, particle_type):
+        i, j = self.count, min(self.count + count, self.budget)
+        if i == j: return
+        self.x[i:j], self.y[i:j] = x, y
+        self.vx[i:j] = self.rng.uniform(-2, 2, j - i); self.vy[i:j] = self.rng.uniform(-3, -1, j - i)
+        self.gravity[i:j] = {'normal': 0.05, 'glow': 0.02, 'float': 0.0}[particle_type]
+        self.drag[i:j] = 0.98 if particle_type == 'float' else 1.0
+        self.life[i:j] = self.max_life[i:j] = life
+        self.size[i:j] = self.rng.integers(sizes[0], sizes[1] + 1, j - i)
+        self.color[i:j], self.kind[i:j] = self.color_index(color), PARTICLE_TYPES.index(particle_type)
+        self.count = j
+
+    def update(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]; self.y[:n] += self.vy[:n]
+        self.vy[:n] += self.gravity[:n]
+        self.vx[:n] *= self.drag[:n]; self.vy[:n] *= self.drag[:n]
+        self.life[:n] -= 1; self.size[:n] -= 0.1
+
+    def draw(self, s):
+        n = self.count
+        visible = np.flatnonzero(self.size[:n] >= 1)
+        if not len(visible): return
+        radius = self.size[visible].astype(np.int64)
+        xs, ys = self.x[visible].astype(np.int64), self.y[visible].astype(np.int64)
+        glow = self.kind[visible] == GLOW
+        alpha = (255 * self.life[visible] / self.max_life[visible]).astype(np.int64) // GLOW_ALPHA_STEP * GLOW_ALPHA_STEP
+        palette, blits = self.palette, []
+        for r, x, y, c, a, g in zip(radius.tolist(), xs.tolist(), ys.tolist(), self.color[visible].tolist(), alpha.tolist(), glow.tolist()):
+            if g:
+                sprite = glow_sprites.get((r, palette[c], a), render_glow, r, palette[c], a)
+                blits.append((sprite, (x - r, y - r), None, BLEND_RGB_ADD))
+            else:
+                pygame.draw.circle(s, palette[c], (x, y), r)
+        if blits: s.blits(blits, doreturn=False)
+
+    def compact(self):
+        # One stable pass: survivors slide down over the dead, keeping draw order
+        n = self.count
+        alive = self.life[:n] > 0
+        live = int(np.count_nonzero(alive))
+        if live < n:
+            for arr in self._arrays(): arr[:live] = arr[:n][alive]
+        self.count = live
+
+class ParticleList:
+    # Fallback without NumPy: the same interface over EnhancedParticle objects
+    def __init__(self, budget=MAX_PARTICLES):
+        self.budget, self.items = budget, []
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        self.items.clear()
+
+    def spawn(self, count, x, y, color, life, sizes, particle_type):
+        for _ in range(min(count, self.budget - len(self.items))):
+            self.items.append(EnhancedParticle(x, y, color, life, random.randint(*sizes), particle_type=particle_type))
+
+    def update(self):
+        for p in self.items: p.update()
+
+    def draw(self, s):
+        for p in self.items: p.draw(s)
+
+    def compact(self):
+        self.items = [p for p in self.items if p.life > 0]
+
+particles = ParticleStore() if USE_NUMPY_PARTICLES else ParticleList()
+
 class Announcement:
     def __init__(self, text, color=(255,255,255), duration=2.5, size='normal'):
         self.text, self.start_time, self.duration = text, time.time(), duration
         self.color = color
         self.font = font_super if size == 'large' else font_main if size == 'medium' else font_medium
+        self.surface = self.font.render(self.text, 1, self.color).convert_alpha()  # own copy, since its alpha changes every frame
     
     def draw(self, s, index):
         age = time.time()-self.start_time
         if age < self.duration:
             alpha = max(0, 255*(1-(age/self.duration)**2))
-            ts=self.font.render(self.text,1,self.color);ts.set_alpha(alpha)
+            ts=self.surface;ts.set_alpha(alpha)
             y_pos = 20 + (index * 60)
             s.blit(ts,ts.get_rect(topright=(current_width - 20, y_pos)))
 
@@ -378,7 +813,7 @@ class Button:
         pygame.draw.rect(s, self.shadow, shadow_pos, border_radius=int(12*scale_factor))
         pygame.draw.rect(s, self.hover if self.is_hovered else self.color, main_pos, border_radius=int(12*scale_factor))
         
-        text_surface = self.font.render(self.text, 1, (255,255,255))
+        text_surface = render_text(self.text, self.font, (255,255,255))
         s.blit(text_surface, text_surface.get_rect(center=main_pos.center))
     
     def check_hover(self, m):
@@ -392,23 +827,136 @@ class Button:
     
     def is_clicked(self, e):
         return self.is_hovered and e.type == MOUSEBUTTONDOWN and e.button == 1
+    
+    def bounds(self):
+        # Everything draw() can touch: the face, pressed or not, and the shadow under it
+        return pygame.Rect(
+            int(self.rect.x * scale_factor),
+            int(self.rect.y * scale_factor),
+            int(self.rect.width * scale_factor),
+            int(self.rect.height * scale_factor) + int(5 * scale_factor)
+        )
+
+class FramePresenter:
+    # Animated screens go to the display whole. Static screens are only redrawn when their state changes, and then
+    # only the changed rects are pushed. Menus run at a lower frame rate, lower still once the player goes idle
+    def __init__(self):
+        self.state = None
+        self.last_input = time.time()
+
+    def frame_rate(self, screen_name):
+        if screen_name in ('playing', 'dead'): return FPS
+        return IDLE_FPS if time.time() - self.last_input > IDLE_AFTER else MENU_FPS
+
+    def static(self, state, rects):
+        # Returns None when the screen already shows this state, else the rects to update (an empty list means all)
+        if state == self.state: return None
+        same_layout = self.state is not None and self.state[0] == state[0]
+        self.state = state
+        return rects if same_layout else []
+
+    def animated(self):
+        self.state = None
+        return []
+
+    def present(self, dirty):
+        if dirty: pygame.display.update(dirty)
+        else: pygame.display.flip()
+
+presenter = FramePresenter()
+
+# --- Performance HUD ---
+FRAME_PHASES = ('events', 'receive', 'interpolation', 'world', 'particles', 'ui', 'flip')
+TRACE_FIELDS = ('time', 'frame_ms') + tuple(f'{p}_ms' for p in FRAME_PHASES) + ('idle_ms', 'decode_ms', 'snapshots', 'buffer_depth', 'rtt_ms', 'particles')
+
+class FrameProfiler:
+    # Records every frame, overlay or not, so a trace saved right after a stutter still holds it
+    def __init__(self):
+        self.visible = False
+        self.frames = deque(maxlen=PERF_TRACE_FRAMES)  # one TRACE_FIELDS row per frame, times in seconds
+        self.phases = dict.fromkeys(FRAME_PHASES, 0.0)
+        self.start = self.mark = time.perf_counter()
+        self.snapshots, self.decoded = 0, (None, 0.0)
+        self.panel, self.panel_time = None, 0.0
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] += now - self.mark; self.mark = now
+
+    def frame(self):
+        # Closes the previous frame; called once per loop, right after clock.tick
+        now = time.perf_counter()
+        total, phases = now - self.start, [self.phases[p] for p in FRAME_PHASES]
+        decoded = network.decode_seconds if network else 0.0
+        previous = self.decoded[1] if self.decoded[0] is network else 0.0
+        depth = snapshot_buffer.depth(snapshot_buffer.render_time(time.time())) if snapshot_buffer else 0
+        self.frames.append((time.time(), total, *phases, max(0.0, total - sum(phases)), decoded - previous, self.snapshots, depth,
+                            input_sampler.rtt, len(particles)))
+        self.decoded, self.snapshots = (network, decoded), 0
+        for p in FRAME_PHASES: self.phases[p] = 0.0
+        self.start = self.mark = now
+
+    def summary(self):
+        recent = list(self.frames)[-PERF_WINDOW:]
+        elapsed = sum(f[1] for f in recent) or 1.0
+        ordered = sorted(f[1] for f in recent)
+        pct = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+        field = TRACE_FIELDS.index
+        averages = {p: sum(f[field(f'{p}_ms')] for f in recent) / len(recent) * 1000 for p in FRAME_PHASES + ('idle',)}
+        rtt = recent[-1][field('rtt_ms')]
+        return [f"FPS {len(recent) / elapsed:5.1f}   frame p50 {pct(0.5):5.1f}  p95 {pct(0.95):5.1f}  p99 {pct(0.99):5.1f}  max {ordered[-1] * 1000:5.1f} ms",
+                *(f"{p:>13} {ms:6.2f} ms" for p, ms in averages.items()),
+                f"snapshots {sum(f[field('snapshots')] for f in recent) / elapsed:5.1f}/s   decode {sum(f[field('decode_ms')] for f in recent) / elapsed * 1000:4.1f} ms/s",
+                f"buffer {recent[-1][field('buffer_depth')]} ahead, delay {snapshot_buffer.delay * 1000:.0f} ms   RTT {'-' if rtt is None else f'{rtt * 1000:.0f} ms'}",
+                f"particles {recent[-1][field('particles')]}   F3 hide  F4 save trace"]
+
+    def draw(self, s):
+        # Redrawn a few times a second into its own surface; per-frame numbers would only churn the text cache
+        if self.panel is None or time.time() - self.panel_time >= PERF_REFRESH:
+            lines = self.summary() if self.frames else ["waiting for frames"]
+            rendered = [font_tiny.render(line, True, (200, 255, 200)) for line in lines]
+            height = sum(r.get_height() for r in rendered)
+            self.panel = pygame.Surface((max(r.get_width() for r in rendered) + 16, height + 16), pygame.SRCALPHA)
+            self.panel.fill((0, 0, 0, 170))
+            y = 8
+            for r in rendered: self.panel.blit(r, (8, y)); y += r.get_height()
+            self.panel = self.panel.convert_alpha(); self.panel_time = time.time()
+        s.blit(self.panel, (get_scaled_size(20), get_scaled_size(60)))
+
+    def save_trace(self):
+        name = PERF_TRACE_FILE.format(time.strftime('%Y%m%d-%H%M%S'))
+        with open(name, 'w', newline='') as f:
+            writer = csv.writer(f); writer.writerow(TRACE_FIELDS)
+            for row in self.frames:
+                seconds = [f"{v * 1000:.3f}" for v in row[1:TRACE_FIELDS.index('snapshots')]]
+                rtt = row[TRACE_FIELDS.index('rtt_ms')]
+                writer.writerow([f"{row[0]:.3f}", *seconds, row[TRACE_FIELDS.index('snapshots')], row[TRACE_FIELDS.index('buffer_depth')],
+                                 '' if rtt is None else f"{rtt * 1000:.1f}", row[-1]])
+        return name
+
+frame_profiler = FrameProfiler()
 
 # --- Functions ---
 def connect_to_server():
-    global player_id, game_screen, connection_lost, client, game_start_time
-    try:
-        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client.settimeout(2.0)
-        client.connect((HOST, PORT))
-        if not (d:=receive_data(client)) or 'id' not in d: raise Exception("No ID.")
-        player_id = d['id']; send_data(client, {'id':player_id,'action':'set_name','name':f"{player_name}"})
-        client.setblocking(False)
-        game_screen, connection_lost = 'playing', False
-        game_start_time = time.time()
-        progress.games_played += 1
-        print(f"🎮 Connected as Player #{player_id}")
-    except Exception as e:
-        print(f"❌ Connect failed: {e}"); game_screen, connection_lost = 'main_menu', True
+    global network, game_screen
+    if network: network.close()
+    network = NetworkThread(HOST, PORT, player_name)
+    network.start()
+    game_screen = 'connecting'
+
+def poll_connection():
+    # Runs every frame on the connecting screen until the network thread is connected or has given up
+    global player_id, game_screen, connection_lost, game_start_time, last_event_tick
+    if network.state == 'connecting': return
+    if network.state != 'connected':
+        print(f"❌ Connect failed: {network.error}"); game_screen, connection_lost = 'main_menu', True
+        return
+    player_id = network.player_id
+    snapshot_buffer.clear(); last_event_tick = -1; input_sampler.reset()
+    game_screen, connection_lost = 'playing', False
+    game_start_time = time.time()
+    progress.games_played += 1
+    print(f"🎮 Connected as Player #{player_id}")
 
 def toggle_fullscreen():
     global fullscreen, screen, current_width, current_height, scale_factor
@@ -424,14 +972,35 @@ def toggle_fullscreen():
     
     # Calculate scale factor for UI elements
     scale_factor = min(current_width / ORIGINAL_WIDTH, current_height / ORIGINAL_HEIGHT)
+    text_surfaces.clear(); layers.clear()
+
+# --- Text Cache ---
+# Rendered strings are reused across frames; scaled shadow offsets depend on scale_factor, so toggle_fullscreen clears it
+text_surfaces = SurfaceCache(TEXT_CACHE_SIZE)
+
+def render_text(t, f, c, alpha=None):
+    # Surfaces with an alpha are keyed separately, so set_alpha never leaks into an opaque copy
+    return text_surfaces.get((t, f, c, alpha), render_faded, t, f, c, alpha)
+
+def render_faded(t, f, c, alpha):
+    ts = f.render(t, True, c).convert_alpha()
+    if alpha is not None: ts.set_alpha(alpha)
+    return ts
 
-def draw_text(t, f, c, p, sh=True, l=False, ce=False, scale=True):
+def render_shadowed(t, f, c, sh, scale):
+    # The text and, if wanted, its drop shadow with the offset to blit it at
+    ts = f.render(t, True, c).convert_alpha()
+    if not sh: return ts, None, None
+    return ts, f.render(t, True, (0,0,0,100)).convert_alpha(), get_scaled_size(2) if scale else 2
+
+def draw_text(t, f, c, p, sh=True, l=False, ce=False, scale=True, s=None):
+    s = screen if s is None else s
     if scale:
         pos = get_scaled_pos(p[0], p[1]) if isinstance(p, tuple) else p
     else:
         pos = p
     
-    ts = f.render(t, True, c)
+    ts, shadow, shadow_offset = text_surfaces.get((t, f, c, sh, scale), render_shadowed, t, f, c, sh, scale)
     if l:
         tr = ts.get_rect(midleft=pos)
     elif ce:
@@ -439,36 +1008,26 @@ def draw_text(t, f, c, p, sh=True, l=False, ce=False, scale=True):
     else:
         tr = ts.get_rect(topleft=pos)
     
-    if sh:
-        shadow_offset = get_scaled_size(2) if scale else 2
-        screen.blit(f.render(t, True, (0,0,0,100)), (tr.x+shadow_offset, tr.y+shadow_offset))
-    screen.blit(ts, tr)
+    if shadow:
+        s.blit(shadow, (tr.x+shadow_offset, tr.y+shadow_offset))
+    s.blit(ts, tr)
 
-def draw_progress_bar(x, y, width, height, progress_ratio, bg_color, fill_color):
+def draw_progress_bar(x, y, width, height, progress_ratio, bg_color, fill_color, s=None):
+    s = screen if s is None else s
     scaled_x, scaled_y = get_scaled_pos(x, y)
     scaled_width, scaled_height = get_scaled_size(width), get_scaled_size(height)
     
     # Background
-    pygame.draw.rect(screen, bg_color, (scaled_x, scaled_y, scaled_width, scaled_height), border_radius=int(4*scale_factor))
+    pygame.draw.rect(s, bg_color, (scaled_x, scaled_y, scaled_width, scaled_height), border_radius=int(4*scale_factor))
     # Fill
     if progress_ratio > 0:
         fill_width = int(scaled_width * progress_ratio)
-        pygame.draw.rect(screen, fill_color, (scaled_x, scaled_y, fill_width, scaled_height), border_radius=int(4*scale_factor))
+        pygame.draw.rect(s, fill_color, (scaled_x, scaled_y, fill_width, scaled_height), border_radius=int(4*scale_factor))
     # Border
-    pygame.draw.rect(screen, (90,90,110), (scaled_x, scaled_y, scaled_width, scaled_height), int(2*scale_factor), border_radius=int(4*scale_factor))
+    pygame.draw.rect(s, (90,90,110), (scaled_x, scaled_y, scaled_width, scaled_height), int(2*scale_factor), border_radius=int(4*scale_factor))
 
 def draw_enhanced_starfield():
-    for i, (x, y, size, speed) in enumerate(starfield):
-        new_y = (y + speed) % current_height
-        starfield[i] = (x, new_y, size, speed)
-        
-        # Add twinkling effect
-        twinkle = 0.7 + 0.3 * math.sin(time.time() * 2 + i * 0.1)
-        alpha = int(255 * twinkle)
-        color = (alpha, alpha, alpha)
-        
-        scaled_size = max(1, int(size * scale_factor))
-        pygame.draw.circle(screen, color, (int(x * scale_factor), int(new_y)), scaled_size)
+    starfield.draw(screen)
 
 def draw_main_menu():
     draw_enhanced_starfield()
@@ -477,7 +1036,7 @@ def draw_main_menu():
     title_y = get_scaled_size(ORIGINAL_HEIGHT//4)
     for offset in range(5, 0, -1):
         alpha = 50 - offset * 8
-        glow_surf = font_title.render("BLASTR!", True, (66, 165, 245, alpha))
+        glow_surf = render_text("BLASTR!", font_title, (66, 165, 245, alpha))
         title_rect = glow_surf.get_rect(center=(current_width//2, title_y))
         screen.blit(glow_surf, (title_rect.x + offset, title_rect.y + offset))
     
@@ -503,7 +1062,7 @@ def draw_main_menu():
     pygame.draw.rect(screen, (20,20,35), scaled_input_box, border_radius=int(8*scale_factor))
     pygame.draw.rect(screen, (66,165,245) if input_active else (90,90,110), scaled_input_box, int(2*scale_factor), border_radius=int(8*scale_factor))
     
-    name_surface = font_medium.render(player_name, 1, (255,255,255))
+    name_surface = render_text(player_name, font_medium, (255,255,255))
     screen.blit(name_surface, (scaled_input_box.x + get_scaled_size(15), scaled_input_box.y + get_scaled_size(8)))
     
     # Stats
@@ -515,11 +1074,12 @@ def draw_main_menu():
         draw_text("Failed to connect.", font_small, (239,83,80), (current_width//2, current_height - get_scaled_size(50)), ce=True, scale=False)
 
 def draw_info_screen(is_loading):
-    overlay = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
-    overlay.fill((19, 21, 40, 235 if is_loading else 220))
-    screen.blit(overlay, (0,0))
+    screen.blit(layers.get('info', is_loading, render_info_panel, is_loading), (0, 0))
+
+def render_info_panel(s, is_loading):
+    s.fill((19, 21, 40, 235 if is_loading else 220))
     
-    draw_text("HOW TO PLAY", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False)
+    draw_text("HOW TO PLAY", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False, s=s)
     
     box_width, box_height = get_scaled_size(280), get_scaled_size(400)
     start_x = (current_width - (box_width * 3 + get_scaled_size(40) * 2)) // 2
@@ -542,32 +1102,32 @@ def draw_info_screen(is_loading):
         box_x = start_x + i * (box_width + get_scaled_size(40))
         box_rect = pygame.Rect(box_x, get_scaled_size(150), box_width, box_height)
         
-        pygame.draw.rect(overlay, (25, 30, 50, 200), box_rect, border_radius=int(15*scale_factor))
-        pygame.draw.rect(overlay, (100, 110, 140, 200), box_rect, int(2*scale_factor), border_radius=int(15*scale_factor))
+        pygame.draw.rect(s, (25, 30, 50, 200), box_rect, border_radius=int(15*scale_factor))
+        pygame.draw.rect(s, (100, 110, 140, 200), box_rect, int(2*scale_factor), border_radius=int(15*scale_factor))
         
-        draw_text(title, font_medium, (255, 238, 88), (box_rect.centerx, get_scaled_size(185)), ce=True, scale=False)
+        draw_text(title, font_medium, (255, 238, 88), (box_rect.centerx, get_scaled_size(185)), ce=True, scale=False, s=s)
         
         y_offset = get_scaled_size(240)
         for color, item_title, desc in items:
             if item_title == "LASER WALL":
                 icon_rect = pygame.Rect(box_x + get_scaled_size(30), y_offset + get_scaled_size(15), get_scaled_size(40), get_scaled_size(10))
-                pygame.draw.rect(screen, color, icon_rect, border_radius=int(3*scale_factor))
+                pygame.draw.rect(s, color, icon_rect, border_radius=int(3*scale_factor))
             elif item_title == "COMEBACK":
                 center_x, center_y = box_x + get_scaled_size(50), y_offset + get_scaled_size(20)
                 for size in [get_scaled_size(25), get_scaled_size(20), get_scaled_size(15)]:
                     alpha = 50 + size * 2
                     glow_surf = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
                     pygame.draw.circle(glow_surf, (*color, alpha), (size, size), size)
-                    screen.blit(glow_surf, (center_x - size, center_y - size))
-                pygame.draw.circle(screen, color, (center_x, center_y), get_scaled_size(15))
-                pygame.draw.circle(screen, (255, 255, 255), (center_x - get_scaled_size(3), center_y - get_scaled_size(3)), get_scaled_size(8))
+                    s.blit(glow_surf, (center_x - size, center_y - size))
+                pygame.draw.circle(s, color, (center_x, center_y), get_scaled_size(15))
+                pygame.draw.circle(s, (255, 255, 255), (center_x - get_scaled_size(3), center_y - get_scaled_size(3)), get_scaled_size(8))
             else:
                 icon_rect = pygame.Rect(box_x + get_scaled_size(30), y_offset, get_scaled_size(40), get_scaled_size(40))
-                pygame.draw.rect(screen, color, icon_rect, border_radius=int(8*scale_factor))
-                pygame.draw.rect(screen, (255, 255, 255, 100), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
+                pygame.draw.rect(s, color, icon_rect, border_radius=int(8*scale_factor))
+                pygame.draw.rect(s, (255, 255, 255, 100), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
 
             text_y = y_offset + get_scaled_size(8) if item_title != "COMEBACK" else y_offset + get_scaled_size(8)
-            draw_text(item_title, font_small, (255, 255, 255), (box_x + get_scaled_size(85), text_y), l=True, scale=False)
+            draw_text(item_title, font_small, (255, 255, 255), (box_x + get_scaled_size(85), text_y), l=True, scale=False, s=s)
             
             # Text wrapping
             words = desc.split(' ')
@@ -576,27 +1136,30 @@ def draw_info_screen(is_loading):
             for word in words:
                 test_line = line + word + " "
                 if font_ui.size(test_line)[0] > box_width - get_scaled_size(100):
-                    draw_text(line, font_ui, (200, 200, 220), (box_x + get_scaled_size(85), line_y), l=True, scale=False)
+                    draw_text(line, font_ui, (200, 200, 220), (box_x + get_scaled_size(85), line_y), l=True, scale=False, s=s)
                     line = word + " "
                     line_y += get_scaled_size(20)
                 else:
                     line = test_line
-            draw_text(line, font_ui, (200, 200, 220), (box_x + get_scaled_size(85), line_y), l=True, scale=False)
+            draw_text(line, font_ui, (200, 200, 220), (box_x + get_scaled_size(85), line_y), l=True, scale=False, s=s)
             
             y_offset += get_scaled_size(100)
 
 def draw_progress_screen():
-    overlay = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
-    overlay.fill((19, 21, 40, 220))
-    screen.blit(overlay, (0,0))
+    key = (progress.level, progress.current_title, progress.xp, progress.xp_to_next, progress.total_kills, progress.total_deaths,
+           progress.best_killstreak, progress.games_played, progress.total_powerups, tuple(progress.unlocked_titles))
+    screen.blit(layers.get('progress', key, render_progress_panel), (0, 0))
+
+def render_progress_panel(s):
+    s.fill((19, 21, 40, 220))
     
-    draw_text("PLAYER PROGRESS", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False)
+    draw_text("PLAYER PROGRESS", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False, s=s)
     
     # Level and XP
     level_y = get_scaled_size(150)
-    draw_text(f"Level {progress.level} {progress.current_title}", font_medium, (255, 238, 88), (current_width//2, level_y), ce=True, scale=False)
-    draw_progress_bar(current_width//2 - get_scaled_size(200), level_y + get_scaled_size(40), 400, 25, progress.xp / progress.xp_to_next, (40,40,60), (66, 165, 245))
-    draw_text(f"XP: {progress.xp}/{progress.xp_to_next}", font_ui, (255,255,255), (current_width//2, level_y + get_scaled_size(52)), ce=True, scale=False)
+    draw_text(f"Level {progress.level} {progress.current_title}", font_medium, (255, 238, 88), (current_width//2, level_y), ce=True, scale=False, s=s)
+    draw_progress_bar(current_width//2 - get_scaled_size(200), level_y + get_scaled_size(40), 400, 25, progress.xp / progress.xp_to_next, (40,40,60), (66, 165, 245), s=s)
+    draw_text(f"XP: {progress.xp}/{progress.xp_to_next}", font_ui, (255,255,255), (current_width//2, level_y + get_scaled_size(52)), ce=True, scale=False, s=s)
     
     # Statistics
     stats_y = get_scaled_size(250)
@@ -612,25 +1175,26 @@ def draw_progress_screen():
     for i, (label, value, color) in enumerate(stats):
         x = current_width//4 + (i % 2) * current_width//2
         y = stats_y + (i // 2) * get_scaled_size(60)
-        draw_text(label, font_small, (200, 200, 220), (x, y), ce=True, scale=False)
-        draw_text(str(value), font_medium, color, (x, y + get_scaled_size(25)), ce=True, scale=False)
+        draw_text(label, font_small, (200, 200, 220), (x, y), ce=True, scale=False, s=s)
+        draw_text(str(value), font_medium, color, (x, y + get_scaled_size(25)), ce=True, scale=False, s=s)
     
     # Available Titles
     titles_y = get_scaled_size(450)
-    draw_text("UNLOCKED TITLES", font_small, (255, 238, 88), (current_width//2, titles_y), ce=True, scale=False)
+    draw_text("UNLOCKED TITLES", font_small, (255, 238, 88), (current_width//2, titles_y), ce=True, scale=False, s=s)
     
     title_list = list(progress.unlocked_titles)
     for i, title in enumerate(title_list):
         color = (255, 238, 88) if title == progress.current_title else (200, 200, 220)
         x = current_width//2 - len(title_list) * get_scaled_size(80) + i * get_scaled_size(160)
-        draw_text(title, font_ui, color, (x, titles_y + get_scaled_size(30)), ce=True, scale=False)
+        draw_text(title, font_ui, color, (x, titles_y + get_scaled_size(30)), ce=True, scale=False, s=s)
 
 def draw_achievements_screen():
-    overlay = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
-    overlay.fill((19, 21, 40, 220))
-    screen.blit(overlay, (0,0))
+    screen.blit(layers.get('achievements', frozenset(progress.achievements), render_achievements_panel), (0, 0))
+
+def render_achievements_panel(s):
+    s.fill((19, 21, 40, 220))
     
-    draw_text("ACHIEVEMENTS", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False)
+    draw_text("ACHIEVEMENTS", font_main, (255,255,255), (current_width//2, get_scaled_size(80)), ce=True, scale=False, s=s)
     
     achievement_list = [
         ("First Blood", "Get your first kill", "First Blood" in progress.achievements),
@@ -650,17 +1214,17 @@ def draw_achievements_screen():
         # Achievement icon
         icon_rect = pygame.Rect(current_width//2 - get_scaled_size(300), y, get_scaled_size(50), get_scaled_size(50))
         if unlocked:
-            pygame.draw.rect(screen, (255, 238, 88), icon_rect, border_radius=int(8*scale_factor))
-            pygame.draw.rect(screen, (255, 255, 255), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
-            draw_text("★", font_medium, (19, 21, 40), (icon_rect.centerx, icon_rect.centery), ce=True, scale=False)
+            pygame.draw.rect(s, (255, 238, 88), icon_rect, border_radius=int(8*scale_factor))
+            pygame.draw.rect(s, (255, 255, 255), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
+            draw_text("★", font_medium, (19, 21, 40), (icon_rect.centerx, icon_rect.centery), ce=True, scale=False, s=s)
         else:
-            pygame.draw.rect(screen, (50, 50, 70), icon_rect, border_radius=int(8*scale_factor))
-            pygame.draw.rect(screen, (100, 100, 120), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
-            draw_text("?", font_medium, (100, 100, 120), (icon_rect.centerx, icon_rect.centery), ce=True, scale=False)
+            pygame.draw.rect(s, (50, 50, 70), icon_rect, border_radius=int(8*scale_factor))
+            pygame.draw.rect(s, (100, 100, 120), icon_rect, int(2*scale_factor), border_radius=int(8*scale_factor))
+            draw_text("?", font_medium, (100, 100, 120), (icon_rect.centerx, icon_rect.centery), ce=True, scale=False, s=s)
         
         # Achievement text
-        draw_text(name, font_small, color, (current_width//2 - get_scaled_size(230), y + get_scaled_size(5)), l=True, scale=False)
-        draw_text(desc, font_ui, (150, 150, 170), (current_width//2 - get_scaled_size(230), y + get_scaled_size(30)), l=True, scale=False)
+        draw_text(name, font_small, color, (current_width//2 - get_scaled_size(230), y + get_scaled_size(5)), l=True, scale=False, s=s)
+        draw_text(desc, font_ui, (150, 150, 170), (current_width//2 - get_scaled_size(230), y + get_scaled_size(30)), l=True, scale=False, s=s)
 
 def draw_playing_ui(health, max_health):
     # Health bar
@@ -712,8 +1276,7 @@ def draw_playing_ui(health, max_health):
     # Superpower indicator
     if superpower_available:
         alpha = 128 + 127*math.sin(time.time()*5)
-        glow_text = font_super.render("PRESS [F] - COMEBACK READY!", 1, (255,238,88))
-        glow_text.set_alpha(alpha)
+        glow_text = render_text("PRESS [F] - COMEBACK READY!", font_super, (255,238,88), int(alpha) // GLOW_ALPHA_STEP * GLOW_ALPHA_STEP)
         text_rect = glow_text.get_rect(center=(current_width//2, current_height - get_scaled_size(60)))
         screen.blit(glow_text, text_rect)
 
@@ -728,24 +1291,28 @@ def draw_player(pos, color, name, is_local):
     draw_text(name, font_ui, name_color, (x, y - get_scaled_size(25)), ce=True, scale=False)
 
 def draw_scoreboard():
-    if not server_snapshots: return
-    pd = server_snapshots[-1].get('players', {})
+    if not snapshot_buffer: return
+    pd = snapshot_buffer.latest().get('players', {})
     sp = sorted(scoreboard_data.items(), key=lambda i: i[1], reverse=True)
+    rows = tuple((pd.get(pid, {}).get('name', '?'), kills, pid == player_id) for pid, kills in sp[:10])
+    screen.blit(layers.get('scoreboard', rows, render_scoreboard, rows), (0, 0))
+
+def render_scoreboard(s, rows):
+    s.fill((19, 21, 40, 220))
     
-    overlay = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
-    overlay.fill((19, 21, 40, 220))
-    screen.blit(overlay, (0, 0))
-    
-    draw_text("LEADERBOARD", font_main, (255,255,255), (current_width//2, get_scaled_size(100)), ce=True, scale=False)
+    draw_text("LEADERBOARD", font_main, (255,255,255), (current_width//2, get_scaled_size(100)), ce=True, scale=False, s=s)
     
-    for i, (pid, kills) in enumerate(sp[:10]):
-        name = pd.get(pid, {}).get('name', '?')
-        row_color = (255, 238, 88) if pid == player_id else (220, 220, 220)
+    for i, (name, kills, is_local) in enumerate(rows):
+        row_color = (255, 238, 88) if is_local else (220, 220, 220)
         
         y_pos = get_scaled_size(180) + i * get_scaled_size(40)
-        draw_text(f"#{i+1}", font_medium, row_color, (current_width//2 - get_scaled_size(250), y_pos), l=True, scale=False)
-        draw_text(name, font_medium, row_color, (current_width//2 - get_scaled_size(150), y_pos), l=True, scale=False)
-        draw_text(str(kills), font_medium, row_color, (current_width//2 + get_scaled_size(250), y_pos), ce=True, scale=False)
+        draw_text(f"#{i+1}", font_medium, row_color, (current_width//2 - get_scaled_size(250), y_pos), l=True, scale=False, s=s)
+        draw_text(name, font_medium, row_color, (current_width//2 - get_scaled_size(150), y_pos), l=True, scale=False, s=s)
+        draw_text(str(kills), font_medium, row_color, (current_width//2 + get_scaled_size(250), y_pos), ce=True, scale=False, s=s)
+
+def render_death_panel(s):
+    s.fill((20, 20, 35, 200))
+    draw_text("YOU WERE BLASTED!", font_main, (239, 83, 80), (current_width//2, current_height//2 - get_scaled_size(80)), ce=True, scale=False, s=s)
 
 # Create scaled buttons
 def create_buttons():
@@ -765,8 +1332,7 @@ def handle_game_events(events):
     for ev in events:
         if ev['type'] == 'hit':
             # Enhanced hit particles
-            for _ in range(8):
-                particles.append(EnhancedParticle(ev['pos'][0], ev['pos'][1], ev['color'], 20, random.randint(3,6), particle_type='glow'))
+            spawn_particles(8, ev['pos'][0], ev['pos'][1], ev['color'], 20, (3, 6), 'glow')
             if ev['target_id'] == player_id:
                 global screen_shake
                 screen_shake = 15
@@ -800,8 +1366,7 @@ def handle_game_events(events):
                 progress.total_deaths += 1
                 progress.save_progress()  # Save death count immediately
                 # Death particles
-                for _ in range(30):
-                    particles.append(EnhancedParticle(ev['pos'][0], ev['pos'][1], (239, 83, 80), 40, random.randint(4,10), particle_type='normal'))
+                spawn_particles(30, ev['pos'][0], ev['pos'][1], (239, 83, 80), 40, (4, 10), 'normal')
         
         elif ev['type'] == 'kill_streak':
             streak_texts = {2:"DOUBLE KILL!", 3:"TRIPLE KILL!", 4:"MEGA KILL!", 5:"ULTRA KILL!"}
@@ -813,32 +1378,38 @@ def handle_game_events(events):
             progress.add_xp(5)  # Small XP for collecting power-ups
             progress.save_progress()  # Save powerup count immediately
             # Powerup particles
-            for _ in range(15):
-                particles.append(EnhancedParticle(ev['pos'][0], ev['pos'][1], ev['color'], 25, random.randint(2,5), particle_type='float'))
+            spawn_particles(15, ev['pos'][0], ev['pos'][1], ev['color'], 25, (2, 5), 'float')
 
 
 def main():
-    global game_screen, running, player_name, input_active, last_shot_time, superpower_available
+    global game_screen, running, player_name, input_active, superpower_available
     global screen_shake, particles, announcements, level_up_announcements, show_info_panel
-    global show_progress_panel, show_achievements_panel, connection_lost, client, player_id
-    global predicted_pos, server_snapshots, player_display_positions, my_player_health
+    global show_progress_panel, show_achievements_panel, connection_lost, network, player_id
+    global predicted_pos, snapshot_buffer, my_player_health
     global my_player_max_health, scoreboard_data, fullscreen, screen, current_killstreak
-    global game_start_time, survival_time, progress, achievement_popups
+    global game_start_time, survival_time, progress, achievement_popups, last_event_tick
     
     play_btn, quit_btn, start_game_btn = create_buttons()
     
     while running:
-        dt = clock.tick(FPS) / 1000.0
+        clock.tick(presenter.frame_rate(game_screen))
+        frame_profiler.frame()
         m_pos = pygame.mouse.get_pos()
         
         # Handle events
         for e in pygame.event.get():
+            presenter.last_input = time.time()
             if e.type == QUIT or (e.type == KEYDOWN and e.key == K_ESCAPE):
                 running = False
             
             if e.type == KEYDOWN:
                 if e.key == K_F11:
                     toggle_fullscreen()
+                elif e.key == K_F3:
+                    frame_profiler.visible = not frame_profiler.visible
+                elif e.key == K_F4:
+                    trace = frame_profiler.save_trace(); print(f"📈 Frame trace saved to {trace}")
+                    announcements.append(Announcement(f"Trace saved to {trace}", (200, 255, 200), 2.5))
             
             # Menu handling
             if game_screen == 'main_menu':
@@ -870,7 +1441,7 @@ def main():
             elif game_screen == 'loading':
                 start_game_btn.check_hover(m_pos)
                 if start_game_btn.is_clicked(e):
-                    game_screen = 'connecting'
+                    connect_to_server()
             
             elif game_screen in ['playing', 'dead']:
                 if e.type == KEYDOWN:
@@ -886,6 +1457,14 @@ def main():
                         show_achievements_panel = not show_achievements_panel
                         show_info_panel = False
                         show_progress_panel = False
+        frame_profiler.lap('events')
+        
+        # The loading screen only changes when the start button does
+        if game_screen == 'loading':
+            dirty = presenter.static(((current_width, current_height), start_game_btn.is_hovered, pygame.mouse.get_pressed()[0]), [start_game_btn.bounds()])
+            if dirty is None: continue
+        else:
+            dirty = presenter.animated()
         
         # Clear screen
         screen.fill((19, 21, 40))
@@ -897,8 +1476,7 @@ def main():
         
         elif game_screen == 'connecting':
             draw_text("Connecting...", font_main, (255,255,255), (current_width//2, current_height//2), ce=True, scale=False)
-            pygame.display.flip()
-            connect_to_server()
+            poll_connection()
         
         elif game_screen == 'main_menu':
             draw_main_menu()
@@ -906,46 +1484,36 @@ def main():
             quit_btn.draw(screen)
         
         elif game_screen in ['playing', 'dead']:
-            if connection_lost:
+            if network.state != 'connected':
+                connection_lost = True
                 progress.save_progress()
                 game_screen = 'main_menu'
                 continue
             
-            # Receive server data
-            while True:
-                gd = receive_data(client)
-                if gd is None:
-                    break
+            # Snapshots the network thread has decoded since the last frame (it has already acked them)
+            while network.inbox:
+                snapshot, events, arrival = network.inbox.popleft()
+                # Handle events (resent until acknowledged, so skip ticks already seen)
+                new_events = [ev for ev in events if ev['tick'] > last_event_tick]
+                if new_events:
+                    last_event_tick = new_events[-1]['tick']
+                    handle_game_events(new_events)
                 
-                if 'players' in gd:
-                    gd['timestamp'] = time.time()
-                    server_snapshots.append(gd)
-                    scoreboard_data = gd.get('stats', {})
-                    
-                    # Handle events
-                    if 'events' in gd:
-                        handle_game_events(gd['events'])
-            
-            # Player interpolation
-            if len(server_snapshots) >= 2:
-                s_a, s_b = server_snapshots[-1], server_snapshots[-2]
-                if (td := s_a['timestamp'] - s_b['timestamp']) > 0:
-                    t = max(0.0, min(1.0, (time.time() - INTERPOLATION_DELAY - s_b['timestamp']) / td))
-                    for pid in s_a['players']:
-                        if pid != player_id and pid in s_b['players']:
-                            b, a = s_b['players'][pid], s_a['players'][pid]
-                            player_display_positions[pid] = {
-                                'x': b['x'] + (a['x'] - b['x']) * t,
-                                'y': b['y'] + (a['y'] - b['y']) * t
-                            }
+                if snapshot is None:
+                    continue
+                snapshot_buffer.add(snapshot, arrival); frame_profiler.snapshots += 1
+                scoreboard_data = {pid: s['kills'] for pid, s in snapshot['stats'].items()}
+                if player_id in snapshot['players']: input_sampler.acknowledge(snapshot['players'][player_id]['input_ack'], arrival)
+            frame_profiler.lap('receive')
             
             # Update player state
             death_time = None
-            if server_snapshots and player_id in (latest := server_snapshots[-1])['players']:
+            if snapshot_buffer and player_id in (latest := snapshot_buffer.latest())['players']:
                 my_player_data = latest['players'][player_id]
                 my_player_health = my_player_data['health']
                 superpower_available = my_player_data.get('superpower_ready', False)
                 death_time = my_player_data.get('death_time')
+                input_sampler.reconcile(my_player_data['x'], my_player_data['y'], my_player_data['input_ack'])
                 
                 new_screen = 'dead' if my_player_health <= 0 and game_screen == 'playing' else 'playing' if my_player_health > 0 and game_screen == 'dead' else game_screen
                 game_screen = new_screen
@@ -953,26 +1521,22 @@ def main():
             # Input handling
             keys = pygame.key.get_pressed()
             if game_screen == 'playing':
-                # Shooting
-                if (pygame.mouse.get_pressed()[0] or keys[K_SPACE]) and time.time() - last_shot_time > SHOOT_COOLDOWN:
-                    last_shot_time = time.time()
-                    angle = math.atan2(m_pos[1] - predicted_pos['y'] * scale_factor, m_pos[0] - predicted_pos['x'] * scale_factor)
-                    send_data(client, {'id': player_id, 'action': 'shoot', 'angle': angle})
+                # Shooting (the server applies its cooldown)
+                input_sampler.sample(fire=pygame.mouse.get_pressed()[0] or keys[K_SPACE])
                 
                 # Superpower
                 if keys[K_f] and superpower_available:
-                    send_data(client, {'id': player_id, 'action': 'activate_superpower'})
+                    input_sampler.sample(superpower=True)
                     superpower_available = False
                 
-                # Movement prediction
-                target_x = m_pos[0] / scale_factor
-                target_y = m_pos[1] / scale_factor
-                predicted_pos['x'] += (target_x - predicted_pos['x']) * 0.2
-                predicted_pos['y'] += (target_y - predicted_pos['y']) * 0.2
-                predicted_pos['x'] = max(SCREEN_PADDING, min(ORIGINAL_WIDTH - SCREEN_PADDING, predicted_pos['x']))
-                predicted_pos['y'] = max(SCREEN_PADDING, min(ORIGINAL_HEIGHT - SCREEN_PADDING, predicted_pos['y']))
-                
-                send_data(client, {'id': player_id, 'action': 'move', 'pos': (predicted_pos['x'], predicted_pos['y'])})
+                # Movement prediction: head for the cursor at the server's speed, reconciled against each snapshot above
+                target = (max(SCREEN_PADDING, min(ORIGINAL_WIDTH - SCREEN_PADDING, m_pos[0] / scale_factor)),
+                          max(SCREEN_PADDING, min(ORIGINAL_HEIGHT - SCREEN_PADDING, m_pos[1] / scale_factor)))
+                if input_sampler.due(now := time.time()):
+                    angle = math.atan2(m_pos[1] - predicted_pos['y'] * scale_factor, m_pos[0] - predicted_pos['x'] * scale_factor)
+                    network.send(input_sampler.command(now, target, angle))
+                predicted_pos['x'], predicted_pos['y'] = input_sampler.preview(now, target)
+            frame_profiler.lap('events')
             
             # Screen shake
             screen_offset = (0, 0)
@@ -986,33 +1550,36 @@ def main():
             # Draw game world
             draw_enhanced_starfield()
             
+            frame_profiler.lap('world')
+            
             # Update and draw particles
-            for p in particles[:]:
-                p.update()
-                p.draw(screen)
-                if p.life <= 0:
-                    particles.remove(p)
+            particles.update()
+            particles.draw(screen)
+            particles.compact()
+            frame_profiler.lap('particles')
             
             # Draw game objects
-            if server_snapshots:
-                latest = server_snapshots[-1]
+            if snapshot_buffer:
+                view = snapshot_buffer.sample(snapshot_buffer.render_time(time.time()))
+                frame_profiler.lap('interpolation')
                 
                 # Draw players
-                for pid, p_data in latest['players'].items():
+                for pid, p_data in view['players'].items():
                     if p_data['health'] > 0:
-                        pos = predicted_pos if pid == player_id else player_display_positions.get(pid, p_data)
+                        pos = predicted_pos if pid == player_id else p_data
                         adjusted_pos = {'x': pos['x'] + screen_offset[0]/scale_factor, 'y': pos['y'] + screen_offset[1]/scale_factor}
                         draw_player(adjusted_pos, p_data['color'], p_data['name'], pid == player_id)
                 
                 # Draw bullets
-                for b in latest['bullets']:
+                for b in view['bullets'].values():
+                    if (flight_time := view['time'] - b['ot']) < 0: continue
                     color = b.get('color', (255, 238, 88))
-                    x = int((b['x'] + screen_offset[0]/scale_factor) * scale_factor)
-                    y = int((b['y'] + screen_offset[1]/scale_factor) * scale_factor)
+                    x = int((b['ox'] + b['vx'] * flight_time + screen_offset[0]/scale_factor) * scale_factor)
+                    y = int((b['oy'] + b['vy'] * flight_time + screen_offset[1]/scale_factor) * scale_factor)
                     pygame.draw.circle(screen, color, (x, y), get_scaled_size(5))
                 
                 # Draw power-ups
-                for p in latest.get('powerups', []):
+                for p in view['powerups'].values():
                     color = p.get('color', (255, 255, 255))
                     x = int((p['x'] - 10 + screen_offset[0]/scale_factor) * scale_factor)
                     y = int((p['y'] - 10 + screen_offset[1]/scale_factor) * scale_factor)
@@ -1020,12 +1587,13 @@ def main():
                     pygame.draw.rect(screen, color, (x, y, size, size), border_radius=int(4*scale_factor))
                 
                 # Draw walls/hazards
-                for w in latest.get('walls', []):
+                for w in view['walls'].values():
                     x = int((w['x'] + screen_offset[0]/scale_factor) * scale_factor)
                     y = int((w['y'] + screen_offset[1]/scale_factor) * scale_factor)
                     width = int(w['width'] * scale_factor)
                     height = int(w['height'] * scale_factor)
                     pygame.draw.rect(screen, w['color'], (x, y, width, height))
+            frame_profiler.lap('world')
             
             # Check survival time for achievements
             if game_start_time:
@@ -1070,23 +1638,24 @@ def main():
             
             # Death screen
             if game_screen == 'dead':
-                overlay = pygame.Surface((current_width, current_height), pygame.SRCALPHA)
-                overlay.fill((20, 20, 35, 200))
-                screen.blit(overlay, (0, 0))
-                
-                draw_text("YOU WERE BLASTED!", font_main, (239, 83, 80), (current_width//2, current_height//2 - get_scaled_size(80)), ce=True, scale=False)
+                screen.blit(layers.get('death', None, render_death_panel), (0, 0))
                 
                 if death_time:
                     time_left = RESPAWN_TIME - (time.time() - death_time)
                     if time_left > 0:
                         draw_text(f"RESPAWNING IN {math.ceil(time_left)}", font_main, (255, 255, 255), (current_width//2, current_height//2), ce=True, scale=False)
+            
+            if frame_profiler.visible:
+                frame_profiler.draw(screen)
+        frame_profiler.lap('ui')
         
-        pygame.display.flip()
+        presenter.present(dirty)
+        frame_profiler.lap('flip')
     
     # Save progress before quitting
-    progress.save_progress()
-    if client:
-        client.close()
+    progress.close()
+    if network:
+        network.close()
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,274 @@
+import sys
+import os
+import json
+import math
+import random
+import socket
+import asyncio
+import multiprocessing
+import subprocess
+import tempfile
+import time
+from collections import deque
+import server
+from protocol import FrameReader, ProtocolError, decode_message, pack_frame, rebuild_snapshot
+
+# --- Load Test Settings ---
+# `python loadtest.py --bots 200 --seconds 30` starts a local server and connects 200 bots to it; add `--host H --port P`
+# to load an already running server instead. `--behaviour`, `--fire`, `--no-superpower`, `--ramp` and `--select` tune the run
+BOTS = 100
+SECONDS = 30.0
+RAMP_SECONDS = 5.0  # bots connect evenly over this long and measuring starts once they all have
+HOST = '127.0.0.1'
+PORT = 5598
+SEED = 1337
+BEHAVIOURS = ('wander', 'chase', 'still')
+BEHAVIOUR = 'wander'
+FIRE_CHANCE = 0.3  # per input command; the server's shot cooldown still applies
+INPUT_REDUNDANCY = 3
+CONNECT_TIMEOUT = 5.0
+BOTS_PER_PROCESS = 100  # `--processes N` overrides; by default one process per hundred bots, up to one per core
+STARTUP_SECONDS = 0.5  # lets every harness process start before the first bot is due
+
+# The spawned server is the real one with tick_rooms wrapped to record (wall time, duration, process CPU time) for
+# every tick; the records are written out when the harness terminates it
+SERVER_PROBE = """
+import json, os, signal, time, server
+server.PORT = {port}
+ticks, tick_rooms = [], server.tick_rooms
+def timed_tick_rooms(dt):
+    start = time.perf_counter()
+    try: return tick_rooms(dt)
+    finally: ticks.append((time.time(), time.perf_counter() - start, time.process_time()))
+def dump(signum, frame):
+    with open({path!r}, 'w') as f: json.dump(ticks, f)
+    os._exit(0)
+server.tick_rooms = timed_tick_rooms
+signal.signal(signal.SIGTERM, dump)
+server.main()
+"""
+
+# --- Bots ---
+class Bot(asyncio.BufferedProtocol):
+    # A headless client: it decodes and acks every snapshot like client.py's network thread, and sends one sequenced
+    # input command per server tick with the same redundancy, steering by its behaviour instead of the mouse
+    def __init__(self, harness, index):
+        self.harness, self.index = harness, index
+        self.rng = random.Random(SEED + index)
+        self.reader = FrameReader()
+        self.baselines = {}
+        self.transport = self.pid = self.snapshot = None
+        self.seq = 0; self.history = deque(maxlen=INPUT_REDUNDANCY)
+        self.target = self.random_point()
+        self.bytes_in = self.bytes_out = 0
+        self.measured = False
+
+    def random_point(self):
+        return self.rng.uniform(50, server.WIDTH - 50), self.rng.uniform(50, server.HEIGHT - 50)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def get_buffer(self, sizehint):
+        return self.reader.space()
+
+    def buffer_updated(self, nbytes):
+        self.reader.filled(nbytes); self.bytes_in += nbytes
+        arrival, ack_tick = time.time(), None
+        try:
+            for payload in self.reader.frames():
+                msg = decode_message(payload)
+                if 'tick' not in msg:
+                    self.pid = msg['id']; self.send({'id': self.pid, 'action': 'set_name', 'name': f"Bot {self.index}"})
+                    continue
+                snapshot = rebuild_snapshot(self.baselines, msg)
+                if snapshot is None: self.send({'id': self.pid, 'action': 'ack', 'tick': None}); continue
+                self.snapshot, ack_tick = snapshot, snapshot['tick']
+                if self.measured: self.harness.record_snapshot(arrival - snapshot['time'])
+        except ProtocolError as e:
+            print(f"💥 Bot {self.index}: {e}"); self.transport.close(); return
+        if ack_tick is not None: self.send({'id': self.pid, 'action': 'ack', 'tick': ack_tick})
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if not self.harness.stopping: self.harness.disconnects += 1
+
+    def send(self, msg):
+        if self.transport is None or self.transport.is_closing(): return
+        framed = pack_frame(msg)
+        self.transport.write(framed); self.bytes_out += len(framed)
+
+    def step(self):
+        if self.transport is None or self.pid is None or self.snapshot is None: return
+        me = self.snapshot['players'].get(self.pid)
+        if me is None or me['health'] <= 0: return
+        others = [p for pid, p in self.snapshot['players'].items() if pid != self.pid and p['health'] > 0]
+        nearest = min(others, key=lambda p: math.hypot(p['x'] - me['x'], p['y'] - me['y'])) if others else None
+        behaviour = self.harness.behaviour
+        if behaviour == 'still': self.target = (me['x'], me['y'])
+        elif behaviour == 'chase' and nearest is not None: self.target = (nearest['x'], nearest['y'])
+        elif math.hypot(self.target[0] - me['x'], self.target[1] - me['y']) < server.PLAYER_RADIUS: self.target = self.random_point()
+        angle = math.atan2(nearest['y'] - me['y'], nearest['x'] - me['x']) if nearest else self.rng.uniform(-math.pi, math.pi)
+        self.seq += 1
+        self.history.append({'seq': self.seq, 'x': self.target[0], 'y': self.target[1], 'angle': angle,
+                             'fire': self.rng.random() < self.harness.fire_chance,
+                             'superpower': self.harness.superpower and me.get('superpower_ready', False)})
+        self.send({'id': self.pid, 'action': 'input', 'commands': list(self.history)})
+
+# --- Harness ---
+class Harness:
+    # Runs one process's share of the bots. Every process works from the same wall-clock plan: bot i of n connects at
+    # start + ramp * i / n and the measuring window opens once the ramp is over, so results from several processes line up
+    def __init__(self, indices, total, behaviour, fire_chance, superpower):
+        self.bots = [Bot(self, i) for i in indices]
+        self.total = total
+        self.behaviour, self.fire_chance, self.superpower = behaviour, fire_chance, superpower
+        self.stopping = self.measuring = False
+        self.connect_failures = self.disconnects = 0
+        self.latencies = []
+        self.snapshots = 0
+        self.lags = []
+
+    def record_snapshot(self, latency):
+        if self.measuring: self.latencies.append(latency); self.snapshots += 1
+
+    async def connect(self, bot, host, port, at):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, at - time.time()))
+        try:
+            await asyncio.wait_for(loop.create_connection(lambda: bot, host, port), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            self.connect_failures += 1
+
+    async def drive(self):
+        # One clock steps every bot, on the same drift-free schedule as the server's tick loop
+        loop = asyncio.get_running_loop()
+        next_step = loop.time()
+        while not self.stopping:
+            # How late each step runs shows whether the harness itself is keeping up
+            if self.measuring: self.lags.append(loop.time() - next_step)
+            for bot in self.bots: bot.step()
+            next_step += server.TICK_RATE
+            delay = next_step - loop.time()
+            if delay > 0: await asyncio.sleep(delay)
+            else:
+                if -delay > server.TICK_RATE * server.MAX_CATCHUP_TICKS: next_step = loop.time()
+                await asyncio.sleep(0)
+
+    async def run(self, host, port, start, ramp, seconds):
+        driver = asyncio.create_task(self.drive())
+        connects = [asyncio.create_task(self.connect(bot, host, port, start + ramp * bot.index / self.total)) for bot in self.bots]
+        await asyncio.sleep(max(0.0, start + ramp - time.time()))
+        live = [bot for bot in self.bots if bot.transport is not None]
+        before = [(bot.bytes_in, bot.bytes_out) for bot in live]
+        for bot in live: bot.measured = True
+        cpu_before, measure_start = process_cpu(), time.time()
+        self.measuring = True
+        await asyncio.sleep(max(0.0, start + ramp + seconds - time.time()))
+        self.measuring = False
+        cpu = (process_cpu() - cpu_before) / (time.time() - measure_start)
+        traffic = [(bot.bytes_in - b_in, bot.bytes_out - b_out) for bot, (b_in, b_out) in zip(live, before)]
+        self.stopping = True
+        await driver
+        for task in connects: task.cancel()
+        for bot in self.bots:
+            if bot.transport is not None: bot.transport.close()
+        await asyncio.sleep(0)
+        return {'bots': len(self.bots), 'live': len(live), 'traffic': traffic, 'latencies': self.latencies, 'snapshots': self.snapshots,
+                'lags': self.lags, 'cpu': cpu, 'connect_failures': self.connect_failures, 'disconnects': self.disconnects}
+
+def run_bots(indices, total, options, start, results=None):
+    result = asyncio.run(Harness(indices, total, *options['bot']).run(options['host'], options['port'], start, options['ramp'], options['seconds']))
+    if results is None: return result
+    results.put(result)
+
+def run_processes(count, total, options, start):
+    # Decoding snapshots costs a bot about as much as a player costs the server, so past a hundred or so bots one
+    # process can't keep up; the bots are dealt out round-robin so every process ramps up at the same pace
+    if count == 1: return [run_bots(range(total), total, options, start)]
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_bots, args=(range(i, total, count), total, options, start, results), daemon=True)
+               for i in range(count)]
+    for worker in workers: worker.start()
+    merged = [results.get() for _ in workers]
+    for worker in workers: worker.join()
+    return merged
+
+def process_cpu():
+    return time.process_time()
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else float('nan')
+
+def spawn_server(port, path, select_loop):
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_PROBE.format(port=port, path=path)] + (['--select'] if select_loop else []),
+                            stdout=subprocess.DEVNULL)
+    deadline = time.time() + CONNECT_TIMEOUT
+    while True:
+        try: socket.create_connection(('127.0.0.1', port)).close(); return proc
+        except ConnectionRefusedError:
+            if time.time() > deadline or proc.poll() is not None: proc.kill(); sys.exit(f"❌ Server on port {port} did not start")
+            time.sleep(0.05)
+
+def stop_server(proc, path):
+    proc.terminate(); proc.wait()
+    try:
+        with open(path) as f: return json.load(f)
+    except (OSError, ValueError):
+        return []
+    finally:
+        if os.path.exists(path): os.remove(path)
+
+def report(results, options, start, seconds, ticks):
+    bots, live = sum(r['bots'] for r in results), sum(r['live'] for r in results)
+    behaviour, fire_chance, superpower = options['bot']
+    print(f"🤖 {live}/{bots} bots connected in {len(results)} process{'es' if len(results) > 1 else ''} ({behaviour}, fire {fire_chance:.0%}, "
+          f"superpower {'on' if superpower else 'off'}), measured for {seconds:.1f}s")
+    if ticks is not None:
+        window = [(d * 1000, c) for t, d, c in ticks if start <= t <= start + seconds]
+        durations = [d for d, _ in window]
+        overruns = sum(d > server.TICK_RATE * 1000 for d in durations)
+        print(f"⏱️  tick        {len(durations) / seconds:6.1f}/s  p50 {percentile(durations, 50):6.2f}ms  p90 {percentile(durations, 90):6.2f}ms  "
+              f"p99 {percentile(durations, 99):6.2f}ms  max {max(durations, default=float('nan')):6.2f}ms  over budget {overruns}")
+        if len(window) > 1: print(f"🖥️  server cpu  {(window[-1][1] - window[0][1]) / (seconds * (len(window) - 1) / len(window)) * 100:6.1f}%")
+    traffic = [t for r in results for t in r['traffic']]
+    if traffic:
+        kb_in = [b_in / seconds / 1024 for b_in, _ in traffic]
+        kb_out = [b_out / seconds / 1024 for _, b_out in traffic]
+        print(f"📥 per client  {sum(kb_in) / len(kb_in):6.1f} KB/s down (p99 {percentile(kb_in, 99):.1f})  "
+              f"{sum(kb_out) / len(kb_out):6.2f} KB/s up   total {sum(kb_in) / 1024:.2f} MB/s down")
+    latencies = [l * 1000 for r in results for l in r['latencies']]
+    print(f"📡 snapshots   {sum(r['snapshots'] for r in results) / seconds / max(live, 1):6.1f}/s per bot  latency p50 {percentile(latencies, 50):6.2f}ms  "
+          f"p90 {percentile(latencies, 90):6.2f}ms  p99 {percentile(latencies, 99):6.2f}ms  max {max(latencies, default=float('nan')):6.2f}ms")
+    print(f"🔌 connect failures {sum(r['connect_failures'] for r in results)}  disconnects {sum(r['disconnects'] for r in results)}")
+    busiest, lags = max(r['cpu'] for r in results), [l * 1000 for r in results for l in r['lags']]
+    print(f"🧪 harness     busiest process cpu {busiest * 100:.1f}%  step lag p99 {percentile(lags, 99):.2f}ms")
+    if busiest > 0.9 or percentile(lags, 99) > server.TICK_RATE * 1000:
+        print("⚠️  The harness could not keep up, so latency and traffic understate the server; raise --processes or use another machine")
+
+def main():
+    args = sys.argv[1:]
+    def option(name, default):
+        return type(default)(args[args.index(name) + 1]) if name in args else default
+    bots, seconds, ramp = option('--bots', BOTS), option('--seconds', SECONDS), option('--ramp', RAMP_SECONDS)
+    behaviour, fire_chance = option('--behaviour', BEHAVIOUR), option('--fire', FIRE_CHANCE)
+    if behaviour not in BEHAVIOURS: sys.exit(f"Unknown behaviour '{behaviour}', choose from: {', '.join(BEHAVIOURS)}")
+    processes = option('--processes', max(1, min(os.cpu_count() or 1, math.ceil(bots / BOTS_PER_PROCESS))))
+    # Remote servers report no tick timings, and their snapshot latency includes any clock offset between the machines
+    remote = '--host' in args
+    options = {'host': option('--host', HOST), 'port': option('--port', PORT), 'ramp': ramp, 'seconds': seconds,
+               'bot': (behaviour, fire_chance, '--no-superpower' not in args)}
+    if not remote:
+        path = os.path.join(tempfile.gettempdir(), f'blastr_loadtest_{os.getpid()}.json')
+        proc = spawn_server(options['port'], path, '--select' in args)
+    start = time.time() + STARTUP_SECONDS
+    try:
+        results = run_processes(processes, bots, options, start)
+    finally:
+        ticks = None if remote else stop_server(proc, path)
+    report(results, options, start + ramp, seconds, ticks)
+
+if __name__ == "__main__":
+    main()
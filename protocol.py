@@ -0,0 +1,348 @@
+import math
+import struct
+
+# --- Protocol Constants ---
+PROTOCOL_VERSION = 4
+MAX_FRAME_SIZE = 1 << 20
+RECV_BUFFER_SIZE = 1 << 16
+FRAME_HEADER = struct.Struct('!I')
+MESSAGE_HEADER = struct.Struct('!BB')
+STATE_HEADER = struct.Struct('!IId')
+COUNT = struct.Struct('!H')
+ENTITY_ID = struct.Struct('!I')
+TICK = struct.Struct('!I')
+NO_BASELINE = 0xFFFFFFFF
+
+# --- Message Types ---
+MSG_WELCOME, MSG_STATE, MSG_MOVE, MSG_SHOOT, MSG_SUPERPOWER, MSG_SET_NAME, MSG_RESPAWN, MSG_ACK, MSG_INPUT = range(1, 10)
+ACTION_TYPES = {'move': MSG_MOVE, 'shoot': MSG_SHOOT, 'activate_superpower': MSG_SUPERPOWER, 'set_name': MSG_SET_NAME, 'respawn': MSG_RESPAWN, 'ack': MSG_ACK,
+                'input': MSG_INPUT}
+ACTION_NAMES = {code: name for name, code in ACTION_TYPES.items()}
+MOVE = struct.Struct('!ff')
+SHOOT = struct.Struct('!f')
+# An input packet carries the newest command's sequence number and a run of consecutive commands ending with it
+INPUT_HEADER = struct.Struct('!IB')
+INPUT_COMMAND = struct.Struct('!fffB')
+INPUT_FIRE, INPUT_SUPERPOWER = 1, 2
+
+class ProtocolError(ValueError):
+    pass
+
+# --- Entity Schemas ---
+# Field kinds: any struct code, '2f' for an (x, y) pair, 'rgb' for a colour tuple, 'str' for a length-prefixed UTF-8 string.
+# Every field is required unless listed as optional.
+# Events are single records with a bitmask of the fields they include. Entity tables are sent as deltas: entities are
+# grouped by which fields changed, and each group is packed column by column with one struct call per field.
+class Schema:
+    def __init__(self, fields, optional=()):
+        self.fields = fields
+        self.names = [name for name, _ in fields]
+        self.full_mask = (1 << len(fields)) - 1
+        self.optional = [(name, 1 << self.names.index(name)) for name in optional]
+        self.mask_struct = struct.Struct('!B' if len(fields) <= 8 else '!H')
+        self._layouts = {}
+
+    def layout(self, mask):
+        if (layout := self._layouts.get(mask)) is None:
+            fmt, fixed, strings = '!', [], []
+            for bit, (name, kind) in enumerate(self.fields):
+                if not mask & (1 << bit): continue
+                if kind == 'str': strings.append(name); continue
+                fmt += {'rgb': '3B', '2f': '2f'}.get(kind, kind)
+                fixed.append((name, kind))
+            layout = self._layouts[mask] = (struct.Struct(fmt), fixed, strings)
+        return layout
+
+    def mask_of(self, entity):
+        mask = self.full_mask
+        for name, bit in self.optional:
+            if entity.get(name) is None: mask &= ~bit
+        return mask
+
+    def encode(self, out, entity):
+        mask = self.mask_of(entity)
+        fixed_struct, fixed, strings = self.layout(mask)
+        values = []
+        for name, kind in fixed:
+            if kind in ('rgb', '2f'): values.extend(entity[name])
+            else: values.append(entity[name])
+        out += self.mask_struct.pack(mask)
+        out += fixed_struct.pack(*values)
+        for name in strings:
+            raw = entity[name].encode('utf-8')[:255]
+            out.append(len(raw)); out += raw
+
+    def decode(self, buf, offset):
+        mask, = self.mask_struct.unpack_from(buf, offset); offset += self.mask_struct.size
+        if mask & ~self.full_mask: raise ProtocolError(f"Unknown field mask {mask:#x}")
+        fixed_struct, fixed, strings = self.layout(mask)
+        values = fixed_struct.unpack_from(buf, offset); offset += fixed_struct.size
+        entity, i = {}, 0
+        for name, kind in fixed:
+            if kind == 'rgb': entity[name] = values[i:i+3]; i += 3
+            elif kind == '2f': entity[name] = values[i:i+2]; i += 2
+            else: entity[name] = values[i]; i += 1
+        for name in strings:
+            length = buf[offset]
+            entity[name] = bytes(buf[offset+1:offset+1+length]).decode('utf-8', 'ignore'); offset += 1 + length
+        return entity, offset
+
+    def encode_table(self, out, current, baseline):
+        removed = [eid for eid in baseline if eid not in current] if baseline else []
+        out += COUNT.pack(len(removed)); _encode_column(out, 'I', removed)
+        groups = {}
+        for eid, entity in current.items():
+            base = baseline.get(eid) if baseline else None
+            if base is None: mask, cleared = self.mask_of(entity), 0
+            elif base is entity or base == entity: continue
+            else:
+                mask = cleared = 0
+                for bit, name in enumerate(self.names):
+                    if (value := entity.get(name)) != base.get(name):
+                        if value is None: cleared |= 1 << bit
+                        else: mask |= 1 << bit
+                if not (mask or cleared): continue
+            if (group := groups.get((mask, cleared))) is None: group = groups[(mask, cleared)] = ([], [])
+            group[0].append(eid); group[1].append(entity)
+        out += COUNT.pack(len(groups))
+        for (mask, cleared), (ids, entities) in groups.items():
+            out += self.mask_struct.pack(mask); out += self.mask_struct.pack(cleared); out += COUNT.pack(len(ids))
+            _encode_column(out, 'I', ids)
+            for bit, (name, kind) in enumerate(self.fields):
+                if mask & (1 << bit): _encode_column(out, kind, [entity[name] for entity in entities])
+
+    def decode_table(self, buf, offset):
+        count, = COUNT.unpack_from(buf, offset)
+        removed, offset = _decode_column(buf, offset + COUNT.size, 'I', count)
+        num_groups, = COUNT.unpack_from(buf, offset); offset += COUNT.size
+        groups = []
+        for _ in range(num_groups):
+            mask, = self.mask_struct.unpack_from(buf, offset); offset += self.mask_struct.size
+            cleared, = self.mask_struct.unpack_from(buf, offset); offset += self.mask_struct.size
+            if (mask | cleared) & ~self.full_mask: raise ProtocolError(f"Unknown field mask {mask | cleared:#x}")
+            count, = COUNT.unpack_from(buf, offset)
+            ids, offset = _decode_column(buf, offset + COUNT.size, 'I', count)
+            columns = []
+            for bit, (name, kind) in enumerate(self.fields):
+                if mask & (1 << bit):
+                    column, offset = _decode_column(buf, offset, kind, count); columns.append((name, column))
+            groups.append((ids, columns, [name for bit, name in enumerate(self.names) if cleared & (1 << bit)]))
+        return (removed, groups), offset
+
+def _encode_column(out, kind, values):
+    n = len(values)
+    if not n: return
+    if kind == 'rgb':
+        # Colours come from a handful of player colours, so send a palette plus one index per item
+        palette = {color: i for i, color in enumerate(dict.fromkeys(values))}
+        out += COUNT.pack(len(palette))
+        for color in palette: out += bytes(color)
+        out += struct.pack(f'!{n}{"B" if len(palette) <= 256 else "H"}', *[palette[color] for color in values])
+    elif kind == 'str':
+        raws = [value.encode('utf-8')[:255] for value in values]
+        out += struct.pack(f'!{n}B', *map(len, raws)); out += b''.join(raws)
+    elif kind == '2f': out += struct.pack(f'!{2*n}f', *[v for pair in values for v in pair])
+    else: out += struct.pack(f'!{n}{kind}', *values)
+
+def _decode_column(buf, offset, kind, n):
+    if not n: return [], offset
+    if kind == 'rgb':
+        colors, = COUNT.unpack_from(buf, offset); offset += COUNT.size
+        palette = [tuple(buf[offset+3*i:offset+3*i+3]) for i in range(colors)]; offset += 3 * colors
+        column = struct.Struct(f'!{n}{"B" if colors <= 256 else "H"}')
+        return [palette[i] for i in column.unpack_from(buf, offset)], offset + column.size
+    if kind == 'str':
+        lengths = struct.unpack_from(f'!{n}B', buf, offset); offset += n
+        values = []
+        for length in lengths:
+            values.append(bytes(buf[offset:offset+length]).decode('utf-8', 'ignore')); offset += length
+        return values, offset
+    if kind == '2f':
+        column = struct.Struct(f'!{2*n}f'); values = column.unpack_from(buf, offset)
+        return list(zip(values[0::2], values[1::2])), offset + column.size
+    column = struct.Struct(f'!{n}{kind}')
+    return column.unpack_from(buf, offset), offset + column.size
+
+# input_ack is the last input command the server applied for that player, which its own client reconciles against
+PLAYER_SCHEMA = Schema((('x', 'f'), ('y', 'f'), ('health', 'f'), ('color', 'rgb'), ('name', 'str'), ('superpower_ready', '?'), ('death_time', 'd'),
+                        ('input_ack', 'I')), optional=('death_time',))
+# Bullets fly in straight lines, so they are sent once as a trajectory (origin, origin time, velocity) and never updated
+BULLET_SCHEMA = Schema((('ox', 'f'), ('oy', 'f'), ('ot', 'd'), ('vx', 'f'), ('vy', 'f'), ('color', 'rgb'), ('owner_id', 'I')))
+POWERUP_SCHEMA = Schema((('x', 'f'), ('y', 'f'), ('type', 'str'), ('color', 'rgb')))
+WALL_SCHEMA = Schema((('x', 'f'), ('y', 'f'), ('width', 'H'), ('height', 'H'), ('color', 'rgb')))
+STAT_SCHEMA = Schema((('kills', 'i'),))
+TABLES = (('players', PLAYER_SCHEMA), ('bullets', BULLET_SCHEMA), ('powerups', POWERUP_SCHEMA), ('walls', WALL_SCHEMA), ('stats', STAT_SCHEMA))
+EVENT_TYPES = ('hit', 'death', 'kill', 'kill_streak', 'powerup_collect')
+EVENT_SCHEMAS = {
+    'hit': Schema((('pos', '2f'), ('color', 'rgb'), ('target_id', 'I'))),
+    'death': Schema((('player_id', 'I'), ('pos', '2f'), ('color', 'rgb'))),
+    'kill': Schema((('killer_id', 'I'),)),
+    'kill_streak': Schema((('name', 'str'), ('streak', 'H'))),
+    'powerup_collect': Schema((('pos', '2f'), ('color', 'rgb'))),
+}
+
+# --- Prediction ---
+# Both ends move a player with the same step so the client can replay its unacknowledged commands on top of the
+# server's position and land where the server will
+def step_toward(x, y, target_x, target_y, max_dist):
+    dx, dy = target_x - x, target_y - y
+    dist = math.hypot(dx, dy)
+    if dist <= max_dist: return target_x, target_y
+    return x + dx / dist * max_dist, y + dy / dist * max_dist
+
+def replay_inputs(x, y, commands, max_dist):
+    for c in commands: x, y = step_toward(x, y, c['x'], c['y'], max_dist)
+    return x, y
+
+# --- Snapshots ---
+# A snapshot is {'tick', 'time', <table>: {entity_id: fields}}. It is sent as a delta against the baseline snapshot the
+# client last acknowledged, or as a keyframe (a delta against nothing) when there is no usable baseline.
+def encode_snapshot(snapshot, baseline, events):
+    out = bytearray(MESSAGE_HEADER.pack(PROTOCOL_VERSION, MSG_STATE))
+    out += STATE_HEADER.pack(snapshot['tick'], NO_BASELINE if baseline is None else baseline['tick'], snapshot['time'])
+    for name, schema in TABLES: schema.encode_table(out, snapshot[name], baseline[name] if baseline else None)
+    # Events ride along with every snapshot until the client acknowledges their tick, so skipped frames never lose them
+    out += COUNT.pack(len(events))
+    for tick, tick_events in events:
+        out += TICK.pack(tick); out += COUNT.pack(len(tick_events))
+        for ev in tick_events:
+            out.append(EVENT_TYPES.index(ev['type'])); EVENT_SCHEMAS[ev['type']].encode(out, ev)
+    return out
+
+def decode_snapshot(buf, offset):
+    tick, baseline, server_time = STATE_HEADER.unpack_from(buf, offset); offset += STATE_HEADER.size
+    msg = {'tick': tick, 'baseline': None if baseline == NO_BASELINE else baseline, 'time': server_time, 'tables': {}, 'events': []}
+    for name, schema in TABLES: msg['tables'][name], offset = schema.decode_table(buf, offset)
+    count, = COUNT.unpack_from(buf, offset); offset += COUNT.size
+    for _ in range(count):
+        ev_tick, = TICK.unpack_from(buf, offset)
+        num_events, = COUNT.unpack_from(buf, offset + TICK.size); offset += TICK.size + COUNT.size
+        for _ in range(num_events):
+            ev_type = EVENT_TYPES[buf[offset]]
+            ev, offset = EVENT_SCHEMAS[ev_type].decode(buf, offset + 1)
+            ev['type'], ev['tick'] = ev_type, ev_tick; msg['events'].append(ev)
+    return msg
+
+def apply_snapshot(baseline, msg):
+    # Entity dicts are shared with the baseline and only copied when they change, so treat the result as read-only
+    snapshot = {'tick': msg['tick'], 'time': msg['time']}
+    for name, (removed, groups) in msg['tables'].items():
+        table = dict(baseline[name]) if baseline else {}
+        for eid in removed: table.pop(eid, None)
+        for ids, columns, cleared in groups:
+            for i, eid in enumerate(ids):
+                entity = table.get(eid)
+                entity = dict(entity) if entity is not None else {}
+                for field, column in columns: entity[field] = column[i]
+                for field in cleared: entity.pop(field, None)
+                table[eid] = entity
+        snapshot[name] = table
+    return snapshot
+
+def rebuild_snapshot(baselines, msg):
+    # Applies a state message on top of the baseline it was encoded against and keeps the baselines a later delta can
+    # still use. Returns None if that baseline is gone, in which case the receiver should ack None to get a keyframe
+    base = None
+    if msg['baseline'] is not None:
+        base = baselines.get(msg['baseline'])
+        if base is None: return None
+    snapshot = apply_snapshot(base, msg)
+    oldest = snapshot['tick'] if msg['baseline'] is None else msg['baseline']
+    for tick in [t for t in baselines if t < oldest]: del baselines[tick]
+    baselines[snapshot['tick']] = snapshot
+    return snapshot
+
+# --- Messages ---
+def encode_message(msg):
+    msg_type = ACTION_TYPES[msg['action']] if 'action' in msg else MSG_WELCOME
+    out = bytearray(MESSAGE_HEADER.pack(PROTOCOL_VERSION, msg_type))
+    if msg_type == MSG_WELCOME: out += ENTITY_ID.pack(msg['id'])
+    elif msg_type == MSG_MOVE: out += MOVE.pack(*msg['pos'])
+    elif msg_type == MSG_SHOOT: out += SHOOT.pack(msg['angle'])
+    elif msg_type == MSG_ACK: out += TICK.pack(NO_BASELINE if msg['tick'] is None else msg['tick'])
+    elif msg_type == MSG_INPUT:
+        commands = msg['commands']
+        out += INPUT_HEADER.pack(commands[-1]['seq'], len(commands))
+        for c in commands:
+            out += INPUT_COMMAND.pack(c['x'], c['y'], c['angle'], (INPUT_FIRE if c['fire'] else 0) | (INPUT_SUPERPOWER if c['superpower'] else 0))
+    elif msg_type == MSG_SET_NAME:
+        raw = msg['name'].encode('utf-8')[:255]
+        out.append(len(raw)); out += raw
+    return out
+
+def decode_message(buf):
+    try:
+        version, msg_type = MESSAGE_HEADER.unpack_from(buf, 0)
+        if version != PROTOCOL_VERSION: raise ProtocolError(f"Unsupported protocol version {version}")
+        offset = MESSAGE_HEADER.size
+        if msg_type == MSG_STATE: msg = decode_snapshot(buf, offset)
+        elif msg_type == MSG_WELCOME: msg = {'id': ENTITY_ID.unpack_from(buf, offset)[0]}
+        elif msg_type in ACTION_NAMES:
+            msg = {'action': ACTION_NAMES[msg_type]}
+            if msg_type == MSG_MOVE: msg['pos'] = _finite(MOVE.unpack_from(buf, offset))
+            elif msg_type == MSG_SHOOT: msg['angle'] = _finite(SHOOT.unpack_from(buf, offset))[0]
+            elif msg_type == MSG_ACK: msg['tick'] = None if (tick := TICK.unpack_from(buf, offset)[0]) == NO_BASELINE else tick
+            elif msg_type == MSG_SET_NAME: msg['name'] = bytes(buf[offset+1:offset+1+buf[offset]]).decode('utf-8', 'ignore')
+            elif msg_type == MSG_INPUT:
+                newest, count = INPUT_HEADER.unpack_from(buf, offset); offset += INPUT_HEADER.size
+                msg['commands'] = []
+                for i, (x, y, angle, flags) in enumerate(INPUT_COMMAND.iter_unpack(buf[offset:offset + count * INPUT_COMMAND.size])):
+                    _finite((x, y, angle))
+                    msg['commands'].append({'seq': newest - count + 1 + i, 'x': x, 'y': y, 'angle': angle,
+                                            'fire': bool(flags & INPUT_FIRE), 'superpower': bool(flags & INPUT_SUPERPOWER)})
+                if len(msg['commands']) != count: raise ProtocolError("Truncated input message")
+        else: raise ProtocolError(f"Unknown message type {msg_type}")
+        return msg
+    except (struct.error, IndexError, KeyError) as e:
+        raise ProtocolError(f"Malformed message: {e}") from e
+
+def _finite(values):
+    # NaN or inf from a client would poison every position and trajectory it touches, and every client that draws them
+    if not all(map(math.isfinite, values)): raise ProtocolError("Non-finite value in message")
+    return values
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def pack_frame(msg):
+    return frame(encode_message(msg))
+
+# --- Framing ---
+# One reader per connection. recv_into fills a buffer allocated once, and frames() walks every complete frame already
+# buffered, leaving a trailing partial frame in place for the next wakeup. The buffer always fits the largest allowed
+# frame, so it never grows.
+class FrameReader:
+    def __init__(self, max_frame=MAX_FRAME_SIZE):
+        self.max_frame = max_frame
+        self.buf = bytearray(max(RECV_BUFFER_SIZE, FRAME_HEADER.size + max_frame))
+        self.view = memoryview(self.buf)
+        self.start = self.end = 0
+
+    def receive(self, sock):
+        # Returns the number of bytes read, 0 once the peer has closed; BlockingIOError means nothing was ready
+        received = sock.recv_into(self.space())
+        self.filled(received)
+        return received
+
+    # space() and filled() let an asyncio BufferedProtocol read straight into the same buffer
+    def space(self):
+        return self.view[self.end:]
+
+    def filled(self, nbytes):
+        self.end += nbytes
+
+    def frames(self):
+        # Each payload is a view into the receive buffer and is only valid until the next frame is requested
+        start = self.start
+        while self.end - start >= FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack_from(self.buf, start)
+            if length > self.max_frame: raise ProtocolError(f"Frame of {length} bytes exceeds the {self.max_frame} byte limit")
+            stop = start + FRAME_HEADER.size + length
+            if stop > self.end: break
+            self.start = stop
+            yield self.view[start + FRAME_HEADER.size:stop]
+            start = stop
+        # Move the partial frame to the front so the free space after it can always hold the rest of a maximum-size frame
+        pending = self.end - start
+        if start and pending: self.buf[:pending] = self.buf[start:self.end]
+        self.start, self.end = 0, pending
@@ -1,18 +1,40 @@
 import socket
-import pickle
 import sys
 import select
+import asyncio
+import multiprocessing
+import heapq
 import math
 import random
 import time
-import struct
-from collections import defaultdict
+import threading
+import traceback
+import cProfile
+import pstats
+import io
+import argparse
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from protocol import FrameReader, ProtocolError, decode_message, encode_message, encode_snapshot, frame, step_toward
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # --- Server Constants ---
 HOST = '0.0.0.0'
 PORT = 5557
 TICK_RATE = 1.0 / 30.0 
 CLIENT_TIMEOUT = 10.0
+MAX_CLIENT_FRAME = 4096
+SNAPSHOT_HISTORY = 64
 SUPERPOWER_CHECK_INTERVAL = 15.0
 SUPERPOWER_COOLDOWN = 15.0
 
@@ -40,19 +62,492 @@ POWERUP_TYPES = {
 HAZARD_INTERVAL = 20.0
 HAZARD_DURATION = 5.0
 
+# --- Broadphase Constants ---
+USE_SPATIAL_HASH = True
+GRID_CELL_SIZE = 64
+
+# --- Bullet Store Constants ---
+USE_NUMPY_BULLETS = np is not None
+BULLET_CAPACITY = 1024
+FAST_BULLET_MULTIPLIER = 1.5
+
+# --- Entity Pool Constants ---
+SLOT_BITS = 16  # an entity id is its generation above SLOT_BITS bits of slot
+MAX_POOL_SLOTS = 1 << SLOT_BITS
+GENERATION_MASK = 0xFFFF
+WALL_CAPACITY = 2
+EVENT_CAPACITY = 256
+
+# --- Outbound Queue Constants ---
+MAX_OUTBOUND_BYTES = 1 << 20
+MAX_STALE_SNAPSHOTS = 90
+WRITE_BUFFER_HIGH_WATER = 64 * 1024
+
+# --- Input Constants ---
+MAX_INPUTS_PER_TICK = 2
+MAX_INPUT_BACKLOG = 8
+
+# --- Room Constants ---
+MAX_PLAYERS_PER_ROOM = 12
+WORKERS = 1  # `python server.py --workers N` runs rooms in N processes
+REUSEPORT_BALANCES = sys.platform.startswith('linux') and hasattr(socket, 'SO_REUSEPORT')
+
+# --- Server Loop Constants ---
+USE_ASYNCIO = True  # `python server.py --select` runs the select loop instead
+USE_UVLOOP = uvloop is not None
+MAX_CATCHUP_TICKS = 5
+
+# --- Metrics Constants ---
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9557  # `python server.py --metrics-port P` moves it and 0 turns it off; worker N serves on P + N
+METRICS_WINDOW = 300  # recent ticks behind the tick-duration quantiles
+TICK_PHASES = ('input', 'grid', 'hazards', 'powerups', 'bullets', 'respawn', 'serialize', 'send')
+PROFILE_SECONDS = 10.0
+PROFILE_MAX_SECONDS = 60.0
+PROFILE_LINES = 40
+
+# --- Spatial Hash Grid ---
+class SpatialGrid:
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+
+    def clear(self):
+        self.cells.clear(); self.count = 0
+
+    def insert(self, item, x, y):
+        # Non-finite positions can never pass a distance or rect test, so they are left out
+        if not (math.isfinite(x) and math.isfinite(y)): return
+        key = (int(x // self.cell_size), int(y // self.cell_size))
+        self.cells.setdefault(key, []).append((self.count, item)); self.count += 1
+
+    def query_rect(self, x0, y0, x1, y1):
+        cs, found = self.cell_size, []
+        for cx in range(int(x0 // cs), int(x1 // cs) + 1):
+            for cy in range(int(y0 // cs), int(y1 // cs) + 1):
+                if (cell := self.cells.get((cx, cy))): found.extend(cell)
+        # Insertion order keeps hit resolution identical to a plain walk over players
+        if len(found) > 1: found.sort(key=lambda entry: entry[0])
+        return [item for _, item in found]
+
+    def query(self, x, y, radius):
+        return self.query_rect(x - radius, y - radius, x + radius, y + radius)
+
+# --- Bullet Storage ---
+class BulletStore:
+    def __init__(self, capacity=BULLET_CAPACITY):
+        self.count = 0
+        self.palette = []
+        self.wire = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.x, self.y = np.zeros(capacity), np.zeros(capacity)
+        self.vx, self.vy = np.zeros(capacity), np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int64)
+        self.damage = np.zeros(capacity)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.is_fast = np.zeros(capacity, dtype=bool)
+
+    def _arrays(self):
+        return (self.ids, self.x, self.y, self.vx, self.vy, self.owner, self.damage, self.color, self.is_fast)
+
+    def _grow(self):
+        old, n = self._arrays(), self.count
+        self._allocate(len(self.x) * 2)
+        for new_arr, old_arr in zip(self._arrays(), old): new_arr[:n] = old_arr[:n]
+
+    def color_index(self, color):
+        color = tuple(color)
+        if color not in self.palette: self.palette.append(color)
+        return self.palette.index(color)
+
+    def append(self, bullet_id, wire, x, y, vx, vy, owner_id, color, damage, is_fast):
+        if self.count == len(self.x): self._grow()
+        i = self.count
+        self.ids[i], self.wire[bullet_id] = bullet_id, wire
+        self.x[i], self.y[i], self.vx[i], self.vy[i] = x, y, vx, vy
+        self.owner[i], self.damage[i], self.color[i], self.is_fast[i] = owner_id, damage, self.color_index(color), is_fast
+        self.count += 1
+
+    def clear(self):
+        self.count = 0; self.wire.clear()
+
+    def __len__(self):
+        return self.count
+
+    def integrate(self, dt):
+        n = self.count
+        self.x[:n] += self.vx[:n] * dt
+        self.y[:n] += self.vy[:n] * dt
+
+    def out_of_bounds(self):
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        return ~((0 < x) & (x < WIDTH) & (0 < y) & (y < HEIGHT))
+
+    def remove(self, dead):
+        # Swap-and-pop in bulk: live bullets from the tail fill the holes left below the new count
+        n = self.count
+        for bullet_id in self.ids[:n][dead].tolist(): del self.wire[bullet_id]
+        new_count = n - int(np.count_nonzero(dead))
+        holes = np.flatnonzero(dead[:new_count])
+        if len(holes):
+            fillers = new_count + np.flatnonzero(~dead[new_count:n])
+            for arr in self._arrays(): arr[holes] = arr[fillers]
+        self.count = new_count
+
+# --- Entity Pools ---
+class Entity:
+    # Pooled entities keep dict-style reads so the wire schemas and rect helpers take them like the dicts they replace
+    __slots__ = ('id', 'slot', 'generation', 'index', 'freed_tick')
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+class Bullet(Entity):
+    # wire is the snapshot dict, kept with the slot and refilled by the next occupant once no baseline can hold it
+    __slots__ = ('x', 'y', 'vx', 'vy', 'owner_id', 'color', 'damage', 'is_fast', 'wire')
+
+class Powerup(Entity):
+    # config is the shared POWERUP_TYPES entry and wire the snapshot dict, filled once since a powerup never changes
+    __slots__ = ('x', 'y', 'type', 'config', 'wire')
+
+class Wall(Entity):
+    __slots__ = ('x', 'y', 'width', 'height', 'vx', 'vy', 'color', 'spawn_time')
+
+class Event(Entity):
+    # One class for every event type; the fields a type doesn't use stay None
+    __slots__ = ('type', 'pos', 'color', 'target_id', 'player_id', 'killer_id', 'name', 'streak')
+
+class EntityPool:
+    # Preallocated entities of one class, recycled instead of reallocated; capacity doubles if it ever runs out.
+    # An id packs the slot with a generation that is bumped on every free, so an id never names a later occupant of
+    # the same slot. Live entities sit densely in self.live and each knows its index there, so freeing one is a swap
+    # with the last, never a scan. Spare slots are handed out oldest-freed first, which gives the snapshot history
+    # time to let go of what the last occupant sent
+    def __init__(self, cls, capacity):
+        self.cls = cls
+        self.live = []
+        self.spare = deque()
+        self.capacity = 0
+        self._grow(capacity)
+
+    def _grow(self, count):
+        count = min(max(count, 1), MAX_POOL_SLOTS - self.capacity)
+        if count <= 0: raise RuntimeError(f"{self.cls.__name__} pool is out of slots")
+        for slot in range(self.capacity, self.capacity + count):
+            entity = self.cls(); entity.slot, entity.generation = slot, 0
+            self.spare.append(entity)
+        self.capacity += count
+
+    def alloc(self):
+        if not self.spare: self._grow(self.capacity)
+        entity = self.spare.popleft()
+        entity.id = entity.generation << SLOT_BITS | entity.slot
+        entity.index = len(self.live); self.live.append(entity)
+        return entity
+
+    def _release(self, entity):
+        entity.generation = (entity.generation + 1) & GENERATION_MASK; entity.index = -1; entity.freed_tick = tick_number
+        self.spare.append(entity)
+
+    def free(self, entity):
+        last = self.live.pop()
+        if last is not entity: self.live[entity.index] = last; last.index = entity.index
+        self._release(entity)
+
+    def free_many(self, dead):
+        # One pass for a batch, keeping the survivors in the order they were allocated
+        if not dead: return
+        for entity in dead: self._release(entity)
+        live, keep = self.live, 0
+        for entity in live:
+            if entity.index >= 0: live[keep] = entity; entity.index = keep; keep += 1
+        del live[keep:]
+
+    def clear(self):
+        for entity in self.live: self._release(entity)
+        self.live.clear()
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        return iter(self.live)
+
+def new_bullet_store():
+    return BulletStore() if USE_NUMPY_BULLETS else EntityPool(Bullet, BULLET_CAPACITY)
+
+# --- Outbound Queue ---
+class OutboundQueue:
+    def __init__(self):
+        self.frames = deque()  # [memoryview, is_state] in send order
+        self.offset = 0        # bytes of frames[0] already written
+        self.queued_bytes = 0
+        self.stale_drops = 0   # state frames replaced in a row before they went out
+
+    def push(self, framed, is_state=False):
+        if is_state:
+            # Deltas are against the acked baseline and events repeat until acked, so an unsent state frame is safe to replace
+            start = 1 if self.offset else 0
+            for i in range(len(self.frames) - 1, start - 1, -1):
+                if self.frames[i][1]:
+                    self.queued_bytes -= len(self.frames[i][0]); del self.frames[i]
+                    self.stale_drops += 1; net_stats['stale_snapshots_dropped'] += 1
+        view = memoryview(framed)
+        self.frames.append([view, is_state]); self.queued_bytes += len(view)
+
+    def flush(self, sock):
+        while self.frames:
+            view, is_state = self.frames[0]
+            try:
+                sent = sock.send(view[self.offset:])
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            self.offset += sent; self.queued_bytes -= sent; net_stats['bytes_out'] += sent
+            if self.offset < len(view): return True
+            self.frames.popleft(); self.offset = 0
+            if is_state: self.stale_drops = 0
+        return True
+
+    def overloaded(self):
+        return self.queued_bytes > MAX_OUTBOUND_BYTES or self.stale_drops > MAX_STALE_SNAPSHOTS
+
+# --- Connection Registry ---
+class ConnectionRegistry:
+    # The per-player tables (sockets_map, outbound, readers, client_last_seen, client_baselines) are the by-id index;
+    # this adds the connection -> id index and a heap of timeout deadlines, so lookups and expiry never scan everyone
+    def __init__(self):
+        self.pids = {}
+        self.deadlines = []  # one (due, pid) per connection, re-armed lazily from client_last_seen
+
+    def add(self, pid, conn, queue, now):
+        self.pids[conn] = pid
+        sockets_map[pid] = conn; outbound[pid] = queue; readers[pid] = FrameReader(MAX_CLIENT_FRAME)
+        client_last_seen[pid] = now; client_baselines[pid] = None
+        heapq.heappush(self.deadlines, (now + CLIENT_TIMEOUT, pid))
+
+    def pid_for(self, conn):
+        return self.pids.get(conn)
+
+    def remove(self, pid):
+        self.pids.pop(sockets_map.pop(pid, None), None)
+        for table in (outbound, readers, client_last_seen, client_baselines): table.pop(pid, None)
+
+    def expired(self, now):
+        # Seeing a client only updates client_last_seen; its heap entry is pushed back to the real deadline when it comes due
+        expired = []
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, pid = heapq.heappop(self.deadlines)
+            if (seen := client_last_seen.get(pid)) is None: continue
+            if now - seen > CLIENT_TIMEOUT: expired.append(pid)
+            else: heapq.heappush(self.deadlines, (seen + CLIENT_TIMEOUT, pid))
+        return expired
+
+# --- Tick Metrics ---
+class ProfileCapture:
+    # cProfile only sees the thread that enables it, so the metrics thread asks for a capture and the tick loop
+    # switches the profiler on and off at tick boundaries
+    def __init__(self):
+        self.busy = threading.Lock()
+        self.lock = threading.Lock()  # guards the fields below between the metrics thread and the tick loop
+        self.done = threading.Event()
+        self.requested = None  # seconds asked for, picked up by the next tick
+        self.cancelled = False  # the caller gave up; the tick loop drops whatever capture is running
+        self.profiler = None
+        self.until = 0.0
+        self.report = None
+
+    def request(self, seconds):
+        # Runs on the metrics thread; None when a capture is already running or no tick picked this one up in time
+        if not self.busy.acquire(blocking=False): return None
+        try:
+            with self.lock: self.done.clear(); self.report = None; self.requested = seconds
+            self.done.wait(seconds + 1.0)
+            with self.lock:
+                if not self.done.is_set(): self.requested = None; self.cancelled = True
+                return self.report
+        finally:
+            self.busy.release()
+
+    def poll(self):
+        if self.profiler is None and self.requested is None: return
+        with self.lock:
+            if self.cancelled:
+                # Only the tick thread can switch its profiler off, so a timed-out capture is stopped and discarded here
+                if self.profiler is not None: self.profiler.disable(); self.profiler = None
+                self.cancelled = False
+            if self.profiler is None:
+                if self.requested is None: return
+                self.profiler = cProfile.Profile(); self.until = time.perf_counter() + self.requested; self.requested = None
+                self.profiler.enable()
+            elif time.perf_counter() >= self.until:
+                self.profiler.disable()
+                out = io.StringIO(); pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+                self.profiler = None; self.report = out.getvalue(); self.done.set()
+
+class TickMetrics:
+    # lap() charges the time since the last mark to a phase; rooms ticked together count as one tick
+    def __init__(self):
+        self.phase_seconds = dict.fromkeys(TICK_PHASES, 0.0)
+        self.durations = deque(maxlen=METRICS_WINDOW)
+        self.ticks = self.overruns = self.errors = 0
+        self.tick_seconds = 0.0
+        self.players = self.bullets = self.rooms = 0
+        self.started = self.mark = time.perf_counter()
+        self.profile = ProfileCapture()
+
+    def start(self):
+        self.profile.poll()
+        self.started = self.mark = time.perf_counter()
+        self.players = self.bullets = self.rooms = 0
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phase_seconds[phase] += now - self.mark; self.mark = now
+
+    def count_room(self):
+        self.rooms += 1; self.players += len(players); self.bullets += len(bullets)
+
+    def finish(self):
+        duration = time.perf_counter() - self.started
+        self.ticks += 1; self.tick_seconds += duration; self.durations.append(duration)
+        if duration > TICK_RATE: self.overruns += 1
+
+    def error(self):
+        self.errors += 1; traceback.print_exc()
+
+    def render(self):
+        # Prometheus text exposition format
+        recent = sorted(self.durations)
+        quantiles = [(q, recent[min(len(recent) - 1, int(len(recent) * q))]) for q in (0.5, 0.9, 0.99)] if recent else []
+        metrics = [
+            ('blastr_ticks_total', 'counter', 'Simulation ticks run', [('', self.ticks)]),
+            ('blastr_tick_overruns_total', 'counter', f'Ticks that took longer than the {TICK_RATE * 1000:.1f} ms budget', [('', self.overruns)]),
+            ('blastr_tick_seconds', 'summary', f'Tick duration over the last {METRICS_WINDOW} ticks',
+             [(f'{{quantile="{q}"}}', d) for q, d in quantiles] + [('_sum', self.tick_seconds), ('_count', self.ticks)]),
+            ('blastr_tick_phase_seconds_total', 'counter', 'Time spent in each tick phase',
+             [(f'{{phase="{phase}"}}', seconds) for phase, seconds in self.phase_seconds.items()]),
+            ('blastr_tick_errors_total', 'counter', 'Server loop iterations that raised', [('', self.errors)]),
+            ('blastr_players', 'gauge', 'Players in occupied rooms at the last tick', [('', self.players)]),
+            ('blastr_bullets', 'gauge', 'Live bullets at the last tick', [('', self.bullets)]),
+            ('blastr_rooms', 'gauge', 'Rooms ticked at the last tick', [('', self.rooms)]),
+            ('blastr_bytes_in_total', 'counter', 'Bytes read from clients', [('', net_stats['bytes_in'])]),
+            ('blastr_bytes_out_total', 'counter', 'Bytes written to clients', [('', net_stats['bytes_out'])]),
+            ('blastr_stale_snapshots_dropped_total', 'counter', 'Queued snapshots replaced before they were sent', [('', net_stats['stale_snapshots_dropped'])]),
+            ('blastr_slow_consumers_total', 'counter', 'Clients disconnected for falling behind', [('', net_stats['slow_consumers'])]),
+        ]
+        lines = []
+        for name, kind, description, samples in metrics:
+            lines.append(f"# HELP {name} {description}"); lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{suffix} {value}" for suffix, value in samples)
+        return '\n'.join(lines) + '\n'
+
 # --- Server State ---
+# Everything from players down to last_hazard_time (except the connection tables) belongs to the active room, see Rooms
 players = {}
-bullets = []
-powerups = []
-walls = []
+bullets = new_bullet_store()
+powerups = EntityPool(Powerup, MAX_POWERUPS)
+walls = EntityPool(Wall, WALL_CAPACITY)
 events_queue = []
+event_pool = EntityPool(Event, EVENT_CAPACITY)
 player_id_counter = 0
+entity_id_counter = 0
+tick_number = 0
+tick_time = time.time()
+snapshot_history = {}
+event_history = deque(maxlen=SNAPSHOT_HISTORY)
+client_baselines = {}
 sockets_map = {}
 client_last_seen = {}
+outbound = {}
+readers = {}
+player_joined = None
+player_rooms = {}
+connections = ConnectionRegistry()
+net_stats = {'bytes_in': 0, 'bytes_out': 0, 'stale_snapshots_dropped': 0, 'slow_consumers': 0}
+tick_metrics = TickMetrics()
 game_stats = {'kills': defaultdict(int), 'deaths': defaultdict(int), 'streaks': defaultdict(int)}
 last_superpower_grant_time = 0
+last_superpower_check_time = 0
 last_hazard_time = 0
 
+# --- Rooms ---
+# The simulation works on the module-level state above. A Room owns one arena's copy of it, and enter_room() swaps
+# the active room's containers in, so game_loop and friends run unchanged for whichever room is ticking.
+# Connection tables (sockets_map, outbound, readers, client_last_seen, client_baselines) are keyed by the
+# process-wide player id and stay shared.
+# Invariant: a name in ROOM_STATE means "the current room's" only until the next enter_room(). Look players, bullets,
+# etc. up again after every enter_room() call, and never keep one of them (or a player dict) across a call that may
+# enter another room: add_player, remove_player, Lobby.release and tick_rooms all do.
+ROOM_STATE = ('players', 'bullets', 'powerups', 'walls', 'events_queue', 'event_pool', 'entity_id_counter', 'tick_number', 'tick_time',
+              'snapshot_history', 'event_history', 'game_stats',
+              'last_superpower_grant_time', 'last_superpower_check_time', 'last_hazard_time')
+
+def new_room_state():
+    return {'players': {}, 'bullets': new_bullet_store(), 'powerups': EntityPool(Powerup, MAX_POWERUPS), 'walls': EntityPool(Wall, WALL_CAPACITY),
+            'events_queue': [], 'event_pool': EntityPool(Event, EVENT_CAPACITY),
+            'entity_id_counter': 0, 'tick_number': 0, 'tick_time': time.time(), 'snapshot_history': {},
+            'event_history': deque(maxlen=SNAPSHOT_HISTORY),
+            'game_stats': {'kills': defaultdict(int), 'deaths': defaultdict(int), 'streaks': defaultdict(int)},
+            'last_superpower_grant_time': time.time(), 'last_superpower_check_time': time.time(), 'last_hazard_time': 0}
+
+class Room:
+    def __init__(self, room_id, state=None):
+        self.room_id = room_id
+        self.state = state if state is not None else new_room_state()
+        self.pids = set()
+        self.inputs = deque()  # (pid, msg) waiting for this room's next tick in asyncio mode
+
+    def capture(self):
+        module = globals()
+        self.state = {name: module[name] for name in ROOM_STATE}
+
+    def restore(self):
+        globals().update(self.state)
+
+current_room = Room(0, {name: globals()[name] for name in ROOM_STATE})
+
+def enter_room(room):
+    # Rebinds every ROOM_STATE global, so references the caller took before this point belong to the previous room
+    global current_room
+    if room is current_room: return
+    current_room.capture(); room.restore(); current_room = room
+
+class Lobby:
+    def __init__(self, first_room, max_players=MAX_PLAYERS_PER_ROOM):
+        self.rooms = [first_room]
+        self.max_players = max_players
+        self.next_room_id = first_room.room_id + 1
+
+    def assign(self):
+        # Fill the busiest room that still has a seat so players find a match quickly; open a new arena when all are full
+        open_rooms = [room for room in self.rooms if len(room.pids) < self.max_players]
+        if open_rooms: return max(open_rooms, key=lambda room: len(room.pids))
+        room = Room(self.next_room_id); self.next_room_id += 1
+        self.rooms.append(room); print(f"🏟️ Opened room {room.room_id} ({len(self.rooms)} running)")
+        return room
+
+    def release(self, room):
+        # Empty rooms are closed, but one is always kept warm for the next connection
+        if room.pids or len(self.rooms) == 1: return
+        self.rooms.remove(room); print(f"🏟️ Closed room {room.room_id} ({len(self.rooms)} running)")
+        # The closed room's state must not stay bound to the globals; the caller must not touch players etc. afterwards
+        if room is current_room: enter_room(self.rooms[0])
+
+    def occupied(self):
+        return [room for room in self.rooms if room.pids]
+
+lobby = Lobby(current_room)
+
 # --- Colors ---
 AVAILABLE_COLORS = [
     (239, 83, 80), (236, 64, 122), (171, 71, 188), (126, 87, 194),
@@ -61,33 +556,101 @@ AVAILABLE_COLORS = [
 ]
 SUPERPOWER_BULLET_COLOR = (255, 238, 88)
 
-def receive_data(sock):
+# --- Broadphase Queries ---
+player_grid = SpatialGrid()
+
+def rebuild_player_grid():
+    player_grid.clear()
+    for pid, p in players.items(): player_grid.insert((pid, p), p['x'], p['y'])
+
+def players_near(x, y, radius):
+    return player_grid.query(x, y, radius) if USE_SPATIAL_HASH else list(players.items())
+
+def players_in_rect(rect, margin):
+    if not USE_SPATIAL_HASH: return list(players.items())
+    return player_grid.query_rect(rect['x'] - margin, rect['y'] - margin, rect['x'] + rect['width'] + margin, rect['y'] + rect['height'] + margin)
+
+# --- Bullet Spawning ---
+def next_entity_id():
+    global entity_id_counter
+    entity_id_counter += 1
+    return entity_id_counter
+
+def spawn_bullet(x, y, angle, owner_id, color, damage=BULLET_DAMAGE, is_fast=False):
+    speed = BULLET_SPEED * (FAST_BULLET_MULTIPLIER if is_fast else 1)
+    vx, vy = math.cos(angle) * speed, math.sin(angle) * speed
+    # The next tick advances the bullet by a full dt, so its trajectory starts at the previous tick's time
+    if USE_NUMPY_BULLETS:
+        wire = {'ox': x, 'oy': y, 'ot': tick_time, 'vx': vx, 'vy': vy, 'color': color, 'owner_id': owner_id}
+        bullets.append(next_entity_id(), wire, x, y, vx, vy, owner_id, color, damage, is_fast); return
+    b = bullets.alloc(); b.wire = wire = recycled_wire(b)
+    b.x, b.y, b.vx, b.vy, b.owner_id, b.color, b.damage, b.is_fast = x, y, vx, vy, owner_id, color, damage, is_fast
+    wire['ox'], wire['oy'], wire['ot'], wire['vx'], wire['vy'], wire['color'], wire['owner_id'] = x, y, tick_time, vx, vy, color, owner_id
+
+def recycled_wire(entity):
+    # The last occupant's wire dict, to be refilled in place, once every snapshot that could hold it as a delta
+    # baseline has left the history; until then snapshots must see it unchanged, so the slot gets a new one
+    wire = entity.get('wire')
+    return wire if wire is not None and tick_number - entity.freed_tick > SNAPSHOT_HISTORY else {}
+
+def bullets_snapshot():
+    return dict(bullets.wire) if USE_NUMPY_BULLETS else {b.id: b.wire for b in bullets}
+
+def spawn_powerup(x, y, p_type):
+    p = powerups.alloc(); config = POWERUP_TYPES[p_type]
+    p.x, p.y, p.type, p.config = x, y, p_type, config
+    p.wire = wire = recycled_wire(p)
+    wire['x'], wire['y'], wire['type'], wire['color'] = x, y, p_type, config['color']
+    return p
+
+def spawn_wall(x, y, width, height, vx, vy, current_time):
+    w = walls.alloc()
+    w.x, w.y, w.width, w.height, w.vx, w.vy, w.color, w.spawn_time = x, y, width, height, vx, vy, (255,0,100), current_time
+    return w
+
+def push_event(kind, pos=None, color=None, target_id=None, player_id=None, killer_id=None, name=None, streak=None):
+    # Events are handed back to event_pool once they age out of event_history, see record_snapshot
+    ev = event_pool.alloc()
+    ev.type, ev.pos, ev.color, ev.target_id, ev.player_id, ev.killer_id, ev.name, ev.streak = kind, pos, color, target_id, player_id, killer_id, name, streak
+    events_queue.append(ev)
+
+def receive_messages(pid, sock):
+    # Every complete message the client has sent so far; a partial frame waits in its reader. None means drop the client
+    reader = readers.get(pid)
+    if reader is None: return None
     try:
-        raw_msglen=sock.recv(4)
-        if not raw_msglen: return None
-        msglen=struct.unpack('!I',raw_msglen)[0]
-        if msglen>4096: return None
-        data=b''
-        while len(data)<msglen:data+=sock.recv(msglen-len(data))
-        return pickle.loads(data)
-    except(struct.error, pickle.UnpicklingError, ConnectionAbortedError, ConnectionResetError, socket.timeout, BlockingIOError):
+        if not (received := reader.receive(sock)): return None
+        net_stats['bytes_in'] += received
+        return [decode_message(payload) for payload in reader.frames()]
+    except (BlockingIOError, InterruptedError):
+        return []
+    except (ProtocolError, OSError):
         return None
 
-def send_data(sock, data):
-    try:
-        packed_data = pickle.dumps(data)
-        sock.sendall(struct.pack('!I', len(packed_data)) + packed_data)
-        return True
-    except (ConnectionResetError, BrokenPipeError, OSError):
+def send_frame(pid, framed, is_state=False):
+    # Queues the frame and writes as much as the socket takes right now; the rest goes out when select reports it writable
+    queue, sock = outbound.get(pid), sockets_map.get(pid)
+    if queue is None or sock is None: return False
+    queue.push(framed, is_state)
+    if not queue.flush(sock): return False
+    if queue.overloaded():
+        net_stats['slow_consumers'] += 1; print(f"🐢 Player {pid} can't keep up, disconnecting.")
         return False
+    return True
+
+def send_payload(pid, payload, is_state=False):
+    return send_frame(pid, frame(payload), is_state)
+
+def send_data(pid, data):
+    return send_payload(pid, encode_message(data))
 
 def get_new_player_color():
     return AVAILABLE_COLORS[len(players) % len(AVAILABLE_COLORS)]
 
-def check_for_comeback_power():
+def check_for_comeback_power(current_time):
     global last_superpower_grant_time
     SCORE_DIFFERENCE_THRESHOLD = KILL_SCORE * 2
-    if time.time() - last_superpower_grant_time < SUPERPOWER_COOLDOWN or len(players) < 2: return
+    if current_time - last_superpower_grant_time < SUPERPOWER_COOLDOWN or len(players) < 2: return
 
     for p in players.values(): p['superpower_ready'] = False
     scores = {pid: game_stats['kills'].get(pid, 0) for pid in players.keys()}
@@ -100,7 +663,7 @@ def check_for_comeback_power():
         target_pid = random.choice(last_place_players)
         if target_pid in players:
             players[target_pid]['superpower_ready'] = True
-            last_superpower_grant_time = time.time()
+            last_superpower_grant_time = current_time
             print(f"✨ Granted superpower to Player {target_pid}")
 
 def check_rect_collision(rect1, rect2):
@@ -110,156 +673,466 @@ def check_rect_collision(rect1, rect2):
             rect1['height'] + rect1['y'] > rect2['y'])
 
 def update_hazards(dt, current_time):
-    global last_hazard_time, walls
+    global last_hazard_time
     if current_time - last_hazard_time > HAZARD_INTERVAL and not walls:
         last_hazard_time = current_time
         side = random.choice(['v', 'h'])
         speed = 250
         if side == 'v':
-            wall = {'x': -20, 'y': random.randint(0, int(HEIGHT*0.3)), 'width': 20, 'height': int(HEIGHT*0.4), 'vx': speed, 'vy': 0, 'color': (255,0,100)}
-            if random.random() > 0.5:
-                wall['x'] = WIDTH; wall['vx'] = -speed
+            x, y, width, height, vx, vy = -20, random.randint(0, int(HEIGHT*0.3)), 20, int(HEIGHT*0.4), speed, 0
+            if random.random() > 0.5: x, vx = WIDTH, -speed
         else:
-            wall = {'x': random.randint(0, int(WIDTH*0.3)), 'y': -20, 'width': int(WIDTH*0.4), 'height': 20, 'vx': 0, 'vy': speed, 'color': (255,0,100)}
-            if random.random() > 0.5:
-                wall['y'] = HEIGHT; wall['vy'] = -speed
-        wall['spawn_time'] = current_time
-        walls.append(wall)
-
-    for w in walls[:]:
-        w['x'] += w['vx'] * dt; w['y'] += w['vy'] * dt
-        if current_time - w['spawn_time'] > HAZARD_DURATION: walls.remove(w); continue
-        for pid, p in players.items():
+            x, y, width, height, vx, vy = random.randint(0, int(WIDTH*0.3)), -20, int(WIDTH*0.4), 20, 0, speed
+            if random.random() > 0.5: y, vy = HEIGHT, -speed
+        spawn_wall(x, y, width, height, vx, vy, current_time)
+
+    # Walking backwards, a free() only swaps in a wall that was already visited
+    for w in reversed(walls.live):
+        w.x += w.vx * dt; w.y += w.vy * dt
+        if current_time - w.spawn_time > HAZARD_DURATION: walls.free(w); continue
+        for pid, p in players_in_rect(w, PLAYER_RADIUS):
             player_rect = {'x': p['x']-PLAYER_RADIUS, 'y': p['y']-PLAYER_RADIUS, 'width': PLAYER_SIZE, 'height': PLAYER_SIZE}
             if p['health'] > 0 and check_rect_collision(w, player_rect):
                 p['health'] = 0; p['death_time'] = current_time
                 game_stats['deaths'][pid] += 1; game_stats['streaks'][pid] = 0
-                events_queue.append({'type': 'death', 'player_id': pid, 'pos': (p['x'], p['y']), 'color': p['color']})
+                push_event('death', player_id=pid, pos=(p['x'], p['y']), color=p['color'])
 
-def update_powerups():
+def update_powerups(current_time):
     if len(powerups) < MAX_POWERUPS and random.random() < POWERUP_SPAWN_CHANCE:
         p_type = random.choice(list(POWERUP_TYPES.keys()))
-        powerups.append({'x': random.randint(50,WIDTH-50), 'y': random.randint(50,HEIGHT-50), 'type': p_type, **POWERUP_TYPES[p_type]})
-    
-    for p in powerups[:]:
-        for pid, player in players.items():
-            if player['health'] > 0 and math.hypot(p['x']-player['x'], p['y']-player['y']) < PLAYER_RADIUS + 15:
-                if p['type'] == 'health': player['health'] = min(PLAYER_HEALTH, player['health'] + p['value'])
-                else: player[f"{p['type']}_boost"] = time.time() + p['duration']
-                events_queue.append({'type':'powerup_collect', 'pos':(p['x'],p['y']), 'color':p['color']})
-                powerups.remove(p); break
-
-def game_loop(dt):
-    current_time = time.time()
-    update_hazards(dt, current_time)
-    update_powerups()
-
-    for bullet in bullets[:]:
-        speed_multiplier = 1.5 if bullet.get('is_fast') else 1
-        bullet['x'] += math.cos(bullet['angle']) * BULLET_SPEED * dt * speed_multiplier
-        bullet['y'] += math.sin(bullet['angle']) * BULLET_SPEED * dt * speed_multiplier
-
-        if not (0 < bullet['x'] < WIDTH and 0 < bullet['y'] < HEIGHT):
-            if bullet in bullets: bullets.remove(bullet); continue
-
-        for pid, player in players.items():
-            if player['health'] <= 0 or pid == bullet.get('owner_id'): continue
-            if math.hypot(bullet['x']-player['x'],bullet['y']-player['y']) < PLAYER_RADIUS+BULLET_RADIUS:
-                owner = players.get(bullet['owner_id'])
-                damage_multiplier = 2.0 if owner and owner.get('damage_boost',0)>current_time else 1.0
-                damage = bullet.get('damage',BULLET_DAMAGE) * damage_multiplier
-                player['health'] -= damage
-                events_queue.append({'type':'hit','pos':(bullet['x'],bullet['y']),'color':bullet.get('color'),'target_id':pid})
-
-                if player['health'] <= 0:
-                    player['health']=0;player['death_time']=current_time
-                    game_stats['deaths'][pid] += 1; game_stats['streaks'][pid] = 0
-                    events_queue.append({'type':'death','player_id':pid,'pos':(player['x'],player['y']),'color':player['color']})
-                    if owner:
-                        events_queue.append({'type':'kill', 'killer_id': bullet['owner_id']})
-                        game_stats['kills'][bullet['owner_id']] += KILL_SCORE; game_stats['streaks'][bullet['owner_id']] += 1
-                        if (streak := game_stats['streaks'][bullet['owner_id']]) >= 2:
-                            events_queue.append({'type':'kill_streak', 'name':owner['name'], 'streak':streak})
-                        check_for_comeback_power()
-
-                if bullet in bullets: bullets.remove(bullet); break
+        spawn_powerup(random.randint(50,WIDTH-50), random.randint(50,HEIGHT-50), p_type)
     
+    for p in reversed(powerups.live):
+        for pid, player in players_near(p.x, p.y, PLAYER_RADIUS + 15):
+            if player['health'] > 0 and math.hypot(p.x-player['x'], p.y-player['y']) < PLAYER_RADIUS + 15:
+                if p.type == 'health': player['health'] = min(PLAYER_HEALTH, player['health'] + p.config['value'])
+                else: player[f"{p.type}_boost"] = current_time + p.config['duration']
+                push_event('powerup_collect', pos=(p.x, p.y), color=p.config['color'])
+                powerups.free(p); break
+
+def apply_bullet_hit(pid, player, owner_id, base_damage, pos, color, current_time):
+    owner = players.get(owner_id)
+    damage_multiplier = 2.0 if owner and owner.get('damage_boost',0)>current_time else 1.0
+    player['health'] -= base_damage * damage_multiplier
+    push_event('hit', pos=pos, color=color, target_id=pid)
+
+    if player['health'] <= 0:
+        player['health']=0;player['death_time']=current_time
+        game_stats['deaths'][pid] += 1; game_stats['streaks'][pid] = 0
+        push_event('death', player_id=pid, pos=(player['x'], player['y']), color=player['color'])
+        if owner:
+            push_event('kill', killer_id=owner_id)
+            game_stats['kills'][owner_id] += KILL_SCORE; game_stats['streaks'][owner_id] += 1
+            if (streak := game_stats['streaks'][owner_id]) >= 2:
+                push_event('kill_streak', name=owner['name'], streak=streak)
+            check_for_comeback_power(current_time)
+
+def update_bullets(dt, current_time):
+    dead = []
+    for bullet in bullets:
+        bullet.x += bullet.vx * dt
+        bullet.y += bullet.vy * dt
+        if not (0 < bullet.x < WIDTH and 0 < bullet.y < HEIGHT): dead.append(bullet); continue
+
+        for pid, player in players_near(bullet.x, bullet.y, PLAYER_RADIUS + BULLET_RADIUS):
+            if player['health'] <= 0 or pid == bullet.owner_id: continue
+            if math.hypot(bullet.x-player['x'],bullet.y-player['y']) < PLAYER_RADIUS+BULLET_RADIUS:
+                apply_bullet_hit(pid, player, bullet.owner_id, bullet.damage, (bullet.x, bullet.y), bullet.color, current_time)
+                dead.append(bullet); break
+    bullets.free_many(dead)
+
+def update_bullets_vectorized(dt, current_time):
+    store = bullets
+    store.integrate(dt)
+    dead = store.out_of_bounds()
+    targets = [(pid, p) for pid, p in players.items() if p['health'] > 0]
+    if targets and store.count:
+        n = store.count
+        px = np.array([p['x'] for _, p in targets], dtype=float)
+        py = np.array([p['y'] for _, p in targets], dtype=float)
+        pids = np.array([pid for pid, _ in targets], dtype=np.int64)
+        dx, dy = store.x[:n, None] - px, store.y[:n, None] - py
+        hits = (dx*dx + dy*dy < (PLAYER_RADIUS+BULLET_RADIUS)**2) & (store.owner[:n, None] != pids) & ~dead[:, None]
+        # Only bullets touching someone are resolved one by one, in store order, so kills and health stay sequential
+        for i in np.flatnonzero(hits.any(axis=1)).tolist():
+            for j in np.flatnonzero(hits[i]).tolist():
+                pid, player = targets[j]
+                if player['health'] <= 0: continue
+                apply_bullet_hit(pid, player, int(store.owner[i]), float(store.damage[i]), (float(store.x[i]), float(store.y[i])), store.palette[store.color[i]], current_time)
+                dead[i] = True; break
+    store.remove(dead)
+
+def game_loop(dt, current_time=None):
+    # Every subsystem reads the tick's clock from here, so a caller that passes current_time replays the tick exactly
+    global tick_number, tick_time
+    if current_time is None: current_time = time.time()
+    rebuild_player_grid(); tick_metrics.lap('grid')
+    update_hazards(dt, current_time); tick_metrics.lap('hazards')
+    update_powerups(current_time); tick_metrics.lap('powerups')
+
+    if USE_NUMPY_BULLETS: update_bullets_vectorized(dt, current_time)
+    else: update_bullets(dt, current_time)
+    tick_metrics.lap('bullets')
+
     for player in players.values():
         if player['health'] <= 0 and 'death_time' in player and current_time-player.get('death_time',0)>=RESPAWN_TIME:
             player['health']=PLAYER_HEALTH;player['x']=random.randint(50,WIDTH-50);player['y']=random.randint(50,HEIGHT-50)
             player.pop('death_time', None); player.pop('speed_boost', None); player.pop('damage_boost', None)
+    tick_number += 1; tick_time = current_time
+    tick_metrics.lap('respawn')
 
-def main():
-    global player_id_counter, last_superpower_grant_time
-    server=socket.socket(socket.AF_INET,socket.SOCK_STREAM);server.setblocking(False);server.bind((HOST,PORT));server.listen(10)
-    print(f"🚀 Blastr! Server started on {HOST}:{PORT}")
-    inputs=[server];last_tick_time=time.time();last_superpower_check_time=time.time();last_superpower_grant_time=time.time()
+def build_snapshot():
+    public_players = {}
+    for pid, p in players.items():
+        player_data = {'x': p['x'], 'y': p['y'], 'color': p['color'], 'health': p['health'], 'name': p['name'], 'superpower_ready': p.get('superpower_ready', False),
+                       'input_ack': p.get('input_ack', 0)}
+        if 'death_time' in p:
+            player_data['death_time'] = p['death_time']
+        public_players[pid] = player_data
+    return {'tick': tick_number, 'time': tick_time, 'players': public_players, 'bullets': bullets_snapshot(),
+            'powerups': {p.id: p.wire for p in powerups},
+            'walls': {w.id: {'x': w.x, 'y': w.y, 'width': w.width, 'height': w.height, 'color': w.color} for w in walls},
+            'stats': {pid: {'kills': kills} for pid, kills in game_stats['kills'].items()}}
+
+def record_snapshot():
+    snapshot = build_snapshot()
+    snapshot_history[snapshot['tick']] = snapshot
+    for tick in [t for t in snapshot_history if t <= snapshot['tick'] - SNAPSHOT_HISTORY]: del snapshot_history[tick]
+    if events_queue:
+        # The oldest tick's events are about to fall out of the history, and with it out of every future frame
+        if len(event_history) == event_history.maxlen:
+            for ev in event_history[0][1]: event_pool.free(ev)
+        event_history.append((snapshot['tick'], list(events_queue)))
+    events_queue.clear()
+    return snapshot
+
+def encode_for_baseline(snapshot, baseline_tick):
+    baseline = snapshot_history.get(baseline_tick)
+    since = baseline['tick'] if baseline else snapshot['tick'] - 1
+    return encode_snapshot(snapshot, baseline, [(tick, evs) for tick, evs in event_history if tick > since])
+
+def broadcast_snapshot(snapshot):
+    # A frame depends only on the client's baseline, so each distinct baseline is encoded once per tick and the bytes are shared
+    targets = []
+    for pid in [pid for pid in players if pid in sockets_map]:
+        baseline_tick = client_baselines.get(pid)
+        targets.append((pid, baseline_tick if baseline_tick in snapshot_history else None))
+    frames = {tick: frame(encode_for_baseline(snapshot, tick)) for tick in dict.fromkeys(tick for _, tick in targets)}
+    tick_metrics.lap('serialize')
+    failed = [pid for pid, baseline_tick in targets if not send_frame(pid, frames[baseline_tick], True)]
+    tick_metrics.lap('send')
+    return failed
+
+def move_player(player, pos, dt):
+    speed = PLAYER_MAX_SPEED * (1.5 if player.get('speed_boost', 0) > time.time() else 1.0)
+    player['x'], player['y'] = step_toward(player['x'], player['y'], pos[0], pos[1], speed * dt)
+
+def try_shoot(pid, player, angle):
+    if player['health']>0 and time.time()-player['last_shot']>=SHOOT_COOLDOWN:
+        player['last_shot']=time.time();spawn_bullet(player['x'],player['y'],angle,pid,player['color'])
+
+def use_superpower(pid, player):
+    if not player.get('superpower_ready'): return
+    player['superpower_ready']=False; print(f"💥 Player {pid} used superpower!")
+    for i in range(32):
+        angle=math.radians(i*(360/16) + (0 if i<16 else 11.25))
+        spawn_bullet(player['x'],player['y'],angle,pid,SUPERPOWER_BULLET_COLOR,SUPERPOWER_BULLET_DAMAGE,True)
+
+def queue_input(player, commands):
+    # Each packet repeats the last few commands, so only sequence numbers past the newest one seen are new
+    fresh = [c for c in commands if c['seq'] > player.get('input_seq', 0)]
+    if not fresh: return
+    # Targets are kept inside the arena, the same bounds the client clamps its cursor to before predicting
+    for c in fresh:
+        c['x'] = min(max(c['x'], PLAYER_RADIUS), WIDTH - PLAYER_RADIUS); c['y'] = min(max(c['y'], PLAYER_RADIUS), HEIGHT - PLAYER_RADIUS)
+    player['input_seq'] = fresh[-1]['seq']
+    pending = player.setdefault('pending_input', deque())
+    pending.extend(fresh)
+    # A backlog past what jitter explains is dropped oldest-first; the client's reconciliation absorbs the lost steps
+    while len(pending) > MAX_INPUT_BACKLOG: pending.popleft()
+
+def apply_player_inputs():
+    # Every command is one client tick of movement, applied once and in order, so the client's replay matches exactly.
+    # A couple may be applied in one tick to catch up after jitter, never more, so flooding commands can't speed anyone up
+    for pid, player in players.items():
+        pending = player.get('pending_input')
+        for _ in range(min(len(pending), MAX_INPUTS_PER_TICK) if pending else 0):
+            command = pending.popleft()
+            move_player(player, (command['x'], command['y']), TICK_RATE)
+            if command['fire']: try_shoot(pid, player, command['angle'])
+            if command['superpower']: use_superpower(pid, player)
+            player['input_ack'] = command['seq']
+
+def handle_message(pid, player, msg):
+    action=msg.get('action')
+    # Legacy 'move' messages are ignored: they moved a player once per message, so sending more of them meant moving faster
+    if action=='input': queue_input(player, msg['commands'])
+    elif action=='shoot': try_shoot(pid, player, msg['angle'])
+    elif action=='set_name':
+        if 1<=(len(n:=msg['name'].strip()))<=30:players[pid]['name']=n;print(f"ℹ️ Player {pid} is now {n}")
+    elif action=='activate_superpower': use_superpower(pid, player)
+    elif action=='ack': client_baselines[pid]=msg['tick']
+    elif action=='respawn' and player['health']<=0 and 'death_time' not in player: player['death_time']=time.time()
+
+def add_player(conn, queue):
+    global player_id_counter
+    # players below is the new player's room only because it is looked up after this enter_room
+    room=lobby.assign();enter_room(room)
+    pid=player_id_counter;player_id_counter+=1;room.pids.add(pid);player_rooms[pid]=room
+    connections.add(pid,conn,queue,time.time())
+    players[pid]={'x':random.randint(50,WIDTH-50),'y':random.randint(50,HEIGHT-50),'health':PLAYER_HEALTH,'color':get_new_player_color(),'name':f"Player {pid}",'last_shot':0}
+    send_data(pid,{'id':pid});print(f"✅ Player {pid} spawned in room {room.room_id}.")
+    return pid
+
+def remove_player(pid):
+    if (room:=player_rooms.pop(pid,None)) is None: return
+    # The leaving player's room is entered before its state is touched; release() may then switch rooms again
+    enter_room(room);room.pids.discard(pid)
+    print(f"❌ Player {pid} disconnected.");players.pop(pid,None);connections.remove(pid);game_stats['kills'].pop(pid,None);game_stats['streaks'].pop(pid,None)
+    lobby.release(room)
+
+def server_tick(dt):
+    # One simulation step and its broadcast for the active room; returns the players whose connection could not take the frame
+    global last_superpower_check_time
+    game_loop(dt)
+    if tick_time-last_superpower_check_time>SUPERPOWER_CHECK_INTERVAL:
+        check_for_comeback_power(tick_time); last_superpower_check_time=tick_time
+        tick_metrics.lap('powerups')
+    return broadcast_snapshot(record_snapshot()) if players else []
+
+def tick_rooms(dt):
+    failed=[];tick_metrics.start()
+    for room in lobby.occupied():
+        # Each pass enters its room first, and players is re-read inside it, so nothing carries over between rooms
+        enter_room(room)
+        while room.inputs:
+            pid,msg=room.inputs.popleft()
+            if (player:=players.get(pid)) is not None: handle_message(pid,player,msg)
+        apply_player_inputs();tick_metrics.lap('input')
+        failed.extend(server_tick(dt));tick_metrics.count_room()
+    tick_metrics.finish()
+    return failed
+
+def make_listener(reuse_port=False):
+    listener=socket.socket(socket.AF_INET,socket.SOCK_STREAM);listener.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    if reuse_port: listener.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEPORT,1)
+    listener.setblocking(False);listener.bind((HOST,PORT));listener.listen(128)
+    return listener
+
+# --- Select Loop ---
+def run_select_loop(server):
+    global last_superpower_check_time, last_superpower_grant_time
+    print(f"🚀 Blastr! Server started on {HOST}:{PORT} (select loop)")
+    inputs={server};last_tick_time=time.time();last_superpower_check_time=time.time();last_superpower_grant_time=time.time()
 
     while True:
         try:
-            readable,_,exceptional=select.select(inputs,[],inputs,0.01)
+            pending={sockets_map[pid]:pid for pid,queue in outbound.items() if queue.frames}
+            readable,writable,exceptional=select.select(inputs,list(pending),inputs,0.01)
+            for sock in writable:
+                if not outbound[pending[sock]].flush(sock): exceptional.append(sock)
             current_time=time.time(); dt=current_time-last_tick_time
             if dt >= TICK_RATE:
-                game_loop(dt); last_tick_time = current_time
-                if current_time-last_superpower_check_time>SUPERPOWER_CHECK_INTERVAL:
-                    check_for_comeback_power(); last_superpower_check_time=current_time
-                if players:
-                    public_players = {}
-                    for pid, p in players.items():
-                        player_data = {'x': p['x'], 'y': p['y'], 'color': p['color'], 'health': p['health'], 'name': p['name'], 'superpower_ready': p.get('superpower_ready', False)}
-                        if 'death_time' in p:
-                            player_data['death_time'] = p['death_time']
-                        public_players[pid] = player_data
-
-                    game_state={'players':public_players,'bullets':bullets,'stats':game_stats['kills'],'events':events_queue,'powerups':powerups, 'walls':walls}
-                    for pid,sock in list(sockets_map.items()):
-                        if not send_data(sock,game_state): exceptional.append(sock)
-                    events_queue.clear()
+                last_tick_time = current_time
+                exceptional.extend(sockets_map[pid] for pid in tick_rooms(dt))
             
             for sock in readable:
                 if sock is server:
-                    conn,addr=server.accept();conn.setblocking(False);inputs.append(conn);print(f"🎮 New from {addr}")
-                    pid=player_id_counter;player_id_counter+=1;sockets_map[pid]=conn;client_last_seen[pid]=time.time()
-                    players[pid]={'x':random.randint(50,WIDTH-50),'y':random.randint(50,HEIGHT-50),'health':PLAYER_HEALTH,'color':get_new_player_color(),'name':f"Player {pid}",'last_shot':0}
-                    send_data(conn,{'id':pid});print(f"✅ Player {pid} spawned.")
+                    conn,addr=server.accept();conn.setblocking(False);inputs.add(conn);print(f"🎮 New from {addr}")
+                    add_player(conn,OutboundQueue())
                 else:
-                    pid=next((p for p,s in sockets_map.items() if s==sock),None)
-                    msg=receive_data(sock)
-                    if msg and pid is not None and (player:=players.get(pid)):
-                        client_last_seen[pid]=time.time()
-                        action=msg.get('action')
-                        if action=='move':
-                            speed = PLAYER_MAX_SPEED * (1.5 if player.get('speed_boost', 0) > time.time() else 1.0)
-                            max_dist = speed * TICK_RATE 
-                            dx, dy = msg['pos'][0] - player['x'], msg['pos'][1] - player['y']
-                            dist = math.hypot(dx, dy)
-                            if dist > max_dist:
-                                player['x'] += (dx/dist) * max_dist
-                                player['y'] += (dy/dist) * max_dist
-                            else:
-                                player['x'], player['y'] = msg['pos']
-                        elif action=='shoot' and player['health']>0 and time.time()-player['last_shot']>=SHOOT_COOLDOWN:
-                            player['last_shot']=time.time();bullets.append({'x':player['x'],'y':player['y'],'angle':msg['angle'],'owner_id':pid,'color':player['color']})
-                        elif action=='set_name':
-                            if 1<=(len(n:=msg['name'].strip()))<=30:players[pid]['name']=n;print(f"ℹ️ Player {pid} is now {n}")
-                        elif action=='activate_superpower' and player.get('superpower_ready'):
-                            player['superpower_ready']=False; print(f"💥 Player {pid} used superpower!")
-                            for i in range(32):
-                                angle=math.radians(i*(360/16) + (0 if i<16 else 11.25))
-                                bullets.append({'x':player['x'],'y':player['y'],'angle':angle,'owner_id':pid,'damage':SUPERPOWER_BULLET_DAMAGE,'color':SUPERPOWER_BULLET_COLOR,'is_fast':True})
-                        elif action=='respawn' and player['health']<=0 and 'death_time' not in player: player['death_time']=time.time()
-                    else: exceptional.append(sock)
+                    pid=connections.pid_for(sock)
+                    messages=receive_messages(pid,sock) if pid in player_rooms else None
+                    if messages is None: exceptional.append(sock); continue
+                    # players[pid] is read after entering the sender's room, never reused from another socket's pass
+                    if messages: client_last_seen[pid]=current_time;enter_room(player_rooms[pid])
+                    for msg in messages: handle_message(pid,players[pid],msg)
 
+            exceptional.extend(sockets_map[pid] for pid in connections.expired(current_time))
             for sock in exceptional:
-                if (pid:=next((p for p,s in sockets_map.items() if s==sock),None)) is not None:
-                    print(f"❌ Player {pid} disconnected.");players.pop(pid,None);sockets_map.pop(pid,None);client_last_seen.pop(pid,None);game_stats['kills'].pop(pid,None);game_stats['streaks'].pop(pid,None)
-                if sock in inputs:inputs.remove(sock);sock.close()
+                if (pid:=connections.pid_for(sock)) is not None: remove_player(pid)
+                if sock in inputs:inputs.discard(sock);sock.close()
+        except Exception as e:
+            print(f"💥 Server error: {e}"); tick_metrics.error(); time.sleep(1)
+
+# --- Asyncio Server ---
+class TransportQueue:
+    # OutboundQueue's counterpart for asyncio: the transport buffers the bytes, and while it is paused for being over its
+    # high-water mark only the newest state frame is held back, with the same stale-drop accounting
+    def __init__(self, transport):
+        self.transport = transport
+        self.paused = False
+        self.control = []
+        self.state = None
+        self.stale_drops = 0
+
+    def push(self, framed, is_state=False):
+        if not is_state: self.control.append(framed)
+        else:
+            if self.state is not None: self.stale_drops += 1; net_stats['stale_snapshots_dropped'] += 1
+            self.state = framed
+
+    def flush(self, transport):
+        if self.paused or transport.is_closing(): return not transport.is_closing()
+        for framed in self.control: transport.write(framed); net_stats['bytes_out'] += len(framed)
+        self.control.clear()
+        if self.state is not None:
+            transport.write(self.state); net_stats['bytes_out'] += len(self.state)
+            self.state = None; self.stale_drops = 0
+        return True
+
+    def overloaded(self):
+        return self.transport.get_write_buffer_size() > MAX_OUTBOUND_BYTES or self.stale_drops > MAX_STALE_SNAPSHOTS
+
+class ClientProtocol(asyncio.BufferedProtocol):
+    # Bytes land directly in the player's FrameReader; decoded messages wait in the room's input queue for its next tick
+    def connection_made(self, transport):
+        print(f"🎮 New from {transport.get_extra_info('peername')}")
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH_WATER)
+        self.transport = transport; self.queue = TransportQueue(transport)
+        self.pid = add_player(transport, self.queue)
+        player_joined.set()
+
+    def get_buffer(self, sizehint):
+        return readers[self.pid].space()
+
+    def buffer_updated(self, nbytes):
+        reader = readers[self.pid]; reader.filled(nbytes); net_stats['bytes_in'] += nbytes
+        try:
+            messages = [decode_message(payload) for payload in reader.frames()]
+        except ProtocolError:
+            self.transport.close(); return
+        if messages:
+            client_last_seen[self.pid] = time.time()
+            player_rooms[self.pid].inputs.extend((self.pid, msg) for msg in messages)
+
+    def pause_writing(self):
+        self.queue.paused = True
+
+    def resume_writing(self):
+        self.queue.paused = False; self.queue.flush(self.transport)
+
+    def connection_lost(self, exc):
+        # Switches to this player's room; the tick loop re-enters each room it ticks, so that is safe between ticks
+        remove_player(self.pid)
 
-            for pid in list(client_last_seen.keys()):
-                if time.time()-client_last_seen[pid]>CLIENT_TIMEOUT and (sock:=sockets_map.get(pid)):exceptional.append(sock)
+async def run_fixed_ticks():
+    # Deadlines advance by exactly TICK_RATE from the previous deadline rather than from when the tick finished,
+    # so sleep overshoot and tick cost never accumulate into drift
+    global last_superpower_check_time, last_superpower_grant_time
+    loop = asyncio.get_running_loop()
+    last_superpower_check_time = last_superpower_grant_time = time.time()
+    next_tick = loop.time()
+    while True:
+        if not player_rooms:
+            # An empty server sleeps until someone connects instead of ticking an empty arena
+            player_joined.clear(); await player_joined.wait()
+            next_tick = loop.time()
+        next_tick += TICK_RATE
+        delay = next_tick - loop.time()
+        if delay > 0: await asyncio.sleep(delay)
+        else:
+            if -delay > TICK_RATE * MAX_CATCHUP_TICKS: next_tick = loop.time()
+            # Catch-up ticks still let sockets be read and transports flushed between them
+            await asyncio.sleep(0)
+        try:
+            for pid in tick_rooms(TICK_RATE) + connections.expired(time.time()):
+                if (transport := sockets_map.get(pid)) is not None: transport.close()
+                remove_player(pid)
         except Exception as e:
-            print(f"💥 Server error: {e}"); time.sleep(1)
+            print(f"💥 Server error: {e}"); tick_metrics.error()
+
+async def run_async_server(listener):
+    global player_joined
+    loop = asyncio.get_running_loop()
+    player_joined = asyncio.Event()
+    server = await loop.create_server(ClientProtocol, sock=listener)
+    print(f"🚀 Blastr! Server started on {HOST}:{PORT} ({'uvloop' if USE_UVLOOP else 'asyncio'})")
+    async with server:
+        await run_fixed_ticks()
+
+# --- Metrics Endpoint ---
+class MetricsHandler(BaseHTTPRequestHandler):
+    # GET /metrics for the Prometheus text, GET /profile?seconds=N to cProfile the tick loop for N seconds
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.reply(200, tick_metrics.render(), 'text/plain; version=0.0.4')
+        elif url.path == '/profile':
+            try: seconds = float(parse_qs(url.query).get('seconds', [PROFILE_SECONDS])[0])
+            except ValueError: seconds = math.nan
+            if not 0 < seconds <= PROFILE_MAX_SECONDS:
+                return self.reply(400, f"seconds must be a number above 0 and at most {PROFILE_MAX_SECONDS:g}\n")
+            if (report := tick_metrics.profile.request(seconds)) is None:
+                return self.reply(503, "Profile busy, or no ticks ran (an empty server doesn't tick)\n")
+            self.reply(200, report)
+        else:
+            self.reply(404, "Try /metrics or /profile?seconds=10\n")
+
+    def reply(self, status, body, content_type='text/plain; charset=utf-8'):
+        data = body.encode()
+        self.send_response(status); self.send_header('Content-Type', content_type); self.send_header('Content-Length', str(len(data)))
+        self.end_headers(); self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics(port):
+    # Served from a daemon thread so it answers the same way under the asyncio and select loops
+    if not port: return
+    try:
+        httpd = ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+    except OSError as e:
+        print(f"📈 Metrics endpoint unavailable on {METRICS_HOST}:{port}: {e}"); return
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on http://{METRICS_HOST}:{port}/metrics")
+
+# --- Worker Processes ---
+def serve(listener, metrics_port=METRICS_PORT, select_loop=False):
+    start_metrics(metrics_port)
+    if USE_ASYNCIO and not select_loop:
+        if USE_UVLOOP: asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        asyncio.run(run_async_server(listener))
+    else:
+        run_select_loop(listener)
+
+def run_worker(listener, metrics_port, select_loop):
+    serve(listener if listener is not None else make_listener(reuse_port=True), metrics_port, select_loop)
+
+def run_workers(count, metrics_port, select_loop=False):
+    # On Linux every worker binds its own SO_REUSEPORT socket and the kernel spreads connections between them. Other
+    # platforms may accept the option without balancing (BSD and macOS hand everything to one socket), so there the
+    # workers share one listening socket made here. Each worker runs its own lobby of rooms.
+    shared = None if REUSEPORT_BALANCES else make_listener()
+    workers = [multiprocessing.Process(target=run_worker, args=(shared, metrics_port + i if metrics_port else 0, select_loop), daemon=True) for i in range(count)]
+    for worker in workers: worker.start()
+    print(f"🧵 {count} workers serving {HOST}:{PORT} ({'SO_REUSEPORT' if shared is None else 'shared socket'})")
+    for worker in workers: worker.join()
+
+def bounded_int(low, high):
+    def parse(text):
+        try: value = int(text)
+        except ValueError: raise argparse.ArgumentTypeError(f"expected a whole number, got '{text}'")
+        if not low <= value <= high: raise argparse.ArgumentTypeError(f"must be between {low} and {high}, got {value}")
+        return value
+    return parse
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Blastr! game server")
+    parser.add_argument('--workers', type=bounded_int(1, 256), default=WORKERS, help="processes to spread rooms over (default %(default)s)")
+    parser.add_argument('--metrics-port', type=bounded_int(0, 65535), default=METRICS_PORT,
+                        help="metrics and profile HTTP port, 0 to turn it off; worker N uses port + N (default %(default)s)")
+    parser.add_argument('--select', action='store_true', help="run the select loop instead of asyncio")
+    args = parser.parse_args(argv)
+    if args.metrics_port and args.metrics_port + args.workers - 1 > 65535:
+        parser.error(f"--metrics-port {args.metrics_port} leaves no port for worker {args.workers - 1}")
+    return args
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.workers > 1: run_workers(args.workers, args.metrics_port, args.select)
+    else: serve(make_listener(), args.metrics_port, args.select)
 
 if __name__ == "__main__":
     main()
-
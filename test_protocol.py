@@ -0,0 +1,167 @@
+import math
+import pytest
+import protocol
+
+# Every float below is exact in float32, so decoded values compare equal to what was encoded
+RED, GREEN, BLUE = (239, 83, 80), (102, 187, 106), (66, 165, 245)
+
+MESSAGES = [
+    {'id': 7},
+    {'action': 'move', 'pos': (512.5, 300.25)},
+    {'action': 'shoot', 'angle': 1.25},
+    {'action': 'activate_superpower'},
+    {'action': 'set_name', 'name': 'Zoë ★'},
+    {'action': 'respawn'},
+    {'action': 'ack', 'tick': 42},
+    {'action': 'ack', 'tick': None},
+    {'action': 'input', 'commands': [{'seq': 9 + i, 'x': 100.5 + i, 'y': 200.25, 'angle': 0.5, 'fire': i == 1, 'superpower': i == 2}
+                                     for i in range(3)]},
+]
+
+EVENTS = [
+    {'type': 'hit', 'pos': (120.5, 80.25), 'color': RED, 'target_id': 0},
+    {'type': 'death', 'player_id': 0, 'pos': (120.5, 80.25), 'color': RED},
+    {'type': 'kill', 'killer_id': 1},
+    {'type': 'kill_streak', 'name': 'Blästr ★', 'streak': 3},
+    {'type': 'powerup_collect', 'pos': (400.0, 300.0), 'color': GREEN},
+]
+
+def player(x, y, color, name, health=100.0, **extra):
+    return {'x': x, 'y': y, 'health': health, 'color': color, 'name': name, 'superpower_ready': False, 'input_ack': 0, **extra}
+
+def bullet(ox, oy, owner_id, color):
+    return {'ox': ox, 'oy': oy, 'ot': 1000.125, 'vx': 600.0, 'vy': -300.0, 'color': color, 'owner_id': owner_id}
+
+def baseline_snapshot():
+    return {'tick': 10, 'time': 1000.125,
+            'players': {0: player(100.5, 200.25, RED, 'Ana'), 1: player(300.0, 400.0, GREEN, 'Bo'),
+                        2: player(50.0, 60.0, BLUE, 'Cy', health=0.0, death_time=999.5)},
+            'bullets': {100 + i: bullet(10.0 * i, 20.0 * i, i % 3, (RED, GREEN, BLUE)[i % 3]) for i in range(20)},
+            'powerups': {200: {'x': 250.0, 'y': 125.0, 'type': 'health', 'color': GREEN}},
+            'walls': {300: {'x': 0.0, 'y': -20.0, 'width': 480, 'height': 20, 'color': RED}},
+            'stats': {0: {'kills': 300}, 1: {'kills': 0}, 2: {'kills': 100}}}
+
+def next_snapshot(baseline):
+    # One tick later: a player moves, one respawns (its death_time is cleared), one leaves, bullets and a power-up
+    # come and go, the wall sweeps on and a kill is scored
+    players = dict(baseline['players'])
+    players[0] = dict(players[0], x=104.5, input_ack=3)
+    players[2] = player(640.0, 360.0, BLUE, 'Cy')
+    del players[1]
+    bullets = {eid: b for eid, b in baseline['bullets'].items() if eid % 4}
+    bullets[150] = bullet(1.5, 2.5, 0, RED)
+    walls = {300: dict(baseline['walls'][300], y=-11.75)}
+    stats = {0: {'kills': 400}, 2: {'kills': 100}}
+    return {'tick': 11, 'time': 1000.15625, 'players': players, 'bullets': bullets, 'powerups': {}, 'walls': walls, 'stats': stats}
+
+def wire_view(snapshot):
+    # The decoded snapshot only has the tables and fields the schemas send
+    return {'tick': snapshot['tick'], 'time': snapshot['time'],
+            **{name: {eid: {f: e[f] for f in schema.names if e.get(f) is not None} for eid, e in snapshot[name].items()}
+               for name, schema in protocol.TABLES}}
+
+def normalize(value):
+    # Decoders hand back tuples for colours and positions and lists or tuples for columns; compare by content
+    if isinstance(value, dict): return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)): return [normalize(v) for v in value]
+    return value
+
+def decode_frame(framed):
+    length, = protocol.FRAME_HEADER.unpack_from(framed)
+    assert length == len(framed) - protocol.FRAME_HEADER.size
+    return protocol.decode_message(framed[protocol.FRAME_HEADER.size:])
+
+class ChunkedSocket:
+    # Hands a byte stream to recv_into a few bytes at a time, the way a slow link splits frames across wakeups
+    def __init__(self, data, chunk): self.data, self.chunk, self.pos = data, chunk, 0
+    def recv_into(self, view):
+        n = min(self.chunk, len(view), len(self.data) - self.pos)
+        view[:n] = self.data[self.pos:self.pos + n]; self.pos += n
+        return n
+
+@pytest.mark.parametrize('msg', MESSAGES, ids=lambda msg: msg.get('action', 'welcome'))
+def test_message_round_trip(msg):
+    assert normalize(decode_frame(protocol.pack_frame(msg))) == normalize(msg)
+
+def test_every_message_type_is_covered():
+    sent = {protocol.ACTION_TYPES[msg['action']] if 'action' in msg else protocol.MSG_WELCOME for msg in MESSAGES}
+    assert sent | {protocol.MSG_STATE} == {protocol.MSG_WELCOME, protocol.MSG_STATE, *protocol.ACTION_NAMES}
+
+def test_keyframe_round_trip():
+    baseline = baseline_snapshot()
+    msg = decode_frame(protocol.frame(protocol.encode_snapshot(baseline, None, [(10, EVENTS)])))
+    assert msg['tick'] == 10 and msg['baseline'] is None
+    assert normalize(protocol.apply_snapshot(None, msg)) == normalize(wire_view(baseline))
+    assert normalize(msg['events']) == normalize([dict(ev, tick=10) for ev in EVENTS])
+
+def test_delta_round_trip():
+    baseline = baseline_snapshot()
+    current = next_snapshot(baseline)
+    received = protocol.apply_snapshot(None, protocol.decode_message(protocol.encode_snapshot(baseline, None, [])))
+    events = [(10, EVENTS[:1]), (11, EVENTS[1:3])]
+    msg = protocol.decode_message(protocol.encode_snapshot(current, baseline, events))
+    assert msg['baseline'] == 10
+    assert normalize(protocol.apply_snapshot(received, msg)) == normalize(wire_view(current))
+    assert [(ev['tick'], ev['type']) for ev in msg['events']] == [(10, 'hit'), (11, 'death'), (11, 'kill')]
+
+def test_delta_leaves_out_unchanged_entities():
+    baseline = baseline_snapshot()
+    delta = protocol.encode_snapshot(next_snapshot(baseline), baseline, [])
+    assert len(delta) < len(protocol.encode_snapshot(baseline, None, [])) / 2
+    removed, groups = protocol.decode_message(delta)['tables']['bullets']
+    assert sorted(removed) == [eid for eid in baseline['bullets'] if not eid % 4]
+    assert [list(ids) for ids, _, _ in groups] == [[150]]
+
+def test_rebuild_snapshot_needs_its_baseline():
+    baseline = baseline_snapshot()
+    delta = protocol.decode_message(protocol.encode_snapshot(next_snapshot(baseline), baseline, []))
+    assert protocol.rebuild_snapshot({}, delta) is None
+    baselines = {}
+    protocol.rebuild_snapshot(baselines, protocol.decode_message(protocol.encode_snapshot(baseline, None, [])))
+    assert protocol.rebuild_snapshot(baselines, delta)['tick'] == 11
+    assert sorted(baselines) == [10, 11]
+
+@pytest.mark.parametrize('chunk', [1, 3, 7, 4096])
+def test_frame_reader_reassembles_split_frames(chunk):
+    baseline = baseline_snapshot()
+    stream = b''.join(protocol.pack_frame(msg) for msg in MESSAGES) + protocol.frame(protocol.encode_snapshot(baseline, None, []))
+    reader, sock, received = protocol.FrameReader(), ChunkedSocket(stream, chunk), []
+    while reader.receive(sock): received.extend(protocol.decode_message(payload) for payload in reader.frames())
+    assert normalize(received[:-1]) == normalize(MESSAGES)
+    assert received[-1]['tick'] == baseline['tick']
+
+def test_frame_reader_keeps_partial_frame():
+    framed = protocol.pack_frame(MESSAGES[1])
+    reader = protocol.FrameReader()
+    reader.receive(ChunkedSocket(framed[:-1], len(framed)))
+    assert list(reader.frames()) == []
+    reader.receive(ChunkedSocket(framed[-1:] + framed[:2], len(framed)))
+    assert [normalize(protocol.decode_message(p)) for p in reader.frames()] == [normalize(MESSAGES[1])]
+    reader.receive(ChunkedSocket(framed[2:], len(framed)))
+    assert [normalize(protocol.decode_message(p)) for p in reader.frames()] == [normalize(MESSAGES[1])]
+
+def test_frame_reader_rejects_oversized_frame():
+    reader = protocol.FrameReader(max_frame=16)
+    reader.receive(ChunkedSocket(protocol.FRAME_HEADER.pack(17) + bytes(17), 64))
+    with pytest.raises(protocol.ProtocolError):
+        list(reader.frames())
+
+def test_version_mismatch_is_rejected():
+    payload = protocol.encode_message({'action': 'respawn'})
+    payload[0] = protocol.PROTOCOL_VERSION + 1
+    with pytest.raises(protocol.ProtocolError, match='version'):
+        protocol.decode_message(payload)
+
+def test_truncated_message_is_rejected():
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_message(protocol.encode_message({'action': 'move', 'pos': (1.0, 2.0)})[:-1])
+
+@pytest.mark.parametrize('bad', [math.nan, math.inf, -math.inf])
+def test_non_finite_input_is_rejected(bad):
+    command = {'seq': 1, 'x': 100.0, 'y': 200.0, 'angle': 0.5, 'fire': False, 'superpower': False}
+    for field in ('x', 'y', 'angle'):
+        with pytest.raises(protocol.ProtocolError):
+            protocol.decode_message(protocol.encode_message({'action': 'input', 'commands': [dict(command, **{field: bad})]}))
+    for msg in ({'action': 'move', 'pos': (bad, 1.0)}, {'action': 'shoot', 'angle': bad}):
+        with pytest.raises(protocol.ProtocolError):
+            protocol.decode_message(protocol.encode_message(msg))